@@ -0,0 +1,113 @@
+# src/agent_pool.py
+# Process-wide pool of warmed AiAgent instances.
+# Building an AiAgent loads nine LLM clients, the YAML configs and a MemoryManager
+# (embedder + FAISS index), so the server keeps a fixed set alive and requests
+# check one out for the duration of a workflow run.
+import os
+import queue
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Dict, Any
+from utils.logger import setup_logger
+from utils.metrics import summarize_ms
+
+logger = setup_logger()
+
+
+class AgentPoolTimeout(Exception):
+    """Raised when no pooled agent became free within the checkout timeout."""
+
+
+class AgentPool:
+    """Fixed-size pool of long-lived agents, created lazily or warmed up front."""
+
+    def __init__(self, factory: Callable[[], Any], size: int = None, checkout_timeout: float = None):
+        self.factory = factory
+        self.size = max(1, size or int(os.getenv("AGENT_POOL_SIZE", "2")))
+        self.checkout_timeout = checkout_timeout or float(os.getenv("AGENT_POOL_TIMEOUT_S", "60"))
+        self._idle = queue.LifoQueue()  # LIFO keeps the hottest instance in use
+        self._lock = threading.Lock()
+        self._created = 0
+        self._in_use = 0
+        self._checkouts = 0
+        self._timeouts = 0
+        self._wait_ms = deque(maxlen=1000)
+
+    def _create(self):
+        start = time.perf_counter()
+        instance = self.factory()
+        logger.info(f"Agent pool: built instance in {(time.perf_counter() - start) * 1000:.0f} ms")
+        return instance
+
+    def warm(self) -> int:
+        """Build instances until the pool is full. Returns the number created."""
+        built = 0
+        while True:
+            with self._lock:
+                if self._created >= self.size:
+                    break
+                self._created += 1
+            try:
+                self._idle.put(self._create())
+                built += 1
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+        logger.info(f"Agent pool warmed: {self._created}/{self.size} instances")
+        return built
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            can_create = self._created < self.size
+            if can_create:
+                self._created += 1
+        if can_create:
+            try:
+                return self._create()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+        try:
+            return self._idle.get(timeout=self.checkout_timeout)
+        except queue.Empty:
+            with self._lock:
+                self._timeouts += 1
+            raise AgentPoolTimeout(f"No agent available after {self.checkout_timeout:.0f}s")
+
+    @contextmanager
+    def checkout(self):
+        """Borrow an agent for one request; it is returned to the pool afterwards."""
+        start = time.perf_counter()
+        instance = self._acquire()
+        waited = (time.perf_counter() - start) * 1000
+        with self._lock:
+            self._checkouts += 1
+            self._in_use += 1
+            self._wait_ms.append(waited)
+        try:
+            yield instance
+        finally:
+            with self._lock:
+                self._in_use -= 1
+            self._idle.put(instance)
+
+    def stats(self) -> Dict[str, Any]:
+        """Snapshot of pool occupancy and checkout wait times (ms)."""
+        with self._lock:
+            return {
+                "size": self.size,
+                "created": self._created,
+                "in_use": self._in_use,
+                "idle": self._idle.qsize(),
+                "checkouts": self._checkouts,
+                "timeouts": self._timeouts,
+                "wait_ms": summarize_ms(self._wait_ms),
+            }
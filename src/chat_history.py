@@ -10,6 +10,9 @@ import google.generativeai as genai
 from common_functions.Find_project_root import find_project_root
 import uuid
 from firebase_client import add_chat_message, get_chat_history  # Updated imports
+from llm_gateway import get_gateway, PRIORITY_SUMMARIZER
+from circuit_breaker import get_breakers, is_provider_failure
+from token_budget import get_token_budget
 
 project_root = find_project_root()
 genai.configure(api_key=os.getenv('GEMINI_API_KEY1'))
@@ -58,18 +61,32 @@ class ChatHistory:
         if len(history) < 2:
             return "No significant history."
         model = genai.GenerativeModel('gemini-1.5-flash')
-        prompt = (
+        budget = get_token_budget("gemini/gemini-1.5-flash")
+        instruction = (
             "Summarize this chat history concisely (100-300 tokens), "
             "focusing on key topics, user intents, and recent exchanges:\n"
-            + json.dumps(history)
         )
+        # Oldest turns are dropped first if the history exceeds the summarizer's budget
+        prompt = instruction + json.dumps(budget.fit_history(history, budget.context_tokens - budget.count(instruction)))
+        breaker = None
         try:
-            response = model.generate_content(prompt)
+            breaker = get_breakers().get("gemini/gemini-1.5-flash", os.getenv('GEMINI_API_KEY1'))
+            if not breaker.allow():
+                print("Gemini circuit open; skipping history summary.")
+                return "History summary unavailable."
+            # Lowest gateway priority: summaries never delay classification/synthesis calls
+            with get_gateway().acquire("gemini/gemini-1.5-flash", os.getenv('GEMINI_API_KEY1'),
+                                       PRIORITY_SUMMARIZER, prompt) as lease:
+                response = model.generate_content(prompt)
+                lease.record(response.text)
+            breaker.record_success()
             summary = response.text.strip() or "Summary failed."
-            # Approximate token check (len / 0.75 ~ tokens)
-            if len(summary) > 400:  # ~300 tokens
-                summary = summary[:400] + "... (truncated)"
-            return summary
+            return budget.fit_text(summary, 300)
         except Exception as e:
+            if breaker is not None:
+                if is_provider_failure(e):
+                    breaker.record_failure()
+                else:
+                    breaker.release()
             print(f"Error summarizing history: {e}. Returning default summary.")
             return "History summary unavailable."
\ No newline at end of file
@@ -0,0 +1,162 @@
+# src/circuit_breaker.py
+# Process-wide circuit breakers for LLM providers, one per model + API key.
+# Fallback state used to live inside a single _execute_task_with_fallbacks call, so every
+# new request re-tried a provider that had been returning 429s for minutes. A breaker
+# opens after consecutive provider failures, rejects calls up front during its cool-down,
+# then lets one half-open probe through: success closes it, failure re-opens it with a
+# doubled cool-down.
+import hashlib
+import os
+import threading
+import time
+from typing import Any, Dict
+from litellm.exceptions import RateLimitError, APIError, APIConnectionError, Timeout, ServiceUnavailableError
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """The provider's circuit is open; callers move on to the next fallback."""
+
+
+def is_provider_failure(error: Exception) -> bool:
+    """Failures that say something about provider health: rate limits, 5xx, timeouts, connection errors."""
+    if isinstance(error, (RateLimitError, Timeout, APIConnectionError, ServiceUnavailableError)):
+        return True
+    if isinstance(error, APIError):
+        status = getattr(error, "status_code", None)
+        return status is None or status == 429 or status >= 500
+    # Non-litellm clients (e.g. google.generativeai) expose the HTTP status as `code`
+    code = getattr(error, "code", None)
+    return isinstance(code, int) and (code == 429 or code >= 500)
+
+
+class CircuitBreaker:
+    """closed -> open after `failure_threshold` consecutive failures -> half_open after cool-down."""
+
+    def __init__(self, name: str, failure_threshold: int = None, cooldown_s: float = None, max_cooldown_s: float = None):
+        self.name = name
+        self.failure_threshold = failure_threshold or int(os.getenv("LLM_BREAKER_FAILURES", "3"))
+        self.base_cooldown_s = cooldown_s or float(os.getenv("LLM_BREAKER_COOLDOWN_S", "60"))
+        self.max_cooldown_s = max_cooldown_s or float(os.getenv("LLM_BREAKER_MAX_COOLDOWN_S", "600"))
+        self._state = CLOSED
+        self._failures = 0
+        self._cooldown_s = self.base_cooldown_s
+        self._open_until = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+        self.opened_count = 0
+        self.rejected = 0
+
+    def state(self) -> str:
+        with self._lock:
+            if self._state == OPEN and time.monotonic() >= self._open_until:
+                return HALF_OPEN
+            return self._state
+
+    def retry_in(self) -> float:
+        """Seconds until an open circuit admits a probe (0 when not open)."""
+        with self._lock:
+            return max(0.0, self._open_until - time.monotonic()) if self._state == OPEN else 0.0
+
+    def allow(self) -> bool:
+        """Admit a call: always when closed, one probe at a time once the cool-down has passed."""
+        with self._lock:
+            if self._state == OPEN and time.monotonic() >= self._open_until:
+                self._state = HALF_OPEN
+            if self._state == CLOSED:
+                return True
+            if self._state == HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._state = CLOSED
+            self._failures = 0
+            self._cooldown_s = self.base_cooldown_s
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == HALF_OPEN:
+                self._cooldown_s = min(self.max_cooldown_s, self._cooldown_s * 2)
+                self._trip()
+            elif self._state == CLOSED and self._failures >= self.failure_threshold:
+                self._trip()
+
+    def release(self):
+        """A probe ended without a verdict (e.g. a non-provider error); let the next call probe."""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def _trip(self):
+        self._state = OPEN
+        self._open_until = time.monotonic() + self._cooldown_s
+        self._probe_in_flight = False
+        self.opened_count += 1
+        print(f"Circuit for {self.name} opened for {self._cooldown_s:.0f}s")
+
+    def stats(self) -> Dict[str, Any]:
+        state, retry_in = self.state(), self.retry_in()
+        with self._lock:
+            return {
+                "state": state,
+                "consecutive_failures": self._failures,
+                "retry_in_s": round(retry_in, 1),
+                "cooldown_s": self._cooldown_s,
+                "opened_count": self.opened_count,
+                "rejected": self.rejected,
+            }
+
+
+class BreakerRegistry:
+    """One breaker per model + API key, shared by every agent and thread."""
+
+    def __init__(self):
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(model: str, api_key: str) -> str:
+        return f"{model}:{hashlib.sha256((api_key or '').encode()).hexdigest()[:8]}"
+
+    def get(self, model: str, api_key: str) -> CircuitBreaker:
+        key = self.key(model, api_key)
+        with self._lock:
+            if key not in self._breakers:
+                self._breakers[key] = CircuitBreaker(key)
+            return self._breakers[key]
+
+    def available(self, llms: list) -> list:
+        """Drop LLMs whose circuits are open (half-open ones stay, so they can be probed)."""
+        return [llm for llm in llms if self.get(llm.model, llm.api_key).state() != OPEN]
+
+    def stats(self, health=None) -> Dict[str, Any]:
+        with self._lock:
+            breakers = dict(self._breakers)
+        report = {}
+        for key, breaker in breakers.items():
+            report[key] = breaker.stats()
+            if health is not None:
+                score = health.score(key.rsplit(":", 1)[0])
+                report[key]["health_score"] = round(score, 1) if score is not None else None
+        return report
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_breakers() -> BreakerRegistry:
+    """The process-wide breaker registry."""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = BreakerRegistry()
+        return _registry
@@ -0,0 +1,118 @@
+# src/clarification.py
+# Non-interactive clarification for the server path.
+# When a plan is missing required parameters and nobody is at a terminal, run_workflow does not
+# call input(): it parks the classified plan here and returns a "needs_input" response with a
+# continuation token and the missing parameters. A follow-up request with the token and the
+# user's answer (free text or explicit values) resumes from the stored plan, so classification
+# is not run again. Pending plans live in process memory for CLARIFY_TTL_S seconds (at most
+# CLARIFY_MAX_PENDING of them, oldest dropped first); a token can be used once.
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+
+class ClarificationNeeded(Exception):
+    """Raised while responding when a plan needs parameters only the user can give."""
+
+    def __init__(self, missing: Dict[str, List[str]]):
+        super().__init__(f"Missing parameters: {missing}")
+        self.missing = missing
+
+
+class UnknownContinuation(Exception):
+    """The continuation token is unknown, expired or already used."""
+
+
+class UnexpectedParameters(ValueError):
+    """Explicit resume parameters that the parked plan did not ask for."""
+
+    def __init__(self, unexpected: Dict[str, List[str]], missing: Dict[str, List[str]]):
+        super().__init__(f"Unexpected parameters: {unexpected} (only {missing} can be given)")
+        self.unexpected = unexpected
+        self.missing = missing
+
+
+def unexpected_parameters(parameters: Dict[str, Dict[str, Any]], missing: Dict[str, List[str]]) -> Dict[str, List[str]]:
+    """The {op_name: [param]} pairs in parameters that are not listed in missing."""
+    unexpected = {}
+    for op_name, values in (parameters or {}).items():
+        extra = [p for p in (values or {}) if p not in missing.get(op_name, [])]
+        if extra:
+            unexpected[op_name] = extra
+    return unexpected
+
+
+def clarification_question(missing: Dict[str, List[str]]) -> str:
+    """The question shown to the user for a set of missing parameters."""
+    lines = [f"• For {op_name}: {', '.join(params)}" for op_name, params in missing.items()]
+    return "I need some additional information to proceed:\n" + "\n".join(lines)
+
+
+def needs_input_response(token: str, missing: Dict[str, List[str]]) -> Dict[str, Any]:
+    return {"status": "needs_input", "token": token, "missing": missing, "question": clarification_question(missing)}
+
+
+def is_needs_input(response: Any) -> bool:
+    return isinstance(response, dict) and response.get("status") == "needs_input"
+
+
+class ClarificationStore:
+    """Pending plans keyed by continuation token; use get_clarification_store()."""
+
+    def __init__(self, ttl_s: float = None, max_pending: int = None):
+        self.ttl_s = ttl_s or float(os.getenv("CLARIFY_TTL_S", "900"))
+        self.max_pending = max_pending or int(os.getenv("CLARIFY_MAX_PENDING", "1000"))
+        self._pending: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counts = {"parked": 0, "resumed": 0, "expired": 0, "unknown": 0}
+
+    def _evict(self, now: float):
+        while self._pending:
+            token, (created, _) = next(iter(self._pending.items()))
+            if now - created < self.ttl_s and len(self._pending) <= self.max_pending:
+                break
+            del self._pending[token]
+            self._counts["expired"] += 1
+
+    def park(self, state: Dict[str, Any]) -> str:
+        """Store a pending plan; returns its continuation token."""
+        token = secrets.token_urlsafe(16)
+        now = time.monotonic()
+        with self._lock:
+            self._pending[token] = (now, state)
+            self._counts["parked"] += 1
+            self._evict(now)
+        return token
+
+    def take(self, token: str, check: Callable[[Dict[str, Any]], None] = None) -> Optional[Dict[str, Any]]:
+        """The plan parked under token (removed from the store), or None. check(state) may raise
+        to refuse the resume; the plan then stays parked so the token can be used again."""
+        now = time.monotonic()
+        with self._lock:
+            self._evict(now)
+            entry = self._pending.get(token)
+            if entry:
+                if check:
+                    check(entry[1])
+                del self._pending[token]
+            self._counts["resumed" if entry else "unknown"] += 1
+        return entry[1] if entry else None
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"pending": len(self._pending), **self._counts}
+
+
+_store: Optional[ClarificationStore] = None
+_store_lock = threading.Lock()
+
+
+def get_clarification_store() -> ClarificationStore:
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ClarificationStore()
+        return _store
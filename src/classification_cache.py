@@ -0,0 +1,236 @@
+# src/classification_cache.py
+# Semantic cache for the classifier stage of run_workflow.
+# Near-identical queries ("list my tasks", "what's on my calendar today") reuse a stored
+# classification instead of paying a classifier LLM call. Entries are looked up by the
+# MiniLM embedding of the normalized query in a FAISS HNSW index, and only match within the
+# same context key (profile version, op catalog version and, for queries that refer back to
+# the conversation, a fingerprint of the recent history).
+import copy
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+import faiss
+import numpy as np
+from memory_manager import get_shared_embedder
+
+# Queries containing these words depend on the conversation, so history is part of their key
+_ANAPHORA = re.compile(r"\b(it|that|this|those|these|them|again|same|previous|above|last one)\b")
+_NUMBER = re.compile(r"\d+(?:\.\d+)?")
+# Flags in a plan (include_hidden, recursive, ...) flip with these words, not with a literal in the query
+_NEGATION = re.compile(r"\b(not|no|never|without|dont|don t|exclude|excluding)\b")
+# Words that don't change what a request asks for; conjunctions are deliberately not in here
+_STOPWORDS = {"a", "an", "the", "my", "me", "i", "please", "to", "for", "of", "can", "could", "would", "you"}
+
+
+def normalize_query(query: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace."""
+    return re.sub(r"\s+", " ", re.sub(r"[^\w\s/.\-@:]", " ", query.lower())).strip()
+
+
+def _digest(value: Any) -> str:
+    return hashlib.sha256(json.dumps(value, sort_keys=True, default=str).encode()).hexdigest()[:12]
+
+
+def context_key(query: str, user_profile: Any, op_catalog: Any, history: List[Dict[str, str]],
+                history_turns: int = 2) -> str:
+    """Cache partition for a query: profile + op catalog version (+ recent history when the query refers back)."""
+    history_part = "-"
+    if _ANAPHORA.search(normalize_query(query)):
+        history_part = _digest(history[-history_turns * 2:])
+    return f"{_digest(user_profile)}:{_digest(op_catalog)}:{history_part}"
+
+
+def _literal_values(plan: Any) -> List[Any]:
+    """Scalar parameter values of an operations plan (a task title, a duration, a flag)."""
+    values = []
+    for op in plan.get("operations", []) if isinstance(plan, dict) else []:
+        params = op.get("parameters", {}) if isinstance(op, dict) else {}
+        values.extend(v for v in params.values()
+                      if isinstance(v, (int, float, bool)) or (isinstance(v, str) and v.strip()))
+    return values
+
+
+def _numbers(text: str) -> List[float]:
+    return [float(n) for n in _NUMBER.findall(text)]
+
+
+def _tokens(text: str) -> List[str]:
+    """Words of a normalized text, without the sentence punctuation normalize_query keeps."""
+    return [t for t in (word.strip(".:-") for word in text.split()) if t]
+
+
+def _find(tokens: List[str], sequence: List[str]) -> int:
+    """Start of sequence as whole tokens in tokens, or -1."""
+    for start in range(len(tokens) - len(sequence) + 1):
+        if sequence and tokens[start:start + len(sequence)] == sequence:
+            return start
+    return -1
+
+
+def _literals_differ(values: List[Any], cached_query: str, query: str) -> bool:
+    """True if query does not carry the literals the cached plan took from cached_query, or asks
+    for more than they cover ("buy milk and eggs" must not reuse the plan for "buy milk")."""
+    cached_tokens, tokens = _tokens(cached_query), _tokens(query)
+    for value in values:
+        if isinstance(value, bool):
+            if set(_NEGATION.findall(cached_query)) != set(_NEGATION.findall(query)):
+                return True
+        elif isinstance(value, (int, float)):
+            # Whole numbers only: "25" must not match inside "250"
+            if value in _numbers(cached_query) and value not in _numbers(query):
+                return True
+        else:
+            sequence = _tokens(normalize_query(value))
+            cached_at = _find(cached_tokens, sequence)
+            if cached_at < 0:
+                continue  # Not taken from the query (a default, a resolved path)
+            at = _find(tokens, sequence)
+            if at < 0:
+                return True
+            del cached_tokens[cached_at:cached_at + len(sequence)]
+            del tokens[at:at + len(sequence)]
+    if len(cached_tokens) == len(_tokens(cached_query)):
+        return False  # No free text was copied; the similarity threshold decides
+    # Around the literals the two requests must say the same thing
+    return {t for t in cached_tokens if t not in _STOPWORDS} != {t for t in tokens if t not in _STOPWORDS}
+
+
+class _Entry:
+    __slots__ = ("query", "context", "classification", "vector", "created", "position")
+
+    def __init__(self, query, context, classification, vector, position):
+        self.query = query
+        self.context = context
+        self.classification = classification
+        self.vector = vector
+        self.created = time.monotonic()
+        self.position = position
+
+
+class ClassificationCache:
+    """Thread-safe semantic cache with a similarity threshold, TTL and LRU size bound."""
+
+    def __init__(self, embedder=None, threshold: float = None, ttl_s: float = None, max_entries: int = None):
+        self.embedder = embedder or get_shared_embedder()
+        self.threshold = threshold or float(os.getenv("CLASSIFIER_CACHE_THRESHOLD", "0.95"))
+        self.ttl_s = ttl_s or float(os.getenv("CLASSIFIER_CACHE_TTL_S", "3600"))
+        self.max_entries = max_entries or int(os.getenv("CLASSIFIER_CACHE_MAX_ENTRIES", "2000"))
+        self._entries: "OrderedDict[int, _Entry]" = OrderedDict()  # LRU order, oldest first
+        self._by_position: Dict[int, int] = {}  # faiss position -> entry id
+        self._next_id = 0
+        self._index = None
+        self._lock = threading.Lock()
+        self._counts = {"hits": 0, "misses": 0, "guard_rejects": 0, "stores": 0, "evictions": 0, "expired": 0}
+
+    def _embed(self, text: str) -> np.ndarray:
+        vector = np.asarray(self.embedder.embed_query(text), dtype="float32").reshape(1, -1)
+        faiss.normalize_L2(vector)  # Inner product on unit vectors = cosine similarity
+        return vector
+
+    def _new_index(self, dim: int):
+        index = faiss.IndexHNSWFlat(dim, 32, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efSearch = 64
+        return index
+
+    def _rebuild(self):
+        """HNSW cannot delete, so evicted vectors linger until the index is rebuilt from live entries."""
+        self._index = self._new_index(self._index.d)
+        self._by_position = {}
+        for entry_id, entry in self._entries.items():
+            entry.position = self._index.ntotal
+            self._by_position[entry.position] = entry_id
+            self._index.add(entry.vector)
+
+    def _remove(self, entry_id: int):
+        entry = self._entries.pop(entry_id)
+        self._by_position.pop(entry.position, None)
+        if self._index is not None and self._index.ntotal > 64 and self._index.ntotal > 2 * len(self._entries):
+            self._rebuild()
+
+    def lookup(self, query: str, key: str) -> Optional[Dict[str, Any]]:
+        """Stored classification for a semantically equal query under the same context key, or None."""
+        normalized = normalize_query(query)
+        vector = self._embed(normalized)
+        with self._lock:
+            if self._index is None or not self._entries:
+                self._counts["misses"] += 1
+                return None
+            scores, positions = self._index.search(vector, min(16, self._index.ntotal))
+            now = time.monotonic()
+            hit, expired = None, []
+            for score, position in zip(scores[0], positions[0]):
+                if score < self.threshold:
+                    break
+                entry_id = self._by_position.get(int(position))
+                if entry_id is None:
+                    continue
+                entry = self._entries[entry_id]
+                if now - entry.created > self.ttl_s:
+                    expired.append(entry_id)
+                    continue
+                if entry.context != key:
+                    continue
+                # Similar is not equal: "create task buy milk" must not reuse "create task buy bread".
+                # Every literal the cached plan took from its query has to be in this query too.
+                if _literals_differ(_literal_values(entry.classification), entry.query, normalized):
+                    self._counts["guard_rejects"] += 1
+                    continue
+                hit = entry_id
+                break
+            # Removal may rebuild the index, so it waits until the search results are consumed
+            for entry_id in expired:
+                self._remove(entry_id)
+            self._counts["expired"] += len(expired)
+            if hit is None:
+                self._counts["misses"] += 1
+                return None
+            self._entries.move_to_end(hit)
+            self._counts["hits"] += 1
+            return copy.deepcopy(self._entries[hit].classification)
+
+    def store(self, query: str, key: str, classification: Dict[str, Any]):
+        normalized = normalize_query(query)
+        vector = self._embed(normalized)
+        with self._lock:
+            if self._index is None:
+                self._index = self._new_index(vector.shape[1])
+            entry_id = self._next_id
+            self._next_id += 1
+            position = self._index.ntotal
+            self._index.add(vector)
+            self._entries[entry_id] = _Entry(normalized, key, copy.deepcopy(classification), vector, position)
+            self._by_position[position] = entry_id
+            self._counts["stores"] += 1
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self._counts["evictions"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._counts["hits"] + self._counts["misses"]
+            return {
+                **self._counts,
+                "size": len(self._entries),
+                "index_vectors": self._index.ntotal if self._index is not None else 0,
+                "hit_rate": round(self._counts["hits"] / lookups, 3) if lookups else 0.0,
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_classification_cache() -> Optional[ClassificationCache]:
+    """Process-wide cache, or None when disabled with CLASSIFIER_CACHE=0."""
+    global _cache
+    if os.getenv("CLASSIFIER_CACHE", "1") != "1":
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = ClassificationCache()
+        return _cache
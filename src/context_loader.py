@@ -0,0 +1,76 @@
+# src/context_loader.py
+# Concurrent fan-out for the pre-LLM context stage of run_workflow.
+# History, profile, file content and the op catalog are independent reads (two of them are
+# Firestore round trips), so they run side by side and the stage costs max() of their
+# latencies instead of sum(). Each source has its own timeout and a fallback value: a slow
+# or failing source degrades the prompt instead of failing the request. A timed-out read
+# cannot be interrupted; its thread finishes in the background and the result is dropped.
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Any, Callable, Dict
+from utils.metrics import summarize_ms
+
+# Seconds per source; override with CONTEXT_TIMEOUT_<SOURCE>_S
+DEFAULT_TIMEOUTS = {
+    "history": 3.0,
+    "profile": 3.0,
+    "file": 10.0,
+    "operations": 2.0,
+    "history_summary": 8.0,
+}
+
+_POOL = ThreadPoolExecutor(max_workers=int(os.getenv("CONTEXT_LOAD_WORKERS", "16")), thread_name_prefix="context-load")
+_latencies: Dict[str, deque] = {}
+_outcomes: Dict[str, Dict[str, int]] = {}
+_stats_lock = threading.Lock()
+
+
+def source_timeout(source: str) -> float:
+    return float(os.getenv(f"CONTEXT_TIMEOUT_{source.upper()}_S", DEFAULT_TIMEOUTS.get(source, 5.0)))
+
+
+def _record(source: str, latency_ms: float, status: str):
+    with _stats_lock:
+        _latencies.setdefault(source, deque(maxlen=500)).append(latency_ms)
+        counts = _outcomes.setdefault(source, {"ok": 0, "timeout": 0, "error": 0})
+        counts[status] += 1
+
+
+class ContextFanOut:
+    """Starts sources immediately; get() waits for one, bounded by its timeout from submission."""
+
+    def __init__(self):
+        self.timings: Dict[str, Dict[str, Any]] = {}
+        self._pending: Dict[str, tuple] = {}
+
+    def submit(self, source: str, fn: Callable[[], Any], fallback: Any):
+        started = time.perf_counter()
+        self._pending[source] = (_POOL.submit(fn), fallback, started)
+
+    def get(self, source: str) -> Any:
+        future, fallback, started = self._pending.pop(source)
+        remaining = source_timeout(source) - (time.perf_counter() - started)
+        try:
+            value, status = future.result(timeout=max(0.0, remaining)), "ok"
+        except FutureTimeout:
+            value, status = fallback, "timeout"
+            print(f"Warning: Context source '{source}' timed out. Using fallback.")
+        except Exception as e:
+            value, status = fallback, "error"
+            print(f"Warning: Context source '{source}' failed: {e}. Using fallback.")
+        latency_ms = (time.perf_counter() - started) * 1000
+        self.timings[source] = {"ms": round(latency_ms, 1), "status": status}
+        _record(source, latency_ms, status)
+        return value
+
+
+def context_load_stats() -> Dict[str, Any]:
+    """Per-source latency percentiles and outcome counts for /metrics."""
+    with _stats_lock:
+        return {
+            source: {"latency_ms": summarize_ms(samples), **_outcomes.get(source, {})}
+            for source, samples in _latencies.items()
+        }
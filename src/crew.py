@@ -1,13 +1,14 @@
 ## Updated FILE: src/crew.py
 ## Changes: In run_workflow, after synthesis, added simple feedback loop: if user_query mentions "edit" or final_response includes "refine?", prompt user for feedback and re-run workflow with appended query.
-## Kept minimal; assumes CLI context (input()).
+## Kept minimal; assumes CLI context (input()). Servers pass interactive=False: no prompts, and plans
+## missing parameters return a "needs_input" response resumed by resume_workflow (clarification.py).
 ## Also, ensured Office ops are handled (no special code needed, as ops are dynamic).
 # Updated src/crew.py
 # Refined workflow per requirements:
 # - Classifier now takes full inputs (query, file_content if provided, history, profile, op_names).
 # - Outputs JSON: mode, (for agentic: operations[list of {'name':str, 'parameters':dict}], user_summarized_requirements:str), (for direct: direct_response:str).
 # - No separate planner: Operations generated directly in classifier for agentic.
-# - perform_operations now takes list of ops, executes sequentially, appends results to a single str (operation_results).
+# - perform_operations now takes list of ops, executes them as a dependency graph (plan_scheduler), appends results to a single str (operation_results).
 # - Synthesizer only for agentic: Inputs summarized_requirements + op_results, outputs JSON (display_response, extracted_fact:list[str] for KB).
 # - extracted_fact added to KB via memory_manager.
 # - Removed memory_extractor agent/task; integrated into synthesizer.
@@ -20,11 +21,13 @@
 # - For file: Uses FileManagerTool for txt; code_execution for PDF (leverages available tool in system, but implemented inline via self.code_exec if needed).
 import json
 import os
+import threading
 import traceback
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Callable, Optional
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from datetime import date
-import json5
-import re
+import litellm
 from crewai import Agent, Crew, Process, Task, LLM
 from crewai.project import CrewBase, agent, crew, task
 from litellm.exceptions import RateLimitError, APIError
@@ -36,8 +39,49 @@ from chat_history import ChatHistory # Updated to Firebase
 from common_functions.Find_project_root import find_project_root
 from memory_manager import MemoryManager # Updated for KB
 from firebase_client import get_user_profile # For profile
+from provider_health import get_provider_health
+from circuit_breaker import get_breakers, is_provider_failure, CircuitOpenError
+from classification_cache import get_classification_cache, context_key
+from intent_grammar import get_intent_grammar
+from context_loader import ContextFanOut
+from token_budget import get_token_budget
+from local_synthesizer import synthesize_locally
+from result_budget import get_result_budget, preview
+from streaming_json import StreamingPlanParser, parse_json_tolerant
+from plan_scheduler import EarlyDispatcher, PlanScheduler
+from operation_registry import OperationRegistry, get_operation_registry
+from clarification import (
+    ClarificationNeeded, UnexpectedParameters, UnknownContinuation, get_clarification_store, needs_input_response,
+    unexpected_parameters
+)
+from llm_gateway import (
+    get_gateway, BudgetExhaustedError,
+    PRIORITY_CLASSIFIER, PRIORITY_SYNTHESIZER, PRIORITY_BATCH
+)
 PROJECT_ROOT = find_project_root()
 MEMORY_DIR = os.path.join(PROJECT_ROOT, "knowledge", "memory")
+# Shared by all agents for hedged LLM calls (primary + backup racing)
+_HEDGE_POOL = ThreadPoolExecutor(max_workers=int(os.getenv("LLM_HEDGE_WORKERS", "8")), thread_name_prefix="llm-hedge")
+class _HedgeFailed(Exception):
+    """Both the primary and the hedge call failed; carries the last error."""
+    def __init__(self, error: Exception):
+        super().__init__(str(error))
+        self.error = error
+# Shapes described to the repair call when LLM output is not valid JSON
+CLASSIFICATION_SCHEMA = '{"mode": "agentic", "operations": [{"name": ..., "parameters": {...}}], "user_summarized_requirements": ...} or {"mode": "direct", "direct_response": ...}'
+SYNTHESIS_SCHEMA = '{"display_response": ..., "extracted_fact": [...]}'
+# Progress callback: on_event(event_name, payload) — used by the streaming endpoint
+EventCallback = Callable[[str, Dict[str, Any]], None]
+def _emit(on_event: Optional[EventCallback], event: str, **payload):
+    if on_event:
+        on_event(event, payload)
+# Results in status lines and op_finished events are previews; only the synthesizer sees budgeted results
+OP_PREVIEW_CHARS = int(os.getenv("OP_PREVIEW_CHARS", "2000"))
+def _op_line(record: Dict[str, Any], max_chars: int = None) -> str:
+    """Status line for an op record; the result is cut to a preview when max_chars is given."""
+    if max_chars is not None:
+        record = {**record, 'result': preview(record['result'], max_chars)}
+    return f"Operation '{record['name']}': {OperationsTool.format_line(record)}"
 @CrewBase
 class AiAgent:
     agents: List[Agent]
@@ -56,6 +100,9 @@ class AiAgent:
         self.summarizer_fallback1_llm = LLM(model="openrouter/openai/gpt-oss-20b:free", api_key=os.getenv("OPENROUTER_API_KEY1"))
         self.summarizer_fallback2_llm = LLM(model="gemini/gemini-1.5-flash-latest", api_key=os.getenv("GEMINI_API_KEY1"))
         self.memory_manager = MemoryManager()
+        self.ops_retriever = None  # RagTool over the operation registry, built on first classification
+        self.ops_tool = None  # OperationsTool, built on first operation
+        self._ops_tool_lock = threading.Lock()
         super().__init__()
     # === Agents (refined: Removed planner, memory_extractor, direct_responder; kept classifier, synthesizer, summarizer) ===
     @agent
@@ -77,19 +124,142 @@ class AiAgent:
     @task
     def summarize_history(self) -> Task:
         return Task(config=self.tasks_config['summarize_history'])
+    # === Per-run builders ===
+    # @agent/@task results are memoized per instance, and run_workflow mutates both
+    # (formatted descriptions, fallback LLM swaps). Pooled instances serve many
+    # requests, so each run builds its own Agent/Task from the parsed YAML configs.
+    def _new_agent(self, name: str, llm: LLM) -> Agent:
+        return Agent(config=self.agents_config[name], llm=llm, verbose=True)
+    def _new_task(self, name: str, **inputs) -> Task:
+        config = dict(self.tasks_config[name])
+        if inputs:
+            config['description'] = config['description'].format(**inputs)
+        return Task(config=config)
     # === Internal Execution Helpers (unchanged) ===
-    def _execute_task_with_fallbacks(self, agent, task, fallbacks):
+    # Every call first reserves budget with the shared LLM gateway; a key whose budget stays
+    # exhausted past the gateway's max wait is treated like a 429 and skipped for the fallback.
+    # Outcomes feed the shared provider health windows, which order each chain (fastest,
+    # healthiest first) and, with LLM_HEDGING=1, set the deadline after which a hedge call races
+    # the primary. Providers whose circuit breaker is open are dropped from the chain up front.
+    def _call_llm(self, agent, task, llm, priority: int):
+        """One timed, budgeted, circuit-guarded call of task on agent with llm."""
+        breaker = get_breakers().get(llm.model, llm.api_key)
+        if not breaker.allow():
+            raise CircuitOpenError(f"Circuit open for {llm.model}")
+        agent.llm = llm
+        started = time.perf_counter()
         try:
-            return agent.execute_task(task)
-        except (RateLimitError, APIError) as e:
-            if isinstance(e, APIError) and getattr(e, 'status_code', None) != 429:
-                raise e
-            if not fallbacks:
-                print(f"Exhausted fallbacks for {agent.llm.model}. Returning error message.")
-                return "Error: LLM request failed. Please try again later."
-            print(f"Rate limit or API error with {agent.llm.model}. Switching to fallback.")
-            agent.llm = fallbacks[0]
-            return self._execute_task_with_fallbacks(agent, task, fallbacks[1:])
+            with get_gateway().acquire(llm.model, llm.api_key, priority, task.description) as lease:
+                output = agent.execute_task(task)
+                lease.record(str(output))
+        except BudgetExhaustedError:
+            breaker.release()
+            raise  # Never reached the provider; says nothing about its health
+        except Exception as e:
+            get_provider_health().record(llm.model, (time.perf_counter() - started) * 1000, ok=False)
+            if is_provider_failure(e):
+                breaker.record_failure()
+            else:
+                breaker.release()
+            raise
+        get_provider_health().record(llm.model, (time.perf_counter() - started) * 1000, ok=True)
+        breaker.record_success()
+        return output
+    def _hedged_call(self, agent, task, primary, backup, priority: int):
+        """Run primary; if it is still running at its p95 deadline, race backup on a copied agent/task.
+        The first success wins. The loser cannot be interrupted mid-request, so it is abandoned:
+        its result is discarded and its latency still recorded."""
+        first = _HEDGE_POOL.submit(self._call_llm, agent, task, primary, priority)
+        done, _ = wait([first], timeout=get_provider_health().hedge_deadline(primary.model))
+        if done:
+            return first.result()
+        print(f"{primary.model} slower than its p95 deadline. Hedging with {backup.model}.")
+        second = _HEDGE_POOL.submit(self._call_llm, agent.copy(), task.model_copy(), backup, priority)
+        pending = {first, second}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    for loser in pending:
+                        loser.cancel()
+                    return future.result()
+                error = future.exception()
+        raise _HedgeFailed(error)
+    def _execute_task_with_fallbacks(self, agent, task, fallbacks, priority: int = PRIORITY_SYNTHESIZER,
+                                     hedge: bool = False):
+        chain = get_breakers().available(get_provider_health().rank([agent.llm] + list(fallbacks)))
+        hedge = hedge and os.getenv("LLM_HEDGING", "0") == "1"
+        i = 0
+        while i < len(chain):
+            llm = chain[i]
+            try:
+                if hedge and i + 1 < len(chain):
+                    return self._hedged_call(agent, task, llm, chain[i + 1], priority)
+                return self._call_llm(agent, task, llm, priority)
+            except _HedgeFailed as e:
+                error, step = e.error, 2  # Both racers failed, so skip past the backup too
+            except (RateLimitError, APIError, BudgetExhaustedError, CircuitOpenError) as e:
+                error, step = e, 1
+            if not isinstance(error, (RateLimitError, APIError, BudgetExhaustedError, CircuitOpenError)):
+                raise error
+            if isinstance(error, APIError) and getattr(error, 'status_code', None) != 429:
+                raise error
+            i += step
+            if i < len(chain):
+                print(f"Rate limit or API error with {llm.model}. Switching to fallback.")
+        print(f"Exhausted fallbacks for {agent.llm.model}. Returning error message.")
+        return "Error: LLM request failed. Please try again later."
+    def _stream_task_with_fallbacks(self, agent, task, fallbacks, on_token: Callable[[str], None],
+                                    priority: int = PRIORITY_SYNTHESIZER):
+        """Same contract as _execute_task_with_fallbacks, but streams the completion token by token.
+        Falls back to the blocking crewAI path if the provider rejects streaming."""
+        messages = [
+            {"role": "system", "content": f"You are {agent.role}. {agent.backstory}\nYour personal goal is: {agent.goal}"},
+            {"role": "user", "content": f"{task.description}\n\nThis is the expected criteria for your final answer: {task.expected_output}"},
+        ]
+        chain = get_breakers().available(get_provider_health().rank([agent.llm] + list(fallbacks)))
+        for i, llm in enumerate(chain):
+            parts = []
+            breaker = get_breakers().get(llm.model, llm.api_key)
+            if not breaker.allow():
+                continue
+            started = time.perf_counter()
+            try:
+                with get_gateway().acquire(llm.model, llm.api_key, priority, messages[1]["content"]) as lease:
+                    stream = litellm.completion(model=llm.model, api_key=llm.api_key, messages=messages, stream=True)
+                    for chunk in stream:
+                        delta = chunk.choices[0].delta.content if chunk.choices else None
+                        if delta:
+                            parts.append(delta)
+                            on_token(delta)
+                    lease.record("".join(parts))
+                get_provider_health().record(llm.model, (time.perf_counter() - started) * 1000, ok=True)
+                breaker.record_success()
+                return "".join(parts)
+            except (RateLimitError, APIError, BudgetExhaustedError) as e:
+                if isinstance(e, BudgetExhaustedError):
+                    breaker.release()
+                else:
+                    get_provider_health().record(llm.model, (time.perf_counter() - started) * 1000, ok=False)
+                    if is_provider_failure(e):
+                        breaker.record_failure()
+                    else:
+                        breaker.release()
+                if isinstance(e, APIError) and getattr(e, 'status_code', None) != 429:
+                    raise e
+                if parts:  # Tokens already reached the client; don't splice a second answer onto them
+                    return "".join(parts)
+                print(f"Rate limit or API error with {llm.model}. Switching to fallback.")
+            except Exception as e:
+                breaker.release()
+                if parts:
+                    return "".join(parts)
+                print(f"Streaming unavailable for {llm.model} ({e}). Using blocking call.")
+                agent.llm = llm
+                return self._execute_task_with_fallbacks(agent, task, chain[i + 1:], priority)
+        print(f"Exhausted fallbacks for {agent.llm.model}. Returning error message.")
+        return "Error: LLM request failed. Please try again later."
     def _process_file(self, file_path: str) -> str:
         """Extract text from file (txt direct; PDF via simple code exec simulation - extend with libs if needed)."""
         if not file_path or not os.path.exists(file_path):
@@ -111,108 +281,269 @@ class AiAgent:
             return f"Unsupported file type: {ext}. Only txt, pdf, doc, ppt supported."
         return ""
     # === Optimized Workflow (refined per requirements) ===
-    def run_workflow(self, user_query: str, file_path: str = None, session_id: str = None):
-        # 1. Input Handling & Sanitization
-        user_query = user_query.strip()
-        if not user_query:
-            return "No query provided."
+    # Stages are split out so run_batch can load context once and classify many queries.
+    def _load_operations(self) -> OperationRegistry:
+        """Current op catalog (shared registry; reloaded only when operations.json/Firestore change)."""
+        return get_operation_registry()
+    def _load_context(self, file_path: str = None, session_id: str = None,
+                      on_event: Optional[EventCallback] = None) -> Dict[str, Any]:
+        """Load history, profile, file content and the op catalog shared by every query in a run.
+        Sources are read concurrently with per-source timeouts and fallbacks (see context_loader);
+        per-source latencies are returned under 'timings'."""
+        started = time.perf_counter()
+        fan_out = ContextFanOut()
+        fan_out.submit('history', lambda: ChatHistory.load_history(session_id), fallback=[])
+        fan_out.submit('profile', self.memory_manager.get_user_profile, fallback={})  # Firebase
+        fan_out.submit('file', lambda: self._process_file(file_path), fallback="")
+        fan_out.submit('operations', self._load_operations, fallback=None)
        
-        # Load from Firebase
-        history = ChatHistory.load_history(session_id)
-        user_profile = self.memory_manager.get_user_profile() # Firebase
-        file_content = self._process_file(file_path)
-       
-        # Load operations from json (future: migrate to Firebase collection)
-        file_tool = FileManagerTool()
-        ops_path = os.path.join(PROJECT_ROOT, 'knowledge', 'operations.json')
-        available_operations_raw = file_tool._run(ops_path)
-        # Robust JSON extraction: Find JSON object after "Content of ...:\n"
-        json_match = re.search(r'\{.*\}', available_operations_raw, re.DOTALL)
-        if json_match:
-            available_operations_content = json_match.group(0)
-        else:
-            available_operations_content = "{}"
-        try:
-            available_operations = json.loads(available_operations_content.strip()).get("operations", [])
-        except json.JSONDecodeError:
-            print("Warning: Invalid operations JSON. Using empty list.")
-            available_operations = []
-        op_names = "\n".join([op['name'] for op in available_operations])
-       
-        # Assemble inputs (token-aware: truncate history summary if long)
+        # Assemble inputs (token-aware: summarize history that exceeds its share of the classifier budget).
+        # The summary starts as soon as history arrives, overlapping the remaining reads.
+        history = fan_out.get('history')
+        budget = get_token_budget(self.classifier_llm.model)
         full_history = json.dumps(history)
-        if len(full_history) > 2000: # Rough token limit
-            history_summary = ChatHistory.summarize(history)
-            full_history = f"Summary: {history_summary}"
+        summarize = budget.count(full_history) > budget.section_cap('history')
+        if summarize:
+            recent = json.dumps(budget.fit_history(history, budget.section_cap('history')))
+            fan_out.submit('history_summary', lambda: f"Summary: {ChatHistory.summarize(history)}", fallback=recent)
+        user_profile = fan_out.get('profile')
+        file_content = fan_out.get('file')
+        registry = fan_out.get('operations') or OperationRegistry([], "unavailable")
+        if summarize:
+            full_history = fan_out.get('history_summary')
+        timings = {**fan_out.timings, 'total': {'ms': round((time.perf_counter() - started) * 1000, 1)}}
+        _emit(on_event, 'context_loaded', timings=timings)
        
-        inputs = {
-            'user_query': user_query,
+        return {
+            'history': history,
             'file_content': file_content,
             'full_history': full_history,
-            'op_names': op_names,
-            'user_profile': json.dumps(user_profile)
+            'registry': registry,
+            'operations': registry.operations,
+            'op_names': registry.names,
+            'user_profile': json.dumps(user_profile),
+            'profile': user_profile if isinstance(user_profile, dict) else {},
+            'history_summarized': summarize,
+            'timings': timings
         }
-       
-        # 2. Classification (single LLM call with all inputs)
-        classify_task = self.classify_query()
-        classify_task.description = classify_task.description.format(**inputs)
-        classify_agent = self.classifier()
-        classification_raw = self._execute_task_with_fallbacks(
-            classify_agent, classify_task, [self.classifier_fallback1_llm, self.classifier_fallback2_llm]
+    @staticmethod
+    def _try_parse_json(raw: str) -> Optional[Dict]:
+        """Tolerant parse of LLM JSON output (fences, prose, JSON5, truncation); None if unusable."""
+        return parse_json_tolerant(str(raw))
+    def _repair_json(self, raw: str, expected: str, retries: int = 1,
+                     priority: int = PRIORITY_SYNTHESIZER) -> Optional[Dict]:
+        """Parse LLM JSON output; unparseable output gets `retries` targeted repair calls
+        (re-parsing the same text cannot succeed). None if it stays unusable."""
+        parsed = self._try_parse_json(raw)
+        # Exhausted fallbacks leave nothing to repair
+        attempts = 0 if str(raw).startswith("Error: LLM request failed") else retries
+        for _ in range(attempts):
+            if parsed is not None:
+                break
+            print("Unparseable LLM output. Asking for a JSON repair.")
+            repair_task = self._new_task('repair_json', expected=expected, raw_output=str(raw)[:4000])
+            repair_agent = self._new_agent('classifier', self.classifier_llm)
+            repaired = self._execute_task_with_fallbacks(
+                repair_agent, repair_task, [self.classifier_fallback1_llm, self.classifier_fallback2_llm], priority
+            )
+            parsed = self._try_parse_json(repaired)
+        return parsed
+    def _parse_json_with_retry(self, raw: str, expected: str, retries: int = 1,
+                               priority: int = PRIORITY_SYNTHESIZER) -> Dict:
+        """Strict JSON parsing with repair & fallback."""
+        parsed = self._repair_json(raw, expected, retries, priority)
+        if parsed is not None:
+            return parsed
+        # Fallback: Assume direct mode with error response
+        return {'mode': 'direct', 'direct_response': f"Classification failed: {str(raw)[:100]}... Please rephrase."}
+    def _select_operations(self, user_query: str, context: Dict[str, Any]) -> Optional[List[Dict[str, Any]]]:
+        """Ops retrieved for the query from the RagTool index, or None to offer the full catalog."""
+        if os.getenv("CLASSIFIER_OP_RETRIEVAL", "1") != "1" or not context['operations']:
+            return None
+        try:
+            if self.ops_retriever is None:
+                self.ops_retriever = RagTool()
+            return self.ops_retriever.select_operations(user_query)
+        except Exception as e:
+            print(f"Warning: Op retrieval failed ({e}). Using full catalog.")
+            return None
+    @staticmethod
+    def _needs_full_catalog(classification: Dict, offered: List[Dict[str, Any]]) -> bool:
+        if classification.get('mode') == 'need_full_catalog':
+            return True
+        offered_names = {op['name'] for op in offered}
+        operations = classification.get('operations') or []
+        return isinstance(operations, list) and any(
+            isinstance(op, dict) and op.get('name') not in offered_names for op in operations
         )
+    def _fit_classifier_inputs(self, user_query: str, context: Dict[str, Any], op_lines: List[str]) -> Dict[str, str]:
+        """Classifier prompt inputs trimmed to the classifier model's token budget.
+        Sections are granted tokens by priority (ops, profile, history, file) and each is
+        trimmed along its structure instead of being sliced mid-record."""
+        budget = get_token_budget(self.classifier_llm.model)
+        op_catalog = "\n".join(op_lines)
+        demands = {
+            'ops': budget.count(op_catalog),
+            'profile': budget.count(context['user_profile']),
+            'history': budget.count(context['full_history']),
+            'file': budget.count(context['file_content']),
+        }
+        fixed = budget.count(self.tasks_config['classify_query']['description']) + budget.count(user_query)
+        grants = budget.allocate(demands, total=max(0, budget.context_tokens - fixed))
+        if context['history_summarized']:
+            full_history = budget.fit_text(context['full_history'], grants['history'])
+        else:
+            full_history = json.dumps(budget.fit_history(context['history'], grants['history']))
+        return {
+            'user_query': user_query,
+            'file_content': budget.fit_text(context['file_content'], grants['file'], keep_tail=True),
+            'full_history': full_history,
+            'op_catalog': "\n".join(budget.fit_items(op_lines, grants['ops'])),
+            'user_profile': budget.fit_json(context['profile'], grants['profile'])
+        }
+    def _run_classifier(self, user_query: str, context: Dict[str, Any], operations: List[Dict[str, Any]],
+                        priority: int, on_event: Optional[EventCallback] = None,
+                        dispatcher: Optional[EarlyDispatcher] = None) -> tuple:
+        """One classifier LLM call offering `operations`. Returns (raw output, parsed dict or None).
+        With on_event or a dispatcher the plan is streamed: 'mode_detected' fires as soon as the mode
+        is known, direct answers are forwarded as synthesis_token events while they are generated,
+        and each operation is reported ('operation_planned') and offered to the dispatcher
+        ('op_dispatched' when it starts early) as soon as it is complete."""
+        inputs = self._fit_classifier_inputs(user_query, context, [context['registry'].line(op) for op in operations])
+        classify_task = self._new_task('classify_query', **inputs)
+        classify_agent = self._new_agent('classifier', self.classifier_llm)
+        fallbacks = [self.classifier_fallback1_llm, self.classifier_fallback2_llm]
+        if not on_event and not dispatcher:
+            classification_raw = self._execute_task_with_fallbacks(
+                classify_agent, classify_task, fallbacks, priority, hedge=True
+            )
+            return classification_raw, self._try_parse_json(classification_raw)
+        parser = StreamingPlanParser()
        
-        # Strict JSON parsing with cleanup & retry
-        def parse_json_with_retry(raw: str, retries: int = 1) -> Dict:
-            for _ in range(retries):
-                cleaned = re.sub(r'```json|```|```|markdown', '', raw).strip()
-                try:
-                    return json5.loads(cleaned)
-                except:
-                    pass
-            # Fallback: Assume direct mode with error response
-            return {'mode': 'direct', 'direct_response': f"Classification failed: {raw[:100]}... Please rephrase."}
-       
-        classification = parse_json_with_retry(classification_raw)
+        def on_token(text):
+            for event in parser.feed(text):
+                if event['type'] == 'mode':
+                    _emit(on_event, 'mode_detected', mode=event['mode'])
+                elif event['type'] == 'direct_text':
+                    _emit(on_event, 'synthesis_token', text=event['text'])
+                elif event['type'] == 'operation':
+                    _emit(on_event, 'operation_planned', index=event['index'], operation=event['operation'])
+                    if dispatcher and dispatcher.offer(event['operation']):
+                        _emit(on_event, 'op_dispatched', index=event['index'], name=event['operation']['name'])
        
+        classification_raw = self._stream_task_with_fallbacks(classify_agent, classify_task, fallbacks, on_token, priority)
+        return classification_raw, parser.result() if parser.text else self._try_parse_json(classification_raw)
+    def _classify(self, user_query: str, context: Dict[str, Any], priority: int = PRIORITY_CLASSIFIER,
+                  on_event: Optional[EventCallback] = None, dispatcher: Optional[EarlyDispatcher] = None) -> Dict:
+        """Classification (single LLM call with all inputs and the ops retrieved for the query),
+        served from the semantic cache when possible."""
+        # File-dependent classifications depend on more than the cache key, so they bypass the cache
+        cache = get_classification_cache() if not context['file_content'] else None
+        cache_key = None
+        if cache:
+            cache_key = context_key(user_query, context['user_profile'], context['registry'].version, context['history'])
+            try:
+                cached = cache.lookup(user_query, cache_key)
+            except Exception as e:
+                print(f"Warning: Classification cache lookup failed: {e}")
+                cached = None
+            if cached is not None:
+                return cached
+        offered = self._select_operations(user_query, context)
+        classification_raw, classification = self._run_classifier(
+            user_query, context, offered or context['operations'], priority, on_event, dispatcher
+        )
+        # Escape hatch: the retrieved ops did not cover the request, so re-ask with the full catalog
+        if offered is not None and classification is not None and self._needs_full_catalog(classification, offered):
+            print("Retrieved ops did not cover the query. Re-classifying with the full catalog.")
+            classification_raw, classification = self._run_classifier(
+                user_query, context, context['operations'], priority, on_event, dispatcher
+            )
+        if classification is None:
+            classification = self._repair_json(classification_raw, CLASSIFICATION_SCHEMA, priority=priority)
+            if classification is None:  # Not cached: the next attempt may well succeed
+                return self._parse_json_with_retry(classification_raw, CLASSIFICATION_SCHEMA, retries=0)
+        if classification.get('mode') == 'need_full_catalog':
+            return {'mode': 'direct', 'direct_response': "None of the available operations can handle that yet. Please rephrase."}
+        if cache and classification.get('mode') in ('direct', 'agentic'):
+            try:
+                cache.store(user_query, cache_key, classification)
+            except Exception as e:
+                print(f"Warning: Classification cache store failed: {e}")
+        return classification
+    def _respond(self, classification: Dict, on_event: Optional[EventCallback] = None,
+                 priority: int = PRIORITY_SYNTHESIZER, dispatcher: Optional[EarlyDispatcher] = None,
+                 interactive: bool = True) -> str:
+        """Route on mode; for agentic plans execute ops, synthesize and store extracted facts.
+        With interactive=False a plan missing parameters raises ClarificationNeeded before any op runs."""
         # 3. Mode Routing
         mode = classification.get('mode', 'direct')
         if mode == 'direct':
-            final_response = classification.get('direct_response', 'No response generated.')
-        else: # agentic
-            # Validate operations structure
-            operations = classification.get('operations', [])
-            if not isinstance(operations, list) or not all(isinstance(op, dict) and 'name' in op for op in operations):
-                final_response = "Invalid operations plan generated. Please rephrase your query."
-                mode = 'direct' # Fallback
-            else:
-                user_summarized_requirements = classification.get('user_summarized_requirements', 'User intent unclear.')
-               
-                # 4. Execute Operations (sequential, append results)
-                op_results = self.perform_operations(operations)
-               
-                # 5. Synthesizer (inputs: requirements + results)
-                synth_task = self.synthesize_response()
-                synth_task.description = synth_task.description.format(
-                    user_summarized_requirements=user_summarized_requirements,
-                    op_results=op_results
-                )
-                synth_agent = self.synthesizer()
-                synth_raw = self._execute_task_with_fallbacks(
-                    synth_agent, synth_task, [self.synthesizer_fallback1_llm, self.synthesizer_fallback2_llm]
-                )
-                synth = parse_json_with_retry(synth_raw)
-               
-                final_response = synth.get('display_response', 'Synthesis failed.')
-               
-                # 6. Extract & Add to KB
-                extracted_facts = synth.get('extracted_fact', [])
-                if extracted_facts:
-                    self.memory_manager.update_long_term({'facts': extracted_facts if isinstance(extracted_facts, list) else [extracted_facts]})
-                    print(f"Added {len(extracted_facts)} facts to KB.")
+            return classification.get('direct_response', 'No response generated.')
+        # agentic: Validate operations structure
+        operations = classification.get('operations', [])
+        if not isinstance(operations, list) or not all(isinstance(op, dict) and 'name' in op for op in operations):
+            return "Invalid operations plan generated. Please rephrase your query."
+        user_summarized_requirements = classification.get('user_summarized_requirements', 'User intent unclear.')
+        if not interactive and operations:
+            missing = self._operations_tool().missing_parameters(operations)
+            if missing:
+                raise ClarificationNeeded(missing)
        
+        # 4. Execute Operations (sequential, append results)
+        records = self.execute_operations(operations, on_event=on_event, dispatcher=dispatcher,
+                                          interactive=interactive) if operations else []
+        # Small results with response templates are rendered locally instead of by the synthesizer LLM
+        local = synthesize_locally(records)
+        if local is not None:
+            _emit(on_event, 'synthesis_token', text=local['display_response'])
+            return self._finish_synthesis(local)
+        # Each result cut to its share of the synthesizer prompt; the full results are never joined
+        bounded = get_result_budget(self.synthesizer_llm.model).fit_records(records, user_summarized_requirements)
+        op_results = "\n".join(_op_line(record) for record in bounded) or "No operations to execute."
+        if classification.get('source') == 'grammar':
+            # Fast-path commands never pay a synthesis round trip; without templates they get the bounded results
+            return op_results
+       
+        # 5. Synthesizer (inputs: requirements + bounded results)
+        synth_task = self._new_task(
+            'synthesize_response',
+            user_summarized_requirements=user_summarized_requirements,
+            op_results=op_results
+        )
+        synth_agent = self._new_agent('synthesizer', self.synthesizer_llm)
+        synth_fallbacks = [self.synthesizer_fallback1_llm, self.synthesizer_fallback2_llm]
+        if on_event:
+            # Only the decoded display_response reaches the client, never the surrounding JSON
+            parser = StreamingPlanParser(text_key='display_response', text_mode=None)
+           
+            def on_token(text):
+                for event in parser.feed(text):
+                    if event['type'] == 'direct_text':
+                        _emit(on_event, 'synthesis_token', text=event['text'])
+           
+            synth_raw = self._stream_task_with_fallbacks(synth_agent, synth_task, synth_fallbacks, on_token, priority)
+        else:
+            synth_raw = self._execute_task_with_fallbacks(synth_agent, synth_task, synth_fallbacks, priority)
+        return self._finish_synthesis(self._parse_json_with_retry(synth_raw, SYNTHESIS_SCHEMA, priority=priority))
+    def _finish_synthesis(self, synth: Dict) -> str:
+        """Store the synthesis' extracted facts and return its display_response."""
+        final_response = synth.get('display_response', 'Synthesis failed.')
+       
+        # 6. Extract & Add to KB
+        extracted_facts = synth.get('extracted_fact', [])
+        if extracted_facts:
+            facts = extracted_facts if isinstance(extracted_facts, list) else [extracted_facts]
+            # update_long_term reads each fact as {'fact', 'source'}
+            self.memory_manager.update_long_term({'facts': [{'fact': f} if isinstance(f, str) else f for f in facts]})
+            print(f"Added {len(facts)} facts to KB.")
+        return final_response
+    def _save_turns(self, history: List[Dict[str, str]], turns: List[tuple], session_id: str = None):
+        """Append (user, assistant) turns, save history and write the periodic narrative."""
         # 7. Save History (always)
-        history.append({"role": "user", "content": user_query + (f" [File: {file_path}]" if file_path else "")})
-        history.append({"role": "assistant", "content": final_response})
+        for user_content, assistant_content in turns:
+            history.append({"role": "user", "content": user_content})
+            history.append({"role": "assistant", "content": assistant_content})
         ChatHistory.save_history(history, session_id)
        
         # 8. Periodic Narrative (unchanged, every 10 turns)
@@ -221,33 +552,192 @@ class AiAgent:
                 narrative = self.memory_manager.create_narrative_summary(json.dumps(history[-5:]))
             except Exception as e:
                 print(f"Warning: Narrative summary failed: {e}")
+    def _needs_input(self, state: Dict[str, Any], missing: Dict[str, List[str]],
+                     on_event: Optional[EventCallback] = None) -> Dict[str, Any]:
+        """Park a classified plan until the user supplies its missing parameters."""
+        response = needs_input_response(get_clarification_store().park(state), missing)
+        _emit(on_event, 'needs_input', **response)
+        return response
+
+    def run_workflow(self, user_query: str, file_path: str = None, session_id: str = None,
+                     on_event: Optional[EventCallback] = None, interactive: bool = True):
+        # on_event (optional) receives stage events: context_loaded, mode_detected, operation_planned,
+        # op_dispatched, classified, op_started, op_finished, synthesis_token, needs_input; classification
+        # and synthesis then use the provider's streaming mode.
+        # interactive=False (servers, jobs): never reads stdin. Returns the response string, or a
+        # needs_input dict ({'status', 'token', 'missing', 'question'}) to pass to resume_workflow.
+        # 1. Input Handling & Sanitization
+        user_query = user_query.strip()
+        if not user_query:
+            return "No query provided."
        
-        # New: Feedback loop for Office refinement (simple CLI prompt if response suggests refinement)
-        if "refine" in final_response.lower() or "edit" in user_query.lower():
+        # Unambiguous commands skip the classifier (and the context it needs); history is still saved
+        grammar = get_intent_grammar() if not file_path else None
+        classification = grammar.match(user_query) if grammar else None
+        dispatcher = None
+        if classification:
+            context = {'history': ChatHistory.load_history(session_id)}
+        else:
+            context = self._load_context(file_path, session_id, on_event)
+            # Read-only ops start while the classifier is still writing the rest of the plan
+            if os.getenv("PIPELINED_DISPATCH", "1") != "0":
+                dispatcher = EarlyDispatcher(self._run_operation, context['registry'])
+        try:
+            if classification is None:
+                classification = self._classify(user_query, context, on_event=on_event, dispatcher=dispatcher)
+            _emit(on_event, 'classified', mode=classification.get('mode', 'direct'), classification=classification)
+            final_response = self._respond(classification, on_event, dispatcher=dispatcher, interactive=interactive)
+        except ClarificationNeeded as e:
+            # History is saved when the resumed plan completes
+            state = {'query': user_query, 'file_path': file_path, 'session_id': session_id,
+                     'classification': classification, 'missing': e.missing}
+            return self._needs_input(state, e.missing, on_event)
+        finally:
+            if dispatcher is not None:
+                dispatcher.close()
+        self._save_turns(
+            context['history'],
+            [(user_query + (f" [File: {file_path}]" if file_path else ""), final_response)],
+            session_id
+        )
+       
+        # New: Feedback loop for Office refinement (simple CLI prompt if response suggests refinement);
+        # without a terminal the refinement is simply the user's next query
+        if interactive and ("refine" in final_response.lower() or "edit" in user_query.lower()):
             feedback = input("Do you want to refine? Enter changes or 'no': ")
             if feedback.lower() != 'no':
-                return self.run_workflow(f"{user_query} with refinement: {feedback}", file_path, session_id)
+                return self.run_workflow(f"{user_query} with refinement: {feedback}", file_path, session_id, on_event)
         
         return final_response
-    def perform_operations(self, operations: List[Dict[str, Any]]) -> str:
-        """Execute list of operations sequentially, append results to a single string."""
-        if not operations:
-            return "No operations to execute."
+    def resume_workflow(self, token: str, answer: str = "", parameters: Optional[Dict[str, Dict[str, Any]]] = None,
+                        on_event: Optional[EventCallback] = None):
+        """Continue a plan parked by run_workflow(interactive=False) without classifying again.
+        answer is the user's free-text reply; parameters ({op_name: {param: value}}) are explicit
+        values and win over the answer; only the parameters the plan asked for are accepted.
+        Returns like run_workflow (possibly another needs_input). Raises UnknownContinuation for
+        unknown, expired or already used tokens and UnexpectedParameters (token kept) for
+        parameters outside the plan's missing ones."""
+
+        def check(state):
+            unexpected = unexpected_parameters(parameters, state['missing'])
+            if unexpected:
+                raise UnexpectedParameters(unexpected, state['missing'])
+
+        state = get_clarification_store().take(token, check)
+        if state is None:
+            raise UnknownContinuation("Unknown or expired continuation token")
+        collected = self._operations_tool().parameters_from_answer(answer or "", state['missing'])
+        for op_name, values in (parameters or {}).items():
+            collected.setdefault(op_name, {}).update(values)
+        operations = [
+            {**op, 'parameters': {**op.get('parameters', {}), **collected.get(op.get('name'), {})}}
+            for op in state['classification'].get('operations', [])
+        ]
+        classification = {**state['classification'], 'operations': operations}
+        try:
+            final_response = self._respond(classification, on_event, interactive=False)
+        except ClarificationNeeded as e:
+            return self._needs_input({**state, 'classification': classification, 'missing': e.missing}, e.missing, on_event)
+        file_path, session_id = state['file_path'], state['session_id']
+        self._save_turns(
+            ChatHistory.load_history(session_id),
+            [(state['query'] + (f" [File: {file_path}]" if file_path else ""), final_response)],
+            session_id
+        )
+        return final_response
+    def run_batch(self, queries: List[str], file_path: str = None, session_id: str = None,
+                  max_concurrency: int = None) -> List[Dict[str, Any]]:
+        """Run many queries against one shared context load.
+        Classifications run concurrently at batch priority in the LLM gateway; operations and synthesis
+        then run in input order so side effects keep their order. Returns one result dict per
+        query, in order: {'index', 'query', 'status': 'ok'|'error', 'result' or 'error'}; plans missing
+        parameters get status 'needs_input' with the run_workflow needs_input fields."""
+        max_concurrency = max_concurrency or int(os.getenv("BATCH_MAX_CONCURRENCY", "4"))
+        context = self._load_context(file_path, session_id)
+        results = [{'index': i, 'query': (q or '').strip()} for i, q in enumerate(queries)]
+        grammar = get_intent_grammar() if not file_path else None
+       
+        def classify_item(item):
+            if not item['query']:
+                raise ValueError("No query provided.")
+            fast = grammar.match(item['query']) if grammar else None
+            return fast or self._classify(item['query'], context, PRIORITY_BATCH)
+       
+        with ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="batch-classify") as pool:
+            futures = [pool.submit(classify_item, item) for item in results]
+            classifications = []
+            for item, future in zip(results, futures):
+                try:
+                    classifications.append(future.result())
+                except Exception as e:
+                    item.update(status='error', error=f"Classification failed: {e}")
+                    classifications.append(None)
        
-        ops_tool = OperationsTool()
-        lines = []
-        for op in operations:
-            name = op.get('name')
-            params = op.get('parameters', {})
+        turns = []
+        for item, classification in zip(results, classifications):
+            if classification is None:
+                continue
             try:
-                # Execute single op (wrap in list for tool compat)
-                single_op = [{'name': name, 'parameters': params}]
-                result = ops_tool._run(single_op)
-                lines.append(f"Operation '{name}': {result}")
+                item.update(status='ok', result=self._respond(classification, priority=PRIORITY_BATCH, interactive=False))
+                turns.append((item['query'], item['result']))
+            except ClarificationNeeded as e:
+                state = {'query': item['query'], 'file_path': file_path, 'session_id': session_id,
+                         'classification': classification, 'missing': e.missing}
+                item.update(self._needs_input(state, e.missing))
             except Exception as e:
-                lines.append(f"Operation '{name}' failed: {str(e)}")
+                item.update(status='error', error=str(e))
+        if turns:
+            try:
+                self._save_turns(context['history'], turns, session_id)
+            except Exception as e:
+                print(f"Warning: Saving batch history failed: {e}")
+        return results
+    def _operations_tool(self) -> OperationsTool:
+        """The OperationsTool shared by every op this agent runs (built on first use)."""
+        with self._ops_tool_lock:
+            if self.ops_tool is None:
+                self.ops_tool = OperationsTool()
+            return self.ops_tool
+    def _run_operation(self, op: Dict[str, Any]) -> Dict[str, Any]:
+        """Execute one op. Returns {'name', 'parameters', 'ok', 'result', 'line' (for prompts)}."""
+        return self._with_line(self._operations_tool().execute(op))
+    @staticmethod
+    def _with_line(record: Dict[str, Any]) -> Dict[str, Any]:
+        return {**record, 'line': _op_line(record, OP_PREVIEW_CHARS)}
+    def execute_operations(self, operations: List[Dict[str, Any]], on_event: Optional[EventCallback] = None,
+                           dispatcher: Optional[EarlyDispatcher] = None, interactive: bool = True) -> List[Dict[str, Any]]:
+        """Execute a plan through the PlanScheduler (independent ops run concurrently, same-name ops
+        with a batched implementation as one call); ops the dispatcher already started while the
+        plan was streaming are joined instead of re-run.
+        Returns one _run_operation record per op, in plan order."""
+        ops_tool = self._operations_tool()
+        prepared = ops_tool.prepare(operations, interactive)
+       
+        def run_op(op):
+            early = dispatcher.claim(op) if dispatcher else None
+            return early.result() if early else self._run_operation(op)
+       
+        def run_batch(ops):
+            # Same-name ops coalesced by the scheduler; ops already started early are joined instead
+            early = [dispatcher.claim(op) if dispatcher else None for op in ops]
+            fresh = iter(ops_tool.execute_batch([op for op, future in zip(ops, early) if future is None]))
+            return [future.result() if future else self._with_line(next(fresh)) for future in early]
        
-        return "\n".join(lines)
+        records = PlanScheduler(ops_tool.registry).run(
+            prepared, run_op,
+            run_batch=run_batch, can_batch=ops_tool.can_batch,
+            on_start=lambda index, op: _emit(on_event, 'op_started', index=index, name=op.get('name'),
+                                             parameters=op.get('parameters', {})),
+            on_finish=lambda index, record: _emit(on_event, 'op_finished', index=index, name=record['name'],
+                                                  ok=record['ok'], result=preview(record['result'], OP_PREVIEW_CHARS))
+        )
+        return [record if 'line' in record else self._with_line(record) for record in records]
+    def perform_operations(self, operations: List[Dict[str, Any]], on_event: Optional[EventCallback] = None,
+                           interactive: bool = True) -> str:
+        """Execute a plan (see execute_operations); one result line per op, in plan order."""
+        if not operations:
+            return "No operations to execute."
+        return "\n".join(record['line'] for record in self.execute_operations(operations, on_event, interactive=interactive))
     @crew
     def crew(self) -> Crew:
         return Crew(agents=self.agents, tasks=self.tasks, process=Process.sequential, verbose=True)
\ No newline at end of file
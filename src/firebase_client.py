@@ -62,10 +62,18 @@ def get_operations() -> list:
         with open(ops_path, "r") as f:
             return json.load(f).get("operations", [])
     return []
+def get_operations_version():
+    """Version stamp of the operations collection (meta/operations.version), or None if unset."""
+    return get_document("meta", "operations", subcollection=False).get("version")
+def bump_operations_version():
+    """Mark the operations collection as changed so cached registries reload it."""
+    db.collection("meta").document("operations").set({"version": firestore.Increment(1)}, merge=True)
 def add_operation(name: str, params: dict, description: str) -> str:
     """Add op to Firestore (for future dynamic ops)."""
     data = {"name": name, "required_parameters": params.get("required", []), "optional_parameters": params.get("optional", []), "description": description}
-    return add_document("operations", data, subcollection=False)
+    op_id = add_document("operations", data, subcollection=False)
+    bump_operations_version()
+    return op_id
 def get_chat_history(session_id: str = None) -> list:
     """Get chat history docs, optionally filtered by session_id."""
     filters = [("session_id", "==", session_id)] if session_id else None
@@ -135,15 +143,31 @@ def set_user_profile(name: str, email: str, timezone: str = "UTC", focus_hours:
     }
     return add_document("users", data, USER_ID, subcollection=False)
 # Tasks
-def add_task(title: str, description: str = None, due_date: str = None, priority: str = "medium",
-             related_files: list = None) -> str:
-    """Create task."""
-    data = {
+def _task_data(title: str, description: str = None, due_date: str = None, priority: str = "medium",
+               related_files: list = None, estimate_min: int = None, user_id: str = None) -> dict:
+    return {
         "title": title, "description": description, "due_date": due_date,
         "status": "pending", "priority": priority, "related_files": related_files or [],
+        "estimate_min": estimate_min, "user_id": user_id or USER_ID,
         "rescheduled_from": None, "created_at": datetime.now().isoformat()
     }
-    return add_document("tasks", data)
+def add_task(title: str, description: str = None, due_date: str = None, priority: str = "medium",
+             related_files: list = None, estimate_min: int = None, user_id: str = None) -> str:
+    """Create task."""
+    return add_document("tasks", _task_data(title, description, due_date, priority, related_files,
+                                            estimate_min, user_id))
+def add_tasks(tasks: list) -> list:
+    """Create several tasks (dicts of add_task arguments) with WriteBatch commits. Returns their ids.
+    Firestore caps a batch at 500 writes, so larger lists are committed in chunks."""
+    ids = []
+    for start in range(0, len(tasks), 500):
+        batch = db.batch()
+        for task in tasks[start:start + 500]:
+            ref = get_user_ref().collection("tasks").document()
+            batch.set(ref, _task_data(**task))
+            ids.append(ref.id)
+        batch.commit()
+    return ids
 def get_tasks(status: str = None) -> list:
     """List tasks."""
     filters = [("status", "==", status)] if status else None
@@ -290,10 +314,63 @@ def get_rules(enabled_only: bool = True) -> list:
     filters = [("enabled", "==", True)] if enabled_only else None
     return query_collection("rules", filters)
 # Operations Queue
-def queue_operation(op_name: str, params: dict) -> str:
-    """Queue operation (optional async)."""
+def queue_operation(op_name: str, params: dict, max_attempts: int = 3) -> str:
+    """Queue operation for the background job workers."""
+    now = datetime.now().isoformat()
     data = {
         "op_name": op_name, "params": params, "status": "pending",
-        "created_at": datetime.now().isoformat()
+        "attempts": 0, "max_attempts": max_attempts, "next_attempt_at": now,
+        "lease_owner": None, "lease_expires_at": None, "result": None, "error": None,
+        "created_at": now, "updated_at": now
     }
-    return add_document("operations_queue", data)
\ No newline at end of file
+    return add_document("operations_queue", data)
+def get_queued_operation(job_id: str) -> dict:
+    """Get a queued operation (with its id) or {}."""
+    data = get_document("operations_queue", job_id)
+    if data:
+        data["id"] = job_id
+    return data
+@firestore.transactional
+def _lease_queued_operation(transaction, ref, worker_id: str, lease_seconds: int) -> dict:
+    data = ref.get(transaction=transaction).to_dict() or {}
+    now = datetime.now()
+    pending = data.get("status") == "pending" and (data.get("next_attempt_at") or "") <= now.isoformat()
+    expired = data.get("status") == "running" and (data.get("lease_expires_at") or "") <= now.isoformat()
+    if not (pending or expired):
+        return {}  # Claimed by another worker since the query ran
+    update = {
+        "status": "running", "lease_owner": worker_id,
+        "lease_expires_at": (now + timedelta(seconds=lease_seconds)).isoformat(),
+        "attempts": data.get("attempts", 0) + 1, "updated_at": now.isoformat()
+    }
+    transaction.update(ref, update)
+    data.update(update)
+    data["id"] = ref.id
+    return data
+def claim_queued_operation(worker_id: str, lease_seconds: int = 300) -> dict:
+    """Lease the next runnable queued operation: pending and due, or running with an expired lease.
+    Both queries need the composite indexes in firestore.indexes.json (status + next_attempt_at,
+    status + lease_expires_at); without them Firestore rejects them with FailedPrecondition."""
+    now = datetime.now().isoformat()
+    queue = get_user_ref().collection("operations_queue")
+    due = (queue.where(filter=firestore.FieldFilter("status", "==", "pending"))
+                .where(filter=firestore.FieldFilter("next_attempt_at", "<=", now))
+                .order_by("next_attempt_at").limit(5))
+    abandoned = (queue.where(filter=firestore.FieldFilter("status", "==", "running"))
+                      .where(filter=firestore.FieldFilter("lease_expires_at", "<=", now)).limit(5))
+    for snapshot in list(due.stream()) + list(abandoned.stream()):
+        claimed = _lease_queued_operation(db.transaction(), snapshot.reference, worker_id, lease_seconds)
+        if claimed:
+            return claimed
+    return {}
+@firestore.transactional
+def _update_leased_operation(transaction, ref, worker_id: str, data: dict) -> bool:
+    current = ref.get(transaction=transaction).to_dict() or {}
+    if current.get("lease_owner") != worker_id or current.get("status") != "running":
+        return False  # Lease lost; another worker owns the job now
+    transaction.update(ref, {**data, "updated_at": datetime.now().isoformat()})
+    return True
+def update_leased_operation(job_id: str, worker_id: str, data: dict) -> bool:
+    """Update a queued operation only while worker_id still holds its lease."""
+    ref = get_user_ref().collection("operations_queue").document(job_id)
+    return _update_leased_operation(db.transaction(), ref, worker_id, data)
\ No newline at end of file
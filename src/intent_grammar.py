@@ -0,0 +1,193 @@
+# src/intent_grammar.py
+# Deterministic fast path for command-style queries ("List tasks", "Create task Buy groceries",
+# "Start focus session for 25 min"). A small grammar is compiled from the operation registry:
+# each op gets a pattern "<verb> [fillers] <noun> [rest]" built from its name, and the rest of
+# the utterance is parsed into the op's parameter slots. A query maps straight to an operations
+# plan only when exactly one op matches and every required parameter is filled with nothing
+# left over; anything else returns None and goes to the LLM classifier.
+import os
+import re
+import threading
+from typing import Any, Callable, Dict, List, Optional
+from firebase_client import USER_ID
+from operation_registry import get_operation_registry
+
+# Verb in the op name -> words users type for it
+VERB_SYNONYMS = {
+    "create": ("create", "add", "new", "make"),
+    "list": ("list", "show", "display"),
+    "read": ("read", "open", "cat"),
+    "delete": ("delete", "remove"),
+    "start": ("start", "begin"),
+    "end": ("end", "stop", "finish"),
+    "search": ("search", "find"),
+    "find": ("find", "search"),
+    "fetch": ("fetch", "get", "check"),
+    "mark": ("mark", "complete"),
+    "compute": ("compute", "calculate"),
+}
+# Noun in the op name -> words users type for it
+NOUN_SYNONYMS = {
+    "task": ("task", "todo"),
+    "email": ("email", "mail"),
+    "snapshot": ("snapshot", "backup"),
+    "word": ("word document", "word doc", "word", "document"),
+    "excel": ("excel sheet", "excel", "spreadsheet"),
+    "ppt": ("ppt", "powerpoint", "presentation"),
+    "kb": ("kb", "knowledge base", "note"),
+}
+FILLERS = r"(?:(?:a|an|the|my|new|all)\s+)*"
+# Parameters parsed from a path token, a duration or free text
+PATH_PARAMS = {"path", "file_path", "target_path", "paths"}
+TEXT_PARAMS = {"title", "query", "query_text", "content", "cmd", "name", "content_md"}
+DURATION_PARAMS = {"duration_min"}
+# Filled from the environment rather than the utterance
+AMBIENT_PARAMS = {"user_id": lambda: USER_ID}
+
+_PATH = re.compile(r"(?:^|\s)(?:in|at|from|of|under|inside)?\s*(?P<path>(?:[A-Za-z]:)?(?:~|\.{1,2})?[\\/][^\s]*|\.)(?=\s|$)")
+_DURATION = re.compile(r"(?:^|\s)(?:for\s+)?(?P<n>\d+)\s*(?P<unit>h|hr|hrs|hours?|m|mins?|minutes?)(?=\s|$)", re.IGNORECASE)
+_TEXT_LEAD = re.compile(r"^(?:called|named|titled|about|for|to|:|-)\s*", re.IGNORECASE)
+# Free text that chains a second command or carries a date/time is more than one slot value:
+# "Create task X and email Y", "Add task call mom tomorrow at 5pm" go to the classifier
+_COMPOUND = re.compile(
+    r"[;&]|\b(?:and|then|also|plus|after|afterwards|before|next|finally|as well as)\b", re.IGNORECASE)
+_WHEN = re.compile(
+    r"\b(?:today|tonight|tomorrow|yesterday|noon|midnight|morning|afternoon|evening|weekend"
+    r"|every|daily|weekly|monthly|(?:mon|tues|wednes|thurs|fri|satur|sun)day"
+    r"|january|february|march|april|june|july|august|september|october|november|december)\b"
+    r"|\b\d{1,2}(?::\d{2})?\s*(?:am|pm)\b|\b\d{1,2}:\d{2}\b|\b\d{4}-\d{2}-\d{2}\b|\b\d{1,2}/\d{1,2}\b"
+    r"|\b(?:in|within)\s+\d+\s*(?:min(?:ute)?s?|h(?:ou)?rs?|days?|weeks?)\b|\b(?:next|this|last)\s+(?:week|month|year)\b",
+    re.IGNORECASE,
+)
+
+
+def _alternatives(words, plural: bool = True) -> str:
+    suffix = "s?" if plural else ""
+    return "|".join(re.escape(w).replace(r"\ ", r"\s+") + suffix for w in sorted(words, key=len, reverse=True))
+
+
+class _OpRule:
+    """Compiled pattern and slot lists for one operation."""
+
+    def __init__(self, op: Dict[str, Any]):
+        self.name = op["name"]
+        self.required = list(op.get("required_parameters", []))
+        parts = self.name.split(".")
+        action = parts[-1].split("_")
+        verb, extra = action[0], action[1:]
+        noun = parts[-2] if len(parts) > 1 else None
+        verbs = VERB_SYNONYMS.get(verb, (verb,))
+        nouns = NOUN_SYNONYMS.get(noun, (noun,)) if noun else ()
+        if extra:
+            # "focus.start_session": "start session", "start focus session"; "file.list_large_files": "list large files"
+            extra_words = r"\s+".join(re.escape(w) for w in extra) + "s?"
+            noun_pattern = (rf"(?:(?:{_alternatives(nouns)})\s+)?" if nouns and noun not in extra else "") + extra_words
+        else:
+            noun_pattern = rf"(?:{_alternatives(nouns)})" if nouns else None
+        self.pattern = None
+        if noun_pattern:
+            self.pattern = re.compile(
+                rf"^(?:please\s+)?(?P<verb>{_alternatives(verbs, plural=False)})\s+{FILLERS}(?P<noun>{noun_pattern})(?:\s+(?P<rest>.*))?$",
+                re.IGNORECASE,
+            )
+
+    def match(self, query: str) -> Optional[Dict[str, Any]]:
+        """(specificity, parameters) if the query fully fills this op, else None."""
+        m = self.pattern.match(query) if self.pattern else None
+        if not m:
+            return None
+        params = self._fill_slots((m.group("rest") or "").strip())
+        if params is None:
+            return None
+        return {"specificity": m.end("noun"), "parameters": params}
+
+    def _fill_slots(self, rest: str) -> Optional[Dict[str, Any]]:
+        params = {}
+        for slot in self.required:
+            if slot in AMBIENT_PARAMS:
+                params[slot] = AMBIENT_PARAMS[slot]()
+        for slot in (s for s in self.required if s in DURATION_PARAMS):
+            m = _DURATION.search(rest)
+            if not m:
+                return None
+            minutes = int(m.group("n")) * (60 if m.group("unit").lower().startswith("h") else 1)
+            params[slot] = minutes
+            rest = (rest[:m.start()] + rest[m.end():]).strip()
+        path_slots = [s for s in self.required if s in PATH_PARAMS]
+        if len(path_slots) > 1:
+            return None
+        for slot in path_slots:
+            m = _PATH.search(rest)
+            if not m:
+                return None
+            params[slot] = [m.group("path")] if slot == "paths" else m.group("path")
+            rest = (rest[:m.start()] + rest[m.end():]).strip()
+        text_slots = [s for s in self.required if s in TEXT_PARAMS]
+        if len(text_slots) > 1:
+            return None
+        for slot in text_slots:
+            text = _TEXT_LEAD.sub("", rest).strip().strip("\"'")
+            if not text or _COMPOUND.search(text) or _WHEN.search(text):
+                return None
+            params[slot] = text
+            rest = ""
+        if rest or any(slot not in params for slot in self.required):
+            return None  # Unparsed qualifiers or unknown slots: leave it to the LLM
+        return params
+
+
+def _safe_for_fast_path(op: Dict[str, Any]) -> bool:
+    """Ops that ask for confirmation keep going through the LLM."""
+    safety = str(op.get("safety", "")).replace(" ", "").lower()
+    return "confirm" not in safety or safety == "confirm_required=false"
+
+
+class IntentGrammar:
+    """Compiled fast-path rules for one version of the op catalog."""
+
+    def __init__(self, operations: List[Dict[str, Any]], validate: Callable = None):
+        self.rules = [_OpRule(op) for op in operations if "name" in op and _safe_for_fast_path(op)]
+        self.validate = validate  # OperationRegistry.validate: the same check the dispatcher applies
+
+    def match(self, query: str) -> Optional[Dict[str, Any]]:
+        """Classification dict (same shape as the LLM classifier's) for an unambiguous command, else None."""
+        query = re.sub(r"\s+", " ", (query or "").strip().rstrip(".!"))
+        if not query:
+            return None
+        matches = []
+        for rule in self.rules:
+            found = rule.match(query)
+            if found:
+                matches.append((found["specificity"], rule.name, found["parameters"]))
+        if not matches:
+            return None
+        matches.sort(key=lambda m: m[0], reverse=True)
+        if len(matches) > 1 and matches[0][0] == matches[1][0]:
+            return None  # Ambiguous
+        _, name, params = matches[0]
+        if self.validate and not self.validate(name, params)[0]:
+            return None
+        return {
+            "mode": "agentic",
+            "operations": [{"name": name, "parameters": params}],
+            "user_summarized_requirements": query,
+            "source": "grammar",
+        }
+
+
+_grammar = None
+_grammar_version = None
+_grammar_lock = threading.Lock()
+
+
+def get_intent_grammar() -> Optional[IntentGrammar]:
+    """Grammar for the current operation registry (recompiled when its version changes), or None
+    when disabled with INTENT_FAST_PATH=0."""
+    global _grammar, _grammar_version
+    if os.getenv("INTENT_FAST_PATH", "1") != "1":
+        return None
+    registry = get_operation_registry()
+    with _grammar_lock:
+        if _grammar is None or registry.version != _grammar_version:
+            _grammar, _grammar_version = IntentGrammar(registry.operations, registry.validate), registry.version
+        return _grammar
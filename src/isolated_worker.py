@@ -0,0 +1,92 @@
+# src/isolated_worker.py
+# Entry point of the worker processes started by process_pool.py. It runs as a script
+# (python isolated_worker.py <connection fd> <memory_mb>) so a worker imports this module and
+# the modules of the ops it is asked to run, nothing of the server. Kept free of project imports.
+import importlib
+import sys
+from multiprocessing.connection import Connection
+
+try:
+    import resource  # Not available on Windows: limits are then wall-clock only
+except ImportError:
+    resource = None
+
+
+def _address_space() -> int:
+    """Current virtual memory size in bytes, from /proc (0 where it is not available)."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmSize:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return 0
+
+
+def _limit_memory(memory_mb: int):
+    """Allow memory_mb more of address space on top of what the worker already maps."""
+    if resource is None or not memory_mb:
+        return
+    limit = _address_space() + memory_mb * 1024 * 1024
+    hard = resource.getrlimit(resource.RLIMIT_AS)[1]
+    if hard != resource.RLIM_INFINITY:
+        limit = min(limit, hard)
+    try:
+        resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+    except (ValueError, OSError) as e:
+        print(f"Warning: Could not set memory limit in worker: {e}")
+
+
+def _limit_cpu(cpu_s: int):
+    """Allow cpu_s more seconds of CPU from now (RLIMIT_CPU counts the process' lifetime)."""
+    if resource is None or not cpu_s:
+        return
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    soft = int(usage.ru_utime + usage.ru_stime) + int(cpu_s)
+    hard = resource.getrlimit(resource.RLIMIT_CPU)[1]
+    if hard != resource.RLIM_INFINITY:
+        soft = min(soft, hard)
+    try:
+        resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+    except (ValueError, OSError) as e:
+        print(f"Warning: Could not set CPU limit in worker: {e}")
+
+
+def serve(conn: Connection, memory_mb: int):
+    """Worker loop: (entrypoint, params, cpu_s, output_cap) in, (ok, result) out; None stops it."""
+    _limit_memory(memory_mb)
+    while True:
+        try:
+            task = conn.recv()
+        except (EOFError, OSError, KeyboardInterrupt):
+            break  # The server went away
+        if task is None:
+            break
+        entrypoint, params, cpu_s, output_cap = task
+        _limit_cpu(cpu_s)
+        try:
+            module_name, _, attr = entrypoint.partition(":")
+            function = importlib.import_module(module_name)
+            for part in attr.split("."):
+                function = getattr(function, part)
+        except Exception as e:
+            conn.send((False, f"Import error - {entrypoint}: {e}"))
+            continue
+        try:
+            success, result = function(**params)
+            result = str(result)
+            if len(result) > output_cap:
+                result = f"{result[:output_cap]}... (truncated, {len(result)} chars)"
+            reply = (bool(success), result)
+        except MemoryError:
+            reply = (False, f"Exceeded memory limit ({memory_mb} MB)")
+        except TypeError as e:
+            reply = (False, f"Parameter error - {str(e)}")
+        except Exception as e:
+            reply = (False, f"Execution error - {str(e)}")
+        conn.send(reply)
+
+
+if __name__ == "__main__":
+    serve(Connection(int(sys.argv[1])), int(sys.argv[2]))
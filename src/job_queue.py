@@ -0,0 +1,264 @@
+# src/job_queue.py
+# Background job queue for long agentic work (dashboard generation, folder reindexing, ...).
+# Jobs are the documents firebase_client.queue_operation writes to `operations_queue`:
+#   op_name "workflow"   -> params {"query", "session_id"} run through AiAgent.run_workflow
+#   op_name "operations" -> params {"operations": [...]} run through AiAgent.perform_operations
+#   any other op_name    -> a single queued operation with its params
+# Workers lease a job, heartbeat the lease while it runs, and either persist the result
+# or reschedule it with exponential backoff. SQLiteJobStore is a drop-in local stand-in
+# for the Firestore collection (JOB_QUEUE_BACKEND=sqlite).
+import json
+import os
+from abc import ABC, abstractmethod
+import random
+import sqlite3
+import threading
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict
+from common_functions.Find_project_root import find_project_root
+from utils.logger import setup_logger
+
+PROJECT_ROOT = find_project_root()
+DEFAULT_SQLITE_PATH = os.path.join(PROJECT_ROOT, "knowledge", "storage", "jobs.sqlite3")
+logger = setup_logger()
+
+
+class JobStore(ABC):
+    """Interface shared by the Firestore and SQLite job backends."""
+
+    @abstractmethod
+    def enqueue(self, op_name: str, params: dict, max_attempts: int = 3) -> str:
+        ...
+
+    @abstractmethod
+    def get(self, job_id: str) -> dict:
+        ...
+
+    @abstractmethod
+    def claim(self, worker_id: str, lease_seconds: int) -> dict:
+        """Lease the next runnable job, or return {}."""
+
+    @abstractmethod
+    def update_leased(self, job_id: str, worker_id: str, data: dict) -> bool:
+        """Apply data only if worker_id still holds the lease."""
+
+
+class FirestoreJobStore(JobStore):
+    """users/{USER_ID}/operations_queue via firebase_client."""
+
+    def __init__(self):
+        import firebase_client  # Imported lazily so the SQLite backend works without Firestore
+        self.client = firebase_client
+
+    def enqueue(self, op_name: str, params: dict, max_attempts: int = 3) -> str:
+        return self.client.queue_operation(op_name, params, max_attempts=max_attempts)
+
+    def get(self, job_id: str) -> dict:
+        return self.client.get_queued_operation(job_id)
+
+    def claim(self, worker_id: str, lease_seconds: int) -> dict:
+        return self.client.claim_queued_operation(worker_id, lease_seconds)
+
+    def update_leased(self, job_id: str, worker_id: str, data: dict) -> bool:
+        return self.client.update_leased_operation(job_id, worker_id, data)
+
+
+class SQLiteJobStore(JobStore):
+    """Local operations_queue with the same document shape, for running without Firestore."""
+
+    COLUMNS = ("id", "op_name", "params", "status", "attempts", "max_attempts", "next_attempt_at",
+               "lease_owner", "lease_expires_at", "result", "error", "created_at", "updated_at")
+
+    def __init__(self, path: str = None):
+        self.path = path or os.getenv("JOB_QUEUE_SQLITE_PATH", DEFAULT_SQLITE_PATH)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS operations_queue ("
+                "id TEXT PRIMARY KEY, op_name TEXT NOT NULL, params TEXT NOT NULL, status TEXT NOT NULL, "
+                "attempts INTEGER NOT NULL DEFAULT 0, max_attempts INTEGER NOT NULL DEFAULT 3, "
+                "next_attempt_at TEXT, lease_owner TEXT, lease_expires_at TEXT, result TEXT, error TEXT, "
+                "created_at TEXT NOT NULL, updated_at TEXT NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_queue_due ON operations_queue (status, next_attempt_at)")
+
+    def _connect(self) -> sqlite3.Connection:
+        # One short-lived connection per call keeps the store safe to share across worker threads
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _to_dict(self, row: sqlite3.Row) -> dict:
+        data = dict(row)
+        data["params"] = json.loads(data["params"])
+        if data["result"] is not None:
+            data["result"] = json.loads(data["result"])
+        return data
+
+    def enqueue(self, op_name: str, params: dict, max_attempts: int = 3) -> str:
+        job_id = uuid.uuid4().hex
+        now = datetime.now().isoformat()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO operations_queue (id, op_name, params, status, attempts, max_attempts, "
+                "next_attempt_at, created_at, updated_at) VALUES (?, ?, ?, 'pending', 0, ?, ?, ?, ?)",
+                (job_id, op_name, json.dumps(params, default=str), max_attempts, now, now, now),
+            )
+        return job_id
+
+    def get(self, job_id: str) -> dict:
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM operations_queue WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row) if row else {}
+
+    def claim(self, worker_id: str, lease_seconds: int) -> dict:
+        now = datetime.now()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")  # Serializes claimers across threads and processes
+            row = conn.execute(
+                "SELECT * FROM operations_queue WHERE (status = 'pending' AND next_attempt_at <= ?) "
+                "OR (status = 'running' AND lease_expires_at <= ?) ORDER BY next_attempt_at LIMIT 1",
+                (now.isoformat(), now.isoformat()),
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return {}
+            lease_expires_at = (now + timedelta(seconds=lease_seconds)).isoformat()
+            conn.execute(
+                "UPDATE operations_queue SET status = 'running', lease_owner = ?, lease_expires_at = ?, "
+                "attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                (worker_id, lease_expires_at, now.isoformat(), row["id"]),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        job = self._to_dict(row)
+        job.update(status="running", lease_owner=worker_id, lease_expires_at=lease_expires_at,
+                   attempts=job["attempts"] + 1)
+        return job
+
+    def update_leased(self, job_id: str, worker_id: str, data: dict) -> bool:
+        data = {**data, "updated_at": datetime.now().isoformat()}
+        if "result" in data:
+            data["result"] = json.dumps(data["result"], default=str)
+        fields = [k for k in data if k in self.COLUMNS]
+        assignments = ", ".join(f"{k} = ?" for k in fields)
+        with self._connect() as conn:
+            cursor = conn.execute(
+                f"UPDATE operations_queue SET {assignments} WHERE id = ? AND lease_owner = ? AND status = 'running'",
+                [data[k] for k in fields] + [job_id, worker_id],
+            )
+        return cursor.rowcount == 1
+
+
+def create_job_store(backend: str = None) -> JobStore:
+    """JOB_QUEUE_BACKEND=firestore (default) or sqlite. Firestore is probed with one document read;
+    if the client can't be set up or the read fails, the local SQLite queue is used instead."""
+    backend = (backend or os.getenv("JOB_QUEUE_BACKEND", "firestore")).lower()
+    if backend == "firestore":
+        try:
+            store = FirestoreJobStore()
+            store.get("_probe")
+            return store
+        except Exception as e:
+            logger.warning(f"Firestore job queue unavailable ({e}); using local SQLite queue")
+    return SQLiteJobStore()
+
+
+class JobWorkerPool:
+    """Background threads that lease jobs, heartbeat their leases and retry with backoff."""
+
+    def __init__(self, store: JobStore, handler: Callable[[dict], Any], workers: int = None,
+                 lease_seconds: int = None, poll_interval: float = None,
+                 backoff_base: float = None, backoff_max: float = None):
+        self.store = store
+        self.handler = handler
+        self.workers = workers if workers is not None else int(os.getenv("JOB_WORKERS", "2"))
+        self.lease_seconds = lease_seconds or int(os.getenv("JOB_LEASE_S", "300"))
+        self.poll_interval = poll_interval or float(os.getenv("JOB_POLL_INTERVAL_S", "1.0"))
+        self.backoff_base = backoff_base or float(os.getenv("JOB_BACKOFF_BASE_S", "5"))
+        self.backoff_max = backoff_max or float(os.getenv("JOB_BACKOFF_MAX_S", "600"))
+        self._stop = threading.Event()
+        self._threads = []
+        self._lock = threading.Lock()
+        self._counts = {"claimed": 0, "succeeded": 0, "retried": 0, "failed": 0, "lease_lost": 0}
+
+    def start(self):
+        for i in range(self.workers):
+            worker_id = f"{os.getpid()}-{i}-{uuid.uuid4().hex[:6]}"
+            thread = threading.Thread(target=self._loop, args=(worker_id,), name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info(f"Started {self.workers} job workers ({type(self.store).__name__})")
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def _count(self, key: str):
+        with self._lock:
+            self._counts[key] += 1
+
+    def _backoff(self, attempts: int) -> float:
+        delay = min(self.backoff_max, self.backoff_base * (2 ** max(0, attempts - 1)))
+        return delay * random.uniform(0.8, 1.2)  # Jitter so failed jobs don't retry in lockstep
+
+    def _heartbeat(self, job_id: str, worker_id: str, done: threading.Event):
+        """Extend the lease while the handler runs so long jobs aren't stolen."""
+        while not done.wait(self.lease_seconds / 3):
+            expires = (datetime.now() + timedelta(seconds=self.lease_seconds)).isoformat()
+            try:
+                if not self.store.update_leased(job_id, worker_id, {"lease_expires_at": expires}):
+                    return
+            except Exception as e:
+                logger.warning(f"Lease heartbeat failed for job {job_id}: {e}")
+
+    def _loop(self, worker_id: str):
+        while not self._stop.is_set():
+            try:
+                job = self.store.claim(worker_id, self.lease_seconds)
+            except Exception as e:
+                logger.error(f"Job claim failed: {e}")
+                job = {}
+            if not job:
+                self._stop.wait(self.poll_interval)
+                continue
+            self._count("claimed")
+            self._process(job, worker_id)
+
+    def _process(self, job: dict, worker_id: str):
+        job_id = job["id"]
+        done = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(job_id, worker_id, done), daemon=True)
+        heartbeat.start()
+        try:
+            result = self.handler(job)
+            update, outcome = {"status": "succeeded", "result": result, "error": None, "lease_owner": None}, "succeeded"
+        except Exception as e:
+            attempts = job.get("attempts", 1)
+            if attempts < job.get("max_attempts", 3):
+                retry_at = (datetime.now() + timedelta(seconds=self._backoff(attempts))).isoformat()
+                update, outcome = {"status": "pending", "error": str(e), "next_attempt_at": retry_at,
+                                   "lease_owner": None, "lease_expires_at": None}, "retried"
+            else:
+                update, outcome = {"status": "failed", "error": str(e), "lease_owner": None}, "failed"
+            logger.warning(f"Job {job_id} attempt {attempts} failed: {e} -> {update['status']}")
+        finally:
+            done.set()
+            heartbeat.join()
+        if self.store.update_leased(job_id, worker_id, update):
+            self._count(outcome)
+        else:
+            self._count("lease_lost")
+            logger.warning(f"Job {job_id}: lease lost before result could be stored")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"workers": len(self._threads), "backend": type(self.store).__name__, **self._counts}
@@ -0,0 +1,220 @@
+# src/llm_gateway.py
+# Process-wide LLM gateway: every LLM call (classifier, synthesizer, summarizer, batch)
+# reserves budget here before it goes out. Each provider API key gets a requests-per-minute
+# and tokens-per-minute token bucket (limits in knowledge/configs/llm_limits.json), waiters
+# are served strictly by priority so an interactive classification never queues behind
+# background summarization, and litellm is given one pooled HTTP client for all calls.
+import hashlib
+import heapq
+import itertools
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Dict
+from rate_limiter import TokenBucket
+from common_functions.Find_project_root import find_project_root
+from utils.metrics import summarize_ms
+
+PROJECT_ROOT = find_project_root()
+LIMITS_PATH = os.path.join(PROJECT_ROOT, "knowledge", "configs", "llm_limits.json")
+
+# Lower value = served first
+PRIORITY_CLASSIFIER = 0
+PRIORITY_SYNTHESIZER = 1
+PRIORITY_BATCH = 2
+PRIORITY_SUMMARIZER = 3
+
+# Completion tokens are unknown until the call returns; reserve this much up front
+DEFAULT_COMPLETION_TOKENS = 512
+
+
+class BudgetExhaustedError(Exception):
+    """No budget became available for this key within max_wait_seconds; try another provider."""
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 chars per token) used for budget reservations."""
+    return max(1, len(text or "") // 4)
+
+
+class _Lease:
+    """Reservation handed to the caller; record() settles the token estimate with the real output."""
+
+    def __init__(self, budget: "_KeyBudget", reserved_tokens: int):
+        self.budget = budget
+        self.reserved_tokens = reserved_tokens
+        self.prompt_tokens = reserved_tokens - DEFAULT_COMPLETION_TOKENS
+        self.settled = False
+
+    def record(self, output: str = None, total_tokens: int = None):
+        if self.settled:
+            return
+        self.settled = True
+        if total_tokens is None:
+            total_tokens = self.prompt_tokens + estimate_tokens(output)
+        self.budget.settle(self.reserved_tokens, total_tokens)
+
+
+class _KeyBudget:
+    """RPM/TPM buckets for one provider key plus its priority-ordered waiters."""
+
+    def __init__(self, key_id: str, rpm: float, tpm: float):
+        self.key_id = key_id
+        self.requests = TokenBucket(rate=rpm, per=60.0)
+        self.tokens = TokenBucket(rate=tpm, per=60.0)
+        self.cond = threading.Condition()
+        self.waiters = []
+        self.requests_used = 0
+        self.tokens_used = 0
+        self.throttled = 0
+        self.rejected = 0
+        self.wait_ms = deque(maxlen=500)
+
+    def acquire(self, priority: int, tokens: int, max_wait: float, seq: int) -> float:
+        """Block until this waiter is first in line and both buckets have room. Returns wait ms."""
+        start = time.monotonic()
+        deadline = start + max_wait
+        entry = (priority, seq)
+        throttled = False
+        with self.cond:
+            heapq.heappush(self.waiters, entry)
+            try:
+                while True:
+                    wait = max_wait  # Non-head waiters sleep until notified
+                    if self.waiters[0] == entry:
+                        wait = self.requests.try_acquire(1)
+                        if wait == 0.0:
+                            wait = self.tokens.try_acquire(tokens)
+                            if wait == 0.0:
+                                break
+                            self.requests.refund(1)
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.rejected += 1
+                        raise BudgetExhaustedError(f"LLM budget for {self.key_id} exhausted after {max_wait:.0f}s")
+                    throttled = True
+                    self.cond.wait(timeout=min(wait, remaining))
+            finally:
+                self.waiters.remove(entry)
+                heapq.heapify(self.waiters)
+                self.cond.notify_all()
+            self.requests_used += 1
+            self.throttled += int(throttled)
+            waited = (time.monotonic() - start) * 1000
+            self.wait_ms.append(waited)
+            return waited
+
+    def settle(self, reserved: int, actual: int):
+        with self.cond:
+            self.tokens_used += actual
+            if actual < reserved:
+                self.tokens.refund(reserved - actual)
+            elif actual > reserved:
+                self.tokens.try_acquire(actual - reserved)  # Best effort: overdraw shows up as later throttling
+            self.cond.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        with self.cond:
+            return {
+                "rpm_limit": self.requests.rate,
+                "tpm_limit": self.tokens.rate,
+                "requests_available": round(self.requests.available(), 2),
+                "tokens_available": round(self.tokens.available()),
+                "requests_used": self.requests_used,
+                "tokens_used": self.tokens_used,
+                "waiting": len(self.waiters),
+                "throttled_waits": self.throttled,
+                "rejected": self.rejected,
+                "wait_ms": summarize_ms(self.wait_ms),
+            }
+
+
+class LLMGateway:
+    """Shared budget keeper for all agents and threads; use get_gateway()."""
+
+    def __init__(self, limits: Dict[str, Any] = None):
+        self.limits = limits if limits is not None else self._load_limits()
+        self.max_wait = float(os.getenv("LLM_GATEWAY_MAX_WAIT_S", self.limits.get("max_wait_seconds", 30)))
+        self._budgets: Dict[str, _KeyBudget] = {}
+        self._lock = threading.Lock()
+        self._seq = itertools.count()
+        self._install_http_pool()
+
+    @staticmethod
+    def _load_limits() -> Dict[str, Any]:
+        try:
+            with open(LIMITS_PATH, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"Warning: Could not load {LIMITS_PATH}: {e}. Using default LLM limits.")
+            return {}
+
+    def _install_http_pool(self):
+        """Give litellm one keep-alive connection pool instead of a client per request."""
+        pool = self.limits.get("http_pool", {})
+        try:
+            import httpx
+            import litellm
+            if litellm.client_session is None:
+                litellm.client_session = httpx.Client(
+                    limits=httpx.Limits(
+                        max_connections=pool.get("max_connections", 32),
+                        max_keepalive_connections=pool.get("max_keepalive_connections", 16),
+                    ),
+                    timeout=pool.get("timeout_seconds", 120),
+                )
+        except Exception as e:
+            print(f"Warning: Pooled HTTP client unavailable: {e}")
+
+    def _limits_for(self, model: str) -> Dict[str, float]:
+        provider = model.split("/", 1)[0]
+        merged = dict(self.limits.get("default", {"rpm": 60, "tpm": 1000000}))
+        merged.update(self.limits.get(provider, {}))
+        merged.update(self.limits.get(model, {}))
+        rpm = float(os.getenv(f"LLM_RPM_{provider.upper()}", merged.get("rpm", 60)))
+        tpm = float(os.getenv(f"LLM_TPM_{provider.upper()}", merged.get("tpm", 1000000)))
+        return {"rpm": rpm, "tpm": tpm}
+
+    def _budget(self, model: str, api_key: str) -> _KeyBudget:
+        # Free-tier limits apply per key, so keys (not models) get their own buckets
+        provider = model.split("/", 1)[0]
+        key_hash = hashlib.sha256((api_key or "").encode()).hexdigest()[:8]
+        key_id = f"{provider}:{key_hash}"
+        with self._lock:
+            if key_id not in self._budgets:
+                limits = self._limits_for(model)
+                self._budgets[key_id] = _KeyBudget(key_id, limits["rpm"], limits["tpm"])
+            return self._budgets[key_id]
+
+    @contextmanager
+    def acquire(self, model: str, api_key: str, priority: int = PRIORITY_SYNTHESIZER, prompt: str = ""):
+        """Reserve one request and the prompt's estimated tokens; raises BudgetExhaustedError on timeout."""
+        budget = self._budget(model, api_key)
+        reserved = estimate_tokens(prompt) + DEFAULT_COMPLETION_TOKENS
+        budget.acquire(priority, reserved, self.max_wait, next(self._seq))
+        lease = _Lease(budget, reserved)
+        try:
+            yield lease
+        finally:
+            lease.record()  # Unrecorded leases settle at prompt size
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            budgets = dict(self._budgets)
+        return {key_id: budget.stats() for key_id, budget in budgets.items()}
+
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+
+def get_gateway() -> LLMGateway:
+    """The process-wide gateway, created on first use."""
+    global _gateway
+    with _gateway_lock:
+        if _gateway is None:
+            _gateway = LLMGateway()
+        return _gateway
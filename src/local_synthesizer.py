@@ -0,0 +1,49 @@
+# src/local_synthesizer.py
+# Renders the final answer for small operation results without the synthesizer LLM.
+# Ops in the operation registry may declare a "response_template" (and optionally a
+# "fact_template"), formatted with the op's parameters plus {result}. When every executed op
+# has a template and the combined results are short, display_response and extracted facts are
+# produced locally; anything bigger or unusual still goes to synthesize_response.
+import os
+from typing import Any, Dict, List, Optional
+from operation_registry import get_operation_registry
+
+FAILURE_TEMPLATE = "Couldn't complete {name}: {result}"
+
+
+def _render(template: str, record: Dict[str, Any]) -> Optional[str]:
+    values = {**record.get("parameters", {}), "name": record["name"], "result": record["result"]}
+    try:
+        return template.format(**values).strip()
+    except (KeyError, IndexError, ValueError):
+        return None  # Template needs a value this call did not have
+
+
+def synthesize_locally(records: List[Dict[str, Any]], max_chars: int = None,
+                       max_ops: int = None) -> Optional[Dict[str, Any]]:
+    """{'display_response', 'extracted_fact'} for small results, or None to use the LLM synthesizer.
+    records are perform_operations results: {'name', 'parameters', 'ok', 'result'}."""
+    max_chars = max_chars or int(os.getenv("LOCAL_SYNTH_MAX_CHARS", "600"))
+    max_ops = max_ops or int(os.getenv("LOCAL_SYNTH_MAX_OPS", "3"))
+    if not records or len(records) > max_ops:
+        return None
+    if any(hasattr(record["result"], "__next__") or hasattr(record["result"], "read") for record in records):
+        return None  # Streamed results are bounded by result_budget on the synthesizer path
+    if sum(len(str(record["result"])) for record in records) > max_chars:
+        return None
+    registry = get_operation_registry()
+    lines, facts = [], []
+    for record in records:
+        spec = registry.get(record["name"]) or {}
+        if "response_template" not in spec:
+            return None
+        line = _render(spec["response_template"] if record["ok"] else FAILURE_TEMPLATE, record)
+        if line is None:
+            return None
+        lines.append(line)
+        # Deterministic fact extraction: one fact per successful op that declares a fact template
+        if record["ok"] and "fact_template" in spec:
+            fact = _render(spec["fact_template"], record)
+            if fact:
+                facts.append(fact)
+    return {"display_response": "\n".join(lines), "extracted_fact": facts}
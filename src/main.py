@@ -5,8 +5,23 @@ import warnings
 from datetime import datetime
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, __version__ as pydantic_version
+from typing import Any, Dict, List, Optional
 from crew import AiAgent
+from agent_pool import AgentPool, AgentPoolTimeout
+from request_executor import BoundedExecutor, QueueFullError
+from job_queue import JobWorkerPool, create_job_store
+from llm_gateway import get_gateway
+from provider_health import get_provider_health
+from circuit_breaker import get_breakers
+from classification_cache import get_classification_cache
+from context_loader import context_load_stats
+from plan_scheduler import pipeline_stats
+from tools.plugin_loader import get_plugin_loader
+from process_pool import get_process_pool
+from op_result_cache import get_op_result_cache
+from clarification import UnexpectedParameters, UnknownContinuation, get_clarification_store, is_needs_input
 import traceback
 from uvicorn import Config, Server
 import asyncio
@@ -23,6 +38,13 @@ if pydantic_version.startswith("2"):
     from pydantic import PydanticDeprecatedSince20
     warnings.filterwarnings("ignore", category=PydanticDeprecatedSince20)
 
+# Process-wide pool of warmed agents (size via AGENT_POOL_SIZE); shared by server and CLI
+agent_pool = AgentPool(AiAgent)
+# Background jobs get their own agents so long jobs can never take every interactive agent
+job_agent_pool = AgentPool(AiAgent, size=int(os.getenv("JOB_AGENT_POOL_SIZE", os.getenv("JOB_WORKERS", "2"))))
+# Workflows run off the event loop; one worker per pooled agent unless overridden
+request_executor = BoundedExecutor(max_workers=int(os.getenv("MAX_CONCURRENT_QUERIES", agent_pool.size)))
+
 # FastAPI app setup
 app = FastAPI(title="AI Assistant API")
 
@@ -39,6 +61,97 @@ app.add_middleware(
 class QueryRequest(BaseModel):
     query: str
 
+# Answer to a needs_input response: free text and/or explicit {op_name: {param: value}}
+class ResumeRequest(BaseModel):
+    token: str
+    answer: Optional[str] = None
+    parameters: Optional[Dict[str, Dict[str, Any]]] = None
+
+# Batch input: many queries sharing one context load
+class BatchQueryRequest(BaseModel):
+    queries: List[str]
+    session_id: Optional[str] = None
+
+# Background job input: either a query for the full workflow or a ready operations plan
+class JobRequest(BaseModel):
+    query: Optional[str] = None
+    operations: Optional[List[Dict[str, Any]]] = None
+    session_id: Optional[str] = None
+    max_attempts: int = 3
+
+@app.on_event("startup")
+async def warm_agent_pool():
+    """Pay agent construction (LLM clients, embedder, FAISS) once, before serving."""
+    if os.getenv("AGENT_POOL_WARM", "1") != "1":
+        return
+    try:
+        await asyncio.to_thread(agent_pool.warm)
+    except Exception as e:
+        logger.error(f"Agent pool warm-up failed, falling back to lazy creation: {str(e)}")
+
+@app.on_event("shutdown")
+async def stop_request_executor():
+    request_executor.shutdown()
+
+@app.on_event("startup")
+async def warm_process_pool():
+    """Start the isolated op workers before the first heavy op needs one."""
+    if os.getenv("ISOLATED_WARM", "1") != "1":
+        return
+    try:
+        await asyncio.to_thread(get_process_pool().warm)
+    except Exception as e:
+        logger.error(f"Process pool warm-up failed, workers will start on demand: {str(e)}")
+
+@app.on_event("shutdown")
+async def stop_process_pool():
+    await asyncio.to_thread(get_process_pool().shutdown)
+
+def _run_job(job: dict):
+    """Job worker handler for operations_queue documents (agents come from job_agent_pool)."""
+    params = job.get("params") or {}
+    with job_agent_pool.checkout() as crew_instance:
+        if job["op_name"] == "workflow":
+            # A needs_input result is stored as the job result; the client resumes via /process_query/resume
+            return crew_instance.run_workflow(params["query"], session_id=params.get("session_id"), interactive=False)
+        if job["op_name"] == "operations":
+            return crew_instance.perform_operations(params["operations"], interactive=False)
+        # Single operation queued directly via firebase_client.queue_operation(op_name, params)
+        return crew_instance.perform_operations([{"name": job["op_name"], "parameters": params}], interactive=False)
+
+job_store = None
+job_workers = None
+
+@app.on_event("startup")
+async def start_job_workers():
+    global job_store, job_workers
+    job_store = await asyncio.to_thread(create_job_store)
+    # One worker per job agent, so a claimed job never waits for an agent
+    job_workers = JobWorkerPool(job_store, _run_job, workers=job_agent_pool.size)
+    job_workers.start()
+
+@app.on_event("shutdown")
+async def stop_job_workers():
+    if job_workers:
+        await asyncio.to_thread(job_workers.stop)
+
+def _run_pooled_workflow(query: str, on_event=None):
+    """Worker-thread body: borrow a pooled agent and run the synchronous workflow."""
+    with agent_pool.checkout() as crew_instance:
+        return crew_instance.run_workflow(query, on_event=on_event, interactive=False)
+
+def _run_pooled_resume(request: ResumeRequest, on_event=None):
+    with agent_pool.checkout() as crew_instance:
+        return crew_instance.resume_workflow(request.token, request.answer or "", request.parameters, on_event)
+
+def _run_pooled_batch(queries: List[str], session_id: str = None):
+    with agent_pool.checkout() as crew_instance:
+        return crew_instance.run_batch(queries, session_id=session_id)
+
+def _sse(event: str, data: dict) -> str:
+    """Format one server-sent event."""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
 # API endpoint for processing queries
 @app.post("/process_query")
 async def process_query(request: QueryRequest):
@@ -47,15 +160,154 @@ async def process_query(request: QueryRequest):
         logger.error("No query provided in API request")
         raise HTTPException(status_code=400, detail="No query provided")
     try:
-        crew_instance = AiAgent()
-        final_response = crew_instance.run_workflow(request.query)
+        final_response, timings = await request_executor.run(_run_pooled_workflow, request.query)
+        logger.info(f"Query '{request.query}' queued {timings['queue_ms']} ms, executed {timings['exec_ms']} ms")
         logger.debug(f"API response for query '{request.query}': {final_response}")
-        return {"result": final_response}
+        if is_needs_input(final_response):
+            return {**final_response, "timings": timings}
+        return {"result": final_response, "timings": timings}
+    except QueueFullError as e:
+        logger.warning(f"Shedding query '{request.query}': {str(e)}")
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except AgentPoolTimeout as e:
+        logger.error(f"Agent pool exhausted for query '{request.query}': {str(e)}")
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         logger.error(f"Error processing query '{request.query}': {str(e)}")
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
 
+# Continue a plan that returned needs_input (no re-classification)
+@app.post("/process_query/resume")
+async def resume_query(request: ResumeRequest):
+    logger.info(f"Resuming clarification {request.token[:8]}...")
+    if not request.answer and not request.parameters:
+        raise HTTPException(status_code=400, detail="Provide 'answer' or 'parameters'")
+    try:
+        final_response, timings = await request_executor.run(_run_pooled_resume, request)
+    except UnknownContinuation as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except UnexpectedParameters as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except AgentPoolTimeout as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error resuming clarification: {str(e)}")
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
+    if is_needs_input(final_response):
+        return {**final_response, "timings": timings}
+    return {"result": final_response, "timings": timings}
+
+# Batch endpoint: per-item results in input order, failures reported per item
+@app.post("/process_queries")
+async def process_queries(request: BatchQueryRequest):
+    logger.info(f"Received batch of {len(request.queries)} queries")
+    if not request.queries:
+        raise HTTPException(status_code=400, detail="No queries provided")
+    max_batch = int(os.getenv("BATCH_MAX_QUERIES", "500"))
+    if len(request.queries) > max_batch:
+        raise HTTPException(status_code=413, detail=f"Batch too large: {len(request.queries)} > {max_batch}")
+    try:
+        results, timings = await request_executor.run(_run_pooled_batch, request.queries, request.session_id)
+    except QueueFullError as e:
+        logger.warning(f"Shedding batch: {str(e)}")
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except AgentPoolTimeout as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error processing batch: {str(e)}")
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
+    failed = sum(1 for item in results if item.get("status") == "error")
+    logger.info(f"Batch done: {len(results) - failed} ok, {failed} failed in {timings['exec_ms']} ms")
+    return {"results": results, "failed": failed, "timings": timings}
+
+# Streaming variant: stage events and synthesis tokens as server-sent events
+@app.post("/process_query/stream")
+async def process_query_stream(request: QueryRequest):
+    logger.info(f"Received streaming API query: {request.query}")
+    if not request.query:
+        logger.error("No query provided in API request")
+        raise HTTPException(status_code=400, detail="No query provided")
+    loop = asyncio.get_running_loop()
+    events = asyncio.Queue()
+
+    def on_event(event: str, payload: dict):
+        # Called from the worker thread; hand the event to the response generator
+        loop.call_soon_threadsafe(events.put_nowait, (event, payload))
+
+    try:
+        future, timings = request_executor.submit(_run_pooled_workflow, request.query, on_event)
+    except QueueFullError as e:
+        logger.warning(f"Shedding query '{request.query}': {str(e)}")
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    future.add_done_callback(lambda _f: loop.call_soon_threadsafe(events.put_nowait, None))
+
+    async def event_stream():
+        yield _sse("accepted", {"query": request.query})
+        while True:
+            item = await events.get()
+            if item is None:
+                break
+            yield _sse(*item)
+        try:
+            final_response = future.result()
+            logger.info(f"Query '{request.query}' queued {timings['queue_ms']} ms, executed {timings['exec_ms']} ms")
+            yield _sse("done", {"result": final_response, "timings": timings})
+        except Exception as e:
+            logger.error(f"Error processing streaming query '{request.query}': {str(e)}")
+            yield _sse("error", {"detail": f"Error: {str(e)}"})
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+# Asynchronous jobs: enqueue now, poll for the result later
+@app.post("/jobs", status_code=202)
+async def create_job(request: JobRequest):
+    if bool(request.query) == bool(request.operations):
+        raise HTTPException(status_code=400, detail="Provide exactly one of 'query' or 'operations'")
+    if request.query:
+        op_name, params = "workflow", {"query": request.query, "session_id": request.session_id}
+    else:
+        op_name, params = "operations", {"operations": request.operations}
+    job_id = await asyncio.to_thread(job_store.enqueue, op_name, params, request.max_attempts)
+    logger.info(f"Queued job {job_id} ({op_name})")
+    return {"job_id": job_id, "status": "pending"}
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = await asyncio.to_thread(job_store.get, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return {key: job.get(key) for key in (
+        "id", "op_name", "status", "attempts", "max_attempts", "result", "error",
+        "next_attempt_at", "created_at", "updated_at"
+    )}
+
+@app.get("/metrics")
+async def metrics():
+    """In-process runtime metrics."""
+    classifier_cache = get_classification_cache()
+    return {
+        "agent_pool": agent_pool.stats(),
+        "job_agent_pool": job_agent_pool.stats(),
+        "request_executor": request_executor.stats(),
+        "job_workers": job_workers.stats() if job_workers else {},
+        "llm_budget": get_gateway().stats(),
+        "llm_providers": get_provider_health().stats(),
+        "llm_circuits": get_breakers().stats(get_provider_health()),
+        "classifier_cache": classifier_cache.stats() if classifier_cache else {},
+        "context_sources": context_load_stats(),
+        "pipeline": pipeline_stats(),
+        "operation_plugins": get_plugin_loader().stats(),
+        "isolated_workers": get_process_pool().stats(),
+        "clarifications": get_clarification_store().stats(),
+        "op_result_cache": get_op_result_cache().stats(),
+    }
+
 # CLI-related functions
 REQUIRED_PROFILE_KEYS = [
     "Name", "Role", "Location", "Productive Time", "Reminder Type",
@@ -146,8 +398,8 @@ def run_single_query(user_query=None):
     print(f"\n🔍 Processing: '{user_query}' (Profile: {profile.get('Name', 'Unknown')})")
     logger.info(f"Processing query: {user_query} for user {profile.get('Name', 'Unknown')}")
     try:
-        crew_instance = AiAgent()
-        final_response = crew_instance.run_workflow(user_query)
+        with agent_pool.checkout() as crew_instance:
+            final_response = crew_instance.run_workflow(user_query)
         print(final_response)
         logger.debug(f"Query response: {final_response}")
         return True
@@ -1,11 +1,13 @@
 import os
 import json
+import threading
 from datetime import date, timedelta
 from langchain_community.vectorstores import FAISS
 from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_community.docstore.in_memory import InMemoryDocstore
 import faiss
 from common_functions.Find_project_root import find_project_root
+from token_budget import get_token_budget
 from firebase_client import (
     query_collection, add_kb_entry, search_kb, add_summary, get_summaries,
     get_tasks, add_task, get_projects, add_project, get_user_profile
@@ -15,15 +17,28 @@ PROJECT_ROOT = find_project_root()
 CONFIG_DIR = os.path.join(PROJECT_ROOT, "knowledge", "configs")
 LONG_TERM_DIR = os.path.join(PROJECT_ROOT, "knowledge", "memory", "long_term")
 VECTOR_INDEX_DIR = os.path.join(LONG_TERM_DIR, "vector_index")
+DEFAULT_EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
+# Embedders are immutable and expensive to load, so every MemoryManager (and any other
+# component embedding text) shares one instance per model for the life of the process.
+_EMBEDDERS = {}
+_EMBEDDERS_LOCK = threading.Lock()
+
+def get_shared_embedder(model_name: str = DEFAULT_EMBEDDING_MODEL) -> HuggingFaceEmbeddings:
+    """Return the process-wide embedder for model_name, loading it on first use."""
+    with _EMBEDDERS_LOCK:
+        if model_name not in _EMBEDDERS:
+            _EMBEDDERS[model_name] = HuggingFaceEmbeddings(
+                model_name=model_name,
+                model_kwargs={"device": "cpu"}
+            )
+        return _EMBEDDERS[model_name]
 
 class MemoryManager:
     def __init__(self):
         self.policy = self.safe_load_json(os.path.join(CONFIG_DIR, "memory_policy.json"), default={})
         self.rag_config = self.safe_load_json(os.path.join(CONFIG_DIR, "rag_config.json"), default={})
-        self.embedder = HuggingFaceEmbeddings(
-            model_name=self.rag_config.get("embedding_model", "sentence-transformers/all-MiniLM-L6-v2"),
-            model_kwargs={"device": "cpu"}
-        )
+        self.embedder = get_shared_embedder(self.rag_config.get("embedding_model", DEFAULT_EMBEDDING_MODEL))
         self.vectorstore = self.load_or_create_vectorstore()
 
     def safe_load_json(self, path, default=None):
@@ -92,15 +107,9 @@ class MemoryManager:
             k = k or self.rag_config.get("top_k", 5)
             results = self.vectorstore.similarity_search_with_score(query, k=k)
             relevant = [doc.page_content for doc, score in results if score >= self.rag_config.get("min_similarity", 0.7)]
-            total_len = 0
-            truncated = []
-            max_tokens = self.policy.get("long_term_tokens", 800) * 1.33
-            for r in relevant:
-                if total_len + len(r) > max_tokens:
-                    break
-                truncated.append(r)
-                total_len += len(r)
-            return "\n".join(truncated)
+            # Whole memories, best first, until the long-term token budget is spent
+            budget = get_token_budget()
+            return "\n".join(budget.fit_items(relevant, self.policy.get("long_term_tokens", 800)))
         except Exception as e:
             print(f"FAISS error: {e}. Fallback to Firestore KB search.")
             kb_matches = search_kb(query, k)
@@ -110,8 +119,7 @@ class MemoryManager:
         summaries = get_summaries()
         if summaries:
             latest = summaries[-1].get("summary_text", "")
-            max_len = int(self.policy.get("narrative_tokens", 300) * 1.33)
-            return latest[:max_len] + "..." if len(latest) > max_len else latest
+            return get_token_budget().fit_text(latest, self.policy.get("narrative_tokens", 300))
         return ""
 
     def update_long_term(self, extracted):
@@ -156,8 +164,15 @@ class MemoryManager:
         return get_user_profile()
 
     def assemble_prompt_context(self, summarized_history, user_profile, narrative_summary, relevant_long_term):
-        context = f"Short-term: {summarized_history}\nProfile: {json.dumps(user_profile)}\nNarrative: {narrative_summary}\nLong-term: {relevant_long_term}\n"
-        total_budget = sum(self.policy.values()) * 1.33 if self.policy else 2000
-        if len(context) > total_budget:
-            context = context[:int(total_budget)] + "... (truncated)"
+        # Each section is fitted to its own policy budget instead of slicing the joined string
+        budget = get_token_budget()
+        short_term = budget.fit_text(str(summarized_history), self.policy.get("short_term_tokens", 1000))
+        if isinstance(user_profile, dict):
+            profile = budget.fit_json(user_profile, budget.section_cap("profile"))
+        else:
+            profile = json.dumps(user_profile)
+        narrative = budget.fit_text(str(narrative_summary), self.policy.get("narrative_tokens", 300))
+        memories = str(relevant_long_term).split("\n") if relevant_long_term else []
+        long_term = "\n".join(budget.fit_items(memories, self.policy.get("long_term_tokens", 800)))
+        context = f"Short-term: {short_term}\nProfile: {profile}\nNarrative: {narrative}\nLong-term: {long_term}\n"
         return context
\ No newline at end of file
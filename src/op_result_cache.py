@@ -0,0 +1,164 @@
+# src/op_result_cache.py
+# Memoization of read-only operation results in the dispatcher (OperationsTool.execute).
+# Agents repeat the same reads within a query and across consecutive ones (file.list, task.list,
+# kb.search, ...). A successful result of a read-only op is kept under its name and canonical
+# (coerced) parameters and served again until it is invalidated:
+# - Write versions: every capability domain ("db" for db_read/db_write, "fs", "email", "network",
+#   ...) has a counter that any non-read-only op touching it bumps when it runs; an entry only
+#   matches while the counters of its own domains are unchanged (task.create invalidates
+#   task.list, kb.create_entry invalidates kb.search). Ops without known capabilities bump all.
+# - Files: fs ops also record (mtime, inode, size) of their path parameters, so edits made
+#   outside the assistant are noticed too. A directory's mtime only covers its direct entries;
+#   deeper changes by other programs are bounded by the TTL.
+# - Time and size: entries expire after OP_CACHE_TTL_S (or the op's "cache_ttl_s") and the least
+#   recently used are dropped beyond OP_CACHE_MAX_ENTRIES. Ops with "cacheable": false are never kept.
+# Changes made by other processes (e.g. another client writing to Firestore) are only bounded by
+# the TTL. Disable with OP_CACHE=0.
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+from operation_registry import get_operation_registry
+from plan_scheduler import capabilities_of, is_read_only, op_key
+
+ALL_DOMAINS = "*"
+
+
+def capability_domain(capability: str) -> str:
+    """'db_read' / 'db_write' -> 'db'; 'email_send' -> 'email'; 'network' -> 'network'."""
+    for suffix in ("_read", "_write", "_send"):
+        if capability.endswith(suffix):
+            return capability[:-len(suffix)]
+    return capability
+
+
+def op_domains(op_def: Optional[Dict[str, Any]]) -> frozenset:
+    """Domains an op reads or writes; unknown ops and ops without capabilities touch all of them."""
+    capabilities = capabilities_of(op_def or {})
+    if not capabilities or "N/A" in capabilities:
+        return frozenset([ALL_DOMAINS])
+    return frozenset(capability_domain(c) for c in capabilities)
+
+
+def _file_state(path: Any) -> Optional[Tuple[int, int, int]]:
+    try:
+        st = os.stat(path)
+        return st.st_mtime_ns, st.st_ino, st.st_size
+    except (OSError, TypeError, ValueError):
+        return None
+
+
+class OpResultCache:
+    """LRU + TTL cache of read-only op results; use get_op_result_cache()."""
+
+    def __init__(self, ttl_s: float = None, max_entries: int = None):
+        self.ttl_s = ttl_s or float(os.getenv("OP_CACHE_TTL_S", "60"))
+        self.max_entries = max_entries or int(os.getenv("OP_CACHE_MAX_ENTRIES", "512"))
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._versions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._by_op: Dict[str, Dict[str, int]] = {}
+        self._counts = {"hits": 0, "misses": 0, "stale": 0, "stores": 0, "evictions": 0, "invalidations": 0}
+
+    @staticmethod
+    def enabled() -> bool:
+        return os.getenv("OP_CACHE", "1") != "0"
+
+    @staticmethod
+    def cacheable(op_def: Optional[Dict[str, Any]]) -> bool:
+        return op_def is not None and op_def.get("cacheable", True) and is_read_only(op_def)
+
+    def _count(self, name: str, key: str):
+        self._counts[key] += 1
+        per_op = self._by_op.setdefault(name, {"hits": 0, "misses": 0, "stale": 0})
+        if key in per_op:
+            per_op[key] += 1
+
+    def _fingerprint(self, name: str, params: Dict[str, Any], domains: frozenset) -> tuple:
+        """What the entry depends on: its domains' write versions and, for fs ops, its files' states."""
+        versions = tuple(sorted((d, self._versions.get(d, 0)) for d in domains | {ALL_DOMAINS}))
+        if "fs" not in domains:
+            return versions, ()
+        types = getattr(get_operation_registry().validators.get(name), "types", {})
+        files = []
+        for param, spec in sorted(types.items()):
+            if spec.get("type") not in ("path", "list[path]") or param not in params:
+                continue
+            values = params[param] if isinstance(params[param], list) else [params[param]]
+            files.extend((value, _file_state(value)) for value in values)
+        return versions, tuple(files)
+
+    def lookup(self, name: str, params: Dict[str, Any]) -> Tuple[Optional[Any], Optional[tuple]]:
+        """(cached result or None, fingerprint to pass to store()). Both None if the op is not cacheable."""
+        op_def = get_operation_registry().get(name)
+        if not self.enabled() or not self.cacheable(op_def):
+            return None, None
+        key = op_key({"name": name, "parameters": params})
+        fingerprint = self._fingerprint(name, params, op_domains(op_def))
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires, stored_fingerprint, result = entry
+                if expires > now and stored_fingerprint == fingerprint:
+                    self._entries.move_to_end(key)
+                    self._count(name, "hits")
+                    return result, fingerprint
+                del self._entries[key]
+                self._count(name, "stale")
+            self._count(name, "misses")
+        return None, fingerprint
+
+    def store(self, name: str, params: Dict[str, Any], fingerprint: tuple, result: Any):
+        """Keep a successful result under the fingerprint taken before the op ran."""
+        if hasattr(result, "__next__") or hasattr(result, "read"):
+            return  # Streamed results (generators, open files) can only be consumed once
+        op_def = get_operation_registry().get(name) or {}
+        ttl = float(op_def.get("cache_ttl_s", self.ttl_s))
+        key = op_key({"name": name, "parameters": params})
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, fingerprint, result)
+            self._entries.move_to_end(key)
+            self._counts["stores"] += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._counts["evictions"] += 1
+
+    def record_write(self, name: str):
+        """Bump the write versions of the domains a (possibly) mutating op touches."""
+        op_def = get_operation_registry().get(name)
+        if op_def is not None and is_read_only(op_def):
+            return
+        domains = op_domains(op_def)
+        with self._lock:
+            for domain in domains:
+                self._versions[domain] = self._versions.get(domain, 0) + 1
+            self._counts["invalidations"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._counts["hits"] + self._counts["misses"]
+            return {
+                "entries": len(self._entries),
+                **self._counts,
+                "hit_rate": round(self._counts["hits"] / lookups, 4) if lookups else 0.0,
+                "write_versions": dict(self._versions),
+                "by_op": {name: dict(counts) for name, counts in self._by_op.items()},
+            }
+
+
+_cache: Optional[OpResultCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_op_result_cache() -> OpResultCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = OpResultCache()
+        return _cache
@@ -0,0 +1,287 @@
+# src/operation_registry.py
+# One in-memory catalog of operation definitions, shared by the classifier prompt, RagTool, the
+# intent grammar, the local synthesizer and the dispatcher. It is built once per content version
+# instead of being re-read per query or per OperationsTool:
+# - Source: the Firestore "operations" collection when it has entries, else knowledge/operations.json.
+# - Invalidation: the file's mtime (checked at most every OPS_FILE_CHECK_S seconds), or the
+#   Firestore meta/operations "version" field (at most every OPS_VERSION_CHECK_S seconds). A reload
+#   whose content hash is unchanged keeps the current registry, so caches keyed on `version`
+#   survive it. Between checks the registry is returned without locking; one caller does the
+#   check and any reload, outside the lock, while the others keep using the current registry.
+# Parameter validators and catalog lines are compiled when the registry is built.
+# Parameter types come from each op's "parameter_schema" and, for parameters it does not
+# cover, the shared "parameter_types" in operations.json (by parameter name). A spec is a type
+# name ("int", "float", "bool", "str", "path", "date", "datetime", "dict", "list", "list[<type>]",
+# "any") or {"type", "default", "enum", "min", "max", "min_length", "max_length", "pattern"}.
+# Typed ops are checked by a pydantic model (built on first use) that coerces LLM strings
+# ("5" -> 5, "yes" -> True, "~/a/../b" -> "/home/u/b", "2025-09-14" date checked, a single
+# value -> [value] for lists) and reports failures as {"param", "code", "message", "input"}.
+# "legacy_operations" in operations.json holds the pre-registry op names the tool still accepts,
+# each with the same keys an op definition uses for dispatch ("entrypoint", ...).
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from common_functions.Find_project_root import find_project_root
+
+PROJECT_ROOT = find_project_root()
+OPS_PATH = os.path.join(PROJECT_ROOT, "knowledge", "operations.json")
+
+
+def format_operation(op: Dict[str, Any]) -> str:
+    """One catalog line: 'name | parameters: req, opt=None | description'."""
+    params = op.get('required_parameters', []) + [f'{p}=None' for p in op.get('optional_parameters', [])]
+    return f"{op['name']} | parameters: {', '.join(params)} | {op.get('description', '')}"
+
+
+def _normalize_path(value: str) -> str:
+    return os.path.normpath(os.path.expanduser(value.strip()))
+
+
+def _as_list(value: Any) -> Any:
+    return [value] if isinstance(value, (str, int, float, dict)) else value
+
+
+def _as_dict(value: Any) -> Any:
+    if isinstance(value, str):
+        try:
+            return json.loads(value)
+        except ValueError:
+            pass
+    return value
+
+
+def _field_type(spec: Dict[str, Any]):
+    """Python type (with pydantic constraints) for one parameter spec."""
+    import datetime
+    from typing import Annotated, Literal
+    from pydantic import AfterValidator, BeforeValidator, Field
+    name = spec.get("type", "any")
+    constraints = {key: spec[key] for key in ("min_length", "max_length", "pattern") if key in spec}
+    if "min" in spec:
+        constraints["ge"] = spec["min"]
+    if "max" in spec:
+        constraints["le"] = spec["max"]
+    if "enum" in spec:
+        return Literal[tuple(spec["enum"])]
+    if name.startswith("list"):
+        inner = name[5:-1] if name.startswith("list[") else "any"
+        return Annotated[List[_field_type({"type": inner})], BeforeValidator(_as_list), Field(**constraints)]
+    base = {
+        "str": str, "int": int, "float": float, "bool": bool, "any": Any,
+        "date": datetime.date, "datetime": datetime.datetime,
+        "path": Annotated[str, AfterValidator(_normalize_path)],
+        "dict": Annotated[Dict[str, Any], BeforeValidator(_as_dict)],
+    }.get(name, Any)
+    return Annotated[base, Field(**constraints)] if constraints else base
+
+
+class ParamCheck:
+    """Result of ParamValidator.check: coerced params or machine-readable errors."""
+
+    def __init__(self, params: Dict[str, Any], errors: List[Dict[str, Any]] = None, message: str = "Valid parameters"):
+        self.params = params
+        self.errors = errors or []
+        self.message = message
+        self.ok = not self.errors
+        self.missing = [e["param"] for e in self.errors if e["code"] == "missing"]
+
+
+class ParamValidator:
+    """Parameter check for one operation: names always, types/constraints when declared."""
+
+    def __init__(self, name: str, required: List[str], optional: List[str], types: Dict[str, Dict[str, Any]] = None):
+        self.name = name
+        self.required = list(required)
+        self.allowed = list(required) + list(optional)
+        self._allowed_set = frozenset(self.allowed)
+        self.types = types or {}
+        self.defaults = {p: spec["default"] for p, spec in self.types.items() if "default" in spec}
+        self._model = None
+
+    def _compile(self):
+        from pydantic import ConfigDict, create_model
+        fields = {}
+        for param in self.allowed:
+            spec = self.types.get(param, {})
+            field_type = _field_type(spec)
+            fields[param] = (field_type, ...) if param in self.required else (Optional[field_type], None)
+        config = ConfigDict(extra="forbid", coerce_numbers_to_str=True, str_strip_whitespace=True)
+        return create_model(f"Params_{self.name.replace('.', '_')}", __config__=config, **fields)
+
+    def check(self, params: Dict[str, Any]) -> ParamCheck:
+        """Names, then (for typed ops) types and constraints, with coercion."""
+        invalid = [p for p in params if p not in self._allowed_set]
+        missing = [p for p in self.required if p not in params]
+        if invalid or missing:
+            errors = [{"param": p, "code": "extra_forbidden", "message": "Unknown parameter", "input": params[p]}
+                      for p in invalid]
+            errors += [{"param": p, "code": "missing", "message": "Required parameter", "input": None} for p in missing]
+            message = (f"Invalid parameters for {self.name}: {invalid}. Valid: {self.allowed}" if invalid else
+                       f"Missing required parameters for {self.name}: {missing}")
+            return ParamCheck(params, errors, message)
+        if not self.types:
+            return ParamCheck(params)
+        if self._model is None:
+            self._model = self._compile()
+        from pydantic import ValidationError
+        try:
+            model = self._model.model_validate(params)
+        except ValidationError as e:
+            errors = [{"param": ".".join(str(part) for part in err["loc"]), "code": err["type"],
+                       "message": err["msg"], "input": err.get("input")} for err in e.errors()]
+            details = "; ".join(f"{err['param']}: {err['message']}" for err in errors)
+            return ParamCheck(params, errors, f"Invalid values for {self.name}: {details}")
+        coerced = {**self.defaults, **model.model_dump(mode="json", exclude_unset=True)}
+        return ParamCheck(coerced)
+
+    def validate(self, params: Dict[str, Any]) -> Tuple[bool, str, List[str]]:
+        """(is_valid, message, missing required parameters)."""
+        result = self.check(params)
+        return result.ok, result.message, result.missing
+
+
+class OperationRegistry:
+    """Immutable snapshot of the catalog; use get_operation_registry()."""
+
+    def __init__(self, operations: List[Dict[str, Any]], source: str, parameter_types: Dict[str, Any] = None,
+                 legacy_operations: Dict[str, Dict[str, Any]] = None):
+        self.operations = [op for op in operations if isinstance(op, dict) and op.get("name")]
+        self.source = source
+        self.parameter_types = parameter_types or {}
+        self.legacy_operations = legacy_operations or {}
+        self.version = hashlib.sha1(
+            json.dumps([self.operations, self.parameter_types, self.legacy_operations],
+                       sort_keys=True, default=str).encode("utf-8")
+        ).hexdigest()[:16]
+        self.by_name = {op["name"]: op for op in self.operations}
+        self.validators = {op["name"]: self._validator(op) for op in self.operations}
+        self.lines = {op["name"]: format_operation(op) for op in self.operations}
+        self.names = "\n".join(op["name"] for op in self.operations)
+
+    def _validator(self, op: Dict[str, Any]) -> ParamValidator:
+        required, optional = op.get("required_parameters", []), op.get("optional_parameters", [])
+        schema = op.get("parameter_schema", {})
+        types = {}
+        for param in list(required) + list(optional):
+            spec = schema.get(param, self.parameter_types.get(param))
+            if spec is not None:
+                types[param] = {"type": spec} if isinstance(spec, str) else dict(spec)
+        return ParamValidator(op["name"], required, optional, types)
+
+    def get(self, name: str) -> Optional[Dict[str, Any]]:
+        return self.by_name.get(name)
+
+    def dispatch_definition(self, name: str) -> Optional[Dict[str, Any]]:
+        """The op's definition, or its legacy_operations entry for a pre-registry name."""
+        return self.by_name.get(name) or self.legacy_operations.get(name)
+
+    def validate(self, name: str, params: Dict[str, Any]) -> Tuple[bool, str, List[str]]:
+        validator = self.validators.get(name)
+        if validator is None:
+            return False, f"Unknown op: {name}", []
+        return validator.validate(params)
+
+    def check(self, name: str, params: Dict[str, Any]) -> ParamCheck:
+        """Coerced params or machine-readable errors for a call of op `name`."""
+        validator = self.validators.get(name)
+        if validator is None:
+            return ParamCheck(params, [{"param": None, "code": "unknown_operation", "message": f"Unknown op: {name}",
+                                        "input": name}], f"Unknown op: {name}")
+        return validator.check(params)
+
+    def line(self, op: Dict[str, Any]) -> str:
+        return self.lines.get(op.get("name")) or format_operation(op)
+
+
+_registry: Optional[OperationRegistry] = None
+_source_token = None
+_checked_at = 0.0
+_check_interval = 0.0
+_registry_lock = threading.Lock()  # Guards the swap of _registry/_source_token/_checked_at
+_refresh_lock = threading.Lock()   # Only one caller checks the source and reloads at a time
+_firestore = None  # firebase_client module, False once it failed to import
+
+
+def _firebase():
+    global _firestore
+    if _firestore is None:
+        try:
+            import firebase_client
+            _firestore = firebase_client
+        except Exception as e:
+            print(f"Warning: Firestore operations unavailable ({e}). Using operations.json.")
+            _firestore = False
+    return _firestore or None
+
+
+def _load_json() -> Dict[str, Any]:
+    try:
+        with open(OPS_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"Warning: Could not load {OPS_PATH}: {e}")
+        return {}
+
+
+def _current_token(firebase) -> Any:
+    """What identifies the catalog's current content without loading it."""
+    try:
+        mtime = os.path.getmtime(OPS_PATH)
+    except OSError:
+        mtime = None
+    if firebase is not None:
+        try:
+            version = firebase.get_operations_version()
+            if version is not None:
+                return ("firestore", version, mtime)
+        except Exception as e:
+            print(f"Warning: Could not read operations version: {e}")
+    # Without a version field the collection is re-read at each check; the content hash decides
+    return ("json", mtime) if firebase is None else ("firestore-unversioned", mtime, time.monotonic())
+
+
+def _load(firebase) -> OperationRegistry:
+    data = _load_json()
+    # Shared parameter types and legacy names always come from the file; Firestore ops can
+    # override the types per op
+    parameter_types = data.get("parameter_types", {})
+    legacy_operations = data.get("legacy_operations", {})
+    if firebase is not None:
+        try:
+            operations = firebase.query_collection("operations", subcollection=False)
+            if operations:
+                return OperationRegistry(operations, "firestore", parameter_types, legacy_operations)
+        except Exception as e:
+            print(f"Warning: Could not load operations from Firestore: {e}")
+    return OperationRegistry(data.get("operations", []), "json", parameter_types, legacy_operations)
+
+
+def get_operation_registry() -> OperationRegistry:
+    """The current registry; rebuilt only when its source changed."""
+    global _registry, _source_token, _checked_at, _check_interval
+    registry = _registry
+    if registry is not None and time.monotonic() - _checked_at < _check_interval:
+        return registry
+    # Callers that already have a registry don't wait for a slow check; they use the current one
+    if not _refresh_lock.acquire(blocking=registry is None):
+        return registry
+    try:
+        if _registry is not None and time.monotonic() - _checked_at < _check_interval:
+            return _registry  # Refreshed while this caller waited for the lock
+        use_firestore = os.getenv("OPS_SOURCE", "auto") != "json"
+        firebase = _firebase() if use_firestore else None
+        interval = float(os.getenv("OPS_VERSION_CHECK_S", "30") if firebase is not None
+                         else os.getenv("OPS_FILE_CHECK_S", "1"))
+        token = _current_token(firebase)
+        loaded = _load(firebase) if _registry is None or token != _source_token else None
+        with _registry_lock:
+            if loaded is not None and (_registry is None or loaded.version != _registry.version):
+                _registry = loaded
+                print(f"✅ Operation registry {loaded.version}: {len(loaded.operations)} operations from {loaded.source}")
+            _source_token, _checked_at, _check_interval = token, time.monotonic(), interval
+            return _registry
+    finally:
+        _refresh_lock.release()
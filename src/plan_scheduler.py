@@ -0,0 +1,383 @@
+# src/plan_scheduler.py
+# Execution of classifier plans.
+# PlanScheduler runs a plan as a dependency graph on a bounded pool. Operations may carry an
+# "id" and "depends_on" (ids or plan indices); references to earlier outputs in parameters
+# ("{{search1.result}}", "{{ops[0]}}") add the same dependency and are replaced by that output
+# before the op runs. Writes act as barriers so side effects keep their plan order: a write
+# waits for everything before it and later ops wait for the write. Independent reads in
+# between run concurrently, so three searches take as long as the slowest one. A failed op
+# skips the ops that use its output; a write that ran and failed cancels the rest of the plan
+# (an op rejected before running, or unknown to the catalog, fails on its own). Results are
+# always returned in plan order, whatever order the ops finished in.
+# Ops with a batched implementation are coalesced: same-name ops that become ready together run
+# as one batched call (one Firestore WriteBatch for 12 task.create, one pool for 40 hashes) and
+# its results are fanned back out per op. Consecutive writes of the same batchable op share one
+# barrier so they can become ready together.
+# An op's timeout counts from the moment it starts running, not from when it was queued. A
+# thread cannot be interrupted, so a timed-out op is abandoned: its result is discarded and its
+# pool slot is handed to the next op while the stuck thread finishes (or not) on its own.
+# EarlyDispatcher starts operations while the classifier is still streaming the plan: each
+# operation object is validated the moment it is complete and, if it is safe to run ahead of
+# the rest of the plan, dispatched to a shared pool. When the final plan is executed, matching
+# operations (same name and parameters) pick up the already-running call instead of starting a
+# new one. Only read-only operations run early: if the plan is re-asked or repaired, a read that
+# turns out not to be needed costs nothing, while a write could not be taken back.
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+from operation_registry import OperationRegistry, get_operation_registry
+
+# Capabilities (from the op definitions) that never change state
+READ_ONLY_CAPABILITIES = {"fs_read", "db_read", "email_read", "network", "search_index", "system_read", "ocr", "nlp"}
+
+# "{{search1.result}}", "{{search1}}", "{{ops[0].result}}", "{{ops[0]}}"
+REFERENCE = re.compile(r"\{\{\s*(?:ops\[(\d+)\]|([A-Za-z_][\w\-]*))(?:\.result)?\s*\}\}")
+
+_DISPATCH_POOL = ThreadPoolExecutor(max_workers=int(os.getenv("PIPELINE_WORKERS", "8")), thread_name_prefix="plan-dispatch")
+_stats = {"dispatched": 0, "claimed": 0, "unused": 0, "plans": 0, "ops": 0, "timeouts": 0, "abandoned": 0,
+          "skipped": 0, "cancelled": 0, "batches": 0, "batched_ops": 0}
+_stats_lock = threading.Lock()
+QUEUED_POLL_S = 0.05  # How often queued ops are checked for having started (their clock starts then)
+
+
+class _OpCall:
+    """One submission to an _OpPool: its future and when it started running (None while queued)."""
+
+    def __init__(self, pool: "_OpPool"):
+        self.pool = pool
+        self.future: Future = None
+        self.started_at: Optional[float] = None
+        self.state = "queued"  # queued -> running -> done, or running -> abandoned
+        self.lock = threading.Lock()
+
+    def abandon(self):
+        """Give up on a call that overran its timeout; its slot goes to the next op."""
+        self.pool._abandon(self)
+
+
+class _OpPool:
+    """Bounded pool for plan operations (OP_WORKERS ops run at once) whose abandoned calls release
+    their slot. Up to OP_MAX_ABANDONED stuck threads are tolerated on top of the workers; past that
+    an abandoned call keeps its slot, so hung ops shrink the pool instead of growing threads."""
+
+    def __init__(self, workers: int, max_abandoned: int):
+        self.max_abandoned = max_abandoned
+        self._slots = threading.Semaphore(workers)
+        self._executor = ThreadPoolExecutor(max_workers=workers + max_abandoned, thread_name_prefix="plan-op")
+        self._abandoned = 0
+        self._lock = threading.Lock()
+
+    def submit(self, fn: Callable, *args) -> _OpCall:
+        call = _OpCall(self)
+        call.future = self._executor.submit(self._run, call, fn, args)
+        return call
+
+    def _run(self, call: _OpCall, fn: Callable, args: tuple):
+        self._slots.acquire()
+        with call.lock:
+            call.state, call.started_at = "running", time.monotonic()
+        try:
+            return fn(*args)
+        finally:
+            with call.lock:
+                abandoned, call.state = call.state == "abandoned", "done"
+            if abandoned:
+                with self._lock:
+                    self._abandoned -= 1
+            else:
+                self._slots.release()
+
+    def _abandon(self, call: _OpCall):
+        with call.lock:
+            if call.state != "running":
+                return
+            with self._lock:
+                if self._abandoned >= self.max_abandoned:
+                    return  # The slot stays taken until the op returns
+                self._abandoned += 1
+            call.state = "abandoned"
+        self._slots.release()
+        _count("abandoned")
+
+
+_OP_POOL = _OpPool(int(os.getenv("OP_WORKERS", "4")), int(os.getenv("OP_MAX_ABANDONED", "8")))
+
+
+def op_key(op: Dict[str, Any]) -> str:
+    """Identity of an operation call: its name and canonical parameters."""
+    return json.dumps([op.get("name"), op.get("parameters", {})], sort_keys=True, default=str)
+
+
+def capabilities_of(op_def: Dict[str, Any]) -> set:
+    """Capability tokens of an op definition ("fs_write, db_write (if ...)" -> {fs_write, db_write})."""
+    return {part.strip().split(" ")[0] for part in str(op_def.get("capabilities", "")).split(",") if part.strip()}
+
+
+def is_read_only(op_def: Dict[str, Any]) -> bool:
+    capabilities = capabilities_of(op_def)
+    return bool(capabilities) and capabilities <= READ_ONLY_CAPABILITIES
+
+
+def has_references(op: Dict[str, Any]) -> bool:
+    """True if the op's parameters use another op's output."""
+    return bool(REFERENCE.search(json.dumps(op.get("parameters", {}), default=str)))
+
+
+class EarlyDispatcher:
+    """Runs eligible operations from a streaming plan ahead of plan completion (one per request)."""
+
+    def __init__(self, run_op: Callable[[Dict[str, Any]], Dict[str, Any]], registry: OperationRegistry = None):
+        self.run_op = run_op
+        self.registry = registry or get_operation_registry()
+        self._futures: Dict[str, List[Future]] = {}
+        self._lock = threading.Lock()
+
+    def eligible(self, op: Dict[str, Any]) -> bool:
+        op_def = self.registry.get(op.get("name"))
+        params = op.get("parameters", {})
+        # An explicit or implied dependency means the op has to wait for the plan
+        return (op_def is not None and "depends_on" not in op and not has_references(op) and is_read_only(op_def)
+                and isinstance(params, dict) and self.registry.validate(op_def["name"], params)[0])
+
+    def offer(self, op: Dict[str, Any]) -> bool:
+        """Dispatch op now if it is eligible and not already running. Returns True if dispatched."""
+        if not self.eligible(op):
+            return False
+        key = op_key(op)
+        with self._lock:
+            if self._futures.get(key):
+                return False
+            self._futures[key] = [_DISPATCH_POOL.submit(self.run_op, op)]
+        with _stats_lock:
+            _stats["dispatched"] += 1
+        return True
+
+    def claim(self, op: Dict[str, Any]) -> Optional[Future]:
+        """The early call for an op of the final plan, if one was dispatched."""
+        with self._lock:
+            futures = self._futures.get(op_key(op))
+            future = futures.pop(0) if futures else None
+        if future is not None:
+            with _stats_lock:
+                _stats["claimed"] += 1
+        return future
+
+    def close(self):
+        """Forget unclaimed calls (the final plan did not contain them); they finish in the background."""
+        with self._lock:
+            unused = sum(len(futures) for futures in self._futures.values())
+            self._futures.clear()
+        with _stats_lock:
+            _stats["unused"] += unused
+
+
+def _count(key: str, n: int = 1):
+    with _stats_lock:
+        _stats[key] += n
+
+
+def plan_graph(operations: List[Dict[str, Any]], catalog: Dict[str, Dict[str, Any]],
+               can_batch: Callable[[str], bool] = None) -> Tuple[List[Set[int]], List[Set[int]]]:
+    """Per op: (data dependencies, ordering dependencies) as sets of plan indices.
+    Data dependencies come from depends_on and output references; ordering dependencies
+    make writes (and unknown ops) barriers. A run of independent writes of one op for which
+    can_batch(name) is true forms a single barrier. References to unknown ids are left as text."""
+    ids = {}
+    for index, op in enumerate(operations):
+        ids.setdefault(str(op.get("id", f"op{index}")), index)
+    data: List[Set[int]] = []
+    for index, op in enumerate(operations):
+        deps = set()
+        declared = op.get("depends_on", [])
+        for ref in declared if isinstance(declared, list) else [declared]:
+            target = ref if isinstance(ref, int) else ids.get(str(ref))
+            if isinstance(target, int) and 0 <= target < len(operations):
+                deps.add(target)
+        for position, name in REFERENCE.findall(json.dumps(op.get("parameters", {}), default=str)):
+            target = int(position) if position else ids.get(name)
+            if target is not None and target < len(operations):
+                deps.add(target)
+        deps.discard(index)
+        data.append(deps)
+    order: List[Set[int]] = []
+    barrier, barrier_deps, barrier_name, since_write = set(), set(), None, []
+    for index, op in enumerate(operations):
+        name = op.get("name")
+        if is_read_only(catalog.get(name, {})):
+            order.append(set(barrier))
+            since_write.append(index)
+        elif (can_batch and name == barrier_name and not since_write and not data[index] & barrier
+              and can_batch(name)):
+            order.append(set(barrier_deps))
+            barrier.add(index)
+        else:
+            barrier_deps = set(since_write) | barrier
+            order.append(set(barrier_deps))
+            barrier, barrier_name, since_write = {index}, name, []
+    return data, order
+
+
+def resolve_references(op: Dict[str, Any], operations: List[Dict[str, Any]],
+                       records: List[Optional[Dict[str, Any]]]) -> Dict[str, Any]:
+    """Copy of op with output references in its parameters replaced by those outputs."""
+    ids = {}
+    for index, other in enumerate(operations):
+        ids.setdefault(str(other.get("id", f"op{index}")), index)
+
+    def substitute(match):
+        target = int(match.group(1)) if match.group(1) else ids.get(match.group(2))
+        if target is None or target >= len(records) or records[target] is None:
+            return match.group(0)
+        return str(records[target].get("result", ""))
+
+    def walk(value):
+        if isinstance(value, str):
+            return REFERENCE.sub(substitute, value)
+        if isinstance(value, dict):
+            return {key: walk(item) for key, item in value.items()}
+        if isinstance(value, list):
+            return [walk(item) for item in value]
+        return value
+
+    return {**op, "parameters": walk(op.get("parameters", {}))}
+
+
+class PlanScheduler:
+    """Runs a plan's operations as a dependency graph (see module comment).
+    run_op(op) returns a record with at least 'ok' and 'result', and 'executed': False if the op was
+    rejected without running; the scheduler builds the records of ops it never ran (skipped,
+    cancelled, timed out) with the same keys plus name/parameters."""
+
+    def __init__(self, registry: OperationRegistry = None, timeout_s: float = None):
+        self.catalog = (registry or get_operation_registry()).by_name
+        self.timeout_s = timeout_s or float(os.getenv("OP_TIMEOUT_S", "120"))
+
+    def _timeout(self, op: Dict[str, Any], batched: bool = False) -> float:
+        op_def = self.catalog.get(op.get("name"), {})
+        timeout = op_def.get("timeout_s", self.timeout_s)
+        return float((op_def.get("batch") or {}).get("timeout_s", timeout) if batched else timeout)
+
+    def _groups(self, ready: List[Tuple[int, Dict[str, Any]]],
+                can_batch: Callable[[str], bool] = None) -> List[Tuple[List[int], List[Dict[str, Any]]]]:
+        """Ready ops as (indices, ops): same-name batchable ops together (up to the op's batch
+        max_size per group), everything else on its own."""
+        groups, batches = [], {}
+        for index, op in ready:
+            name = op.get("name")
+            if can_batch and can_batch(name):
+                batches.setdefault(name, []).append((index, op))
+            else:
+                groups.append(([index], [op]))
+        for name, members in batches.items():
+            size = max(1, int((self.catalog.get(name, {}).get("batch") or {}).get("max_size", 100)))
+            for start in range(0, len(members), size):
+                chunk = members[start:start + size]
+                groups.append(([index for index, _ in chunk], [op for _, op in chunk]))
+        return groups
+
+    @staticmethod
+    def _failed(op: Dict[str, Any], message: str) -> Dict[str, Any]:
+        return {"name": op.get("name"), "parameters": op.get("parameters", {}), "ok": False, "result": message}
+
+    def run(self, operations: List[Dict[str, Any]], run_op: Callable[[Dict[str, Any]], Dict[str, Any]],
+            on_start: Callable[[int, Dict[str, Any]], None] = None,
+            on_finish: Callable[[int, Dict[str, Any]], None] = None,
+            run_batch: Callable[[List[Dict[str, Any]]], List[Dict[str, Any]]] = None,
+            can_batch: Callable[[str], bool] = None) -> List[Dict[str, Any]]:
+        """Execute the plan; returns one record per op, in plan order. With run_batch (same-name
+        ops -> one record each, in order) and can_batch(name), ready ops of batchable ops are coalesced."""
+        _count("plans")
+        _count("ops", len(operations))
+        can_batch = can_batch if run_batch is not None else None
+        data, order = plan_graph(operations, self.catalog, can_batch)
+        records: List[Optional[Dict[str, Any]]] = [None] * len(operations)
+        pending = list(range(len(operations)))
+        running: Dict[_OpCall, Tuple[List[int], float]] = {}
+
+        def finish(index: int, record: Dict[str, Any], stat: str = None):
+            records[index] = record
+            if stat:
+                _count(stat)
+            if on_finish:
+                on_finish(index, record)
+
+        while pending or running:
+            progressed = True
+            while progressed:
+                progressed = False
+                ready = []
+                for index in list(pending):
+                    if any(records[d] is None for d in data[index] | order[index]):
+                        continue
+                    pending.remove(index)
+                    progressed = True
+                    op = operations[index]
+                    failed = [operations[d].get("name") for d in sorted(data[index]) if not records[d]["ok"]]
+                    if failed:
+                        finish(index, self._failed(op, f"Skipped: depends on failed {', '.join(failed)}"), "skipped")
+                        continue
+                    op = resolve_references(op, operations, records)
+                    if on_start:
+                        on_start(index, op)
+                    ready.append((index, op))
+                for indices, ops in self._groups(ready, can_batch):
+                    if len(ops) == 1:
+                        call = _OP_POOL.submit(run_op, ops[0])
+                    else:
+                        call = _OP_POOL.submit(run_batch, ops)
+                        _count("batches")
+                        _count("batched_ops", len(ops))
+                    running[call] = (indices, self._timeout(ops[0], batched=len(ops) > 1))
+            if not running:
+                for index in pending:  # Only a dependency cycle can leave ops that never become ready
+                    finish(index, self._failed(operations[index], "Skipped: circular dependency"), "skipped")
+                break
+            # Deadlines exist only for started calls; queued ones are re-checked shortly
+            started = [call.started_at + timeout for call, (_, timeout) in running.items() if call.started_at is not None]
+            queued = len(started) < len(running)
+            wake = min(started + ([time.monotonic() + QUEUED_POLL_S] if queued else []))
+            done, _ = wait([call.future for call in running], timeout=max(0.0, wake - time.monotonic()),
+                           return_when=FIRST_COMPLETED)
+            now = time.monotonic()
+            fatal = False
+            for call, (indices, timeout) in list(running.items()):
+                if call.future in done:
+                    del running[call]
+                    try:
+                        result = call.future.result()
+                        group_records = result if len(indices) > 1 else [result]
+                        if len(group_records) != len(indices):
+                            raise ValueError(f"batch returned {len(group_records)} results for {len(indices)} ops")
+                    except Exception as e:
+                        group_records = [self._failed(operations[index], f"Execution error - {e}") for index in indices]
+                    for index, record in zip(indices, group_records):
+                        finish(index, record)
+                elif call.started_at is not None and now >= call.started_at + timeout:
+                    # The worker thread cannot be interrupted; its late result is discarded
+                    del running[call]
+                    call.abandon()
+                    for index in indices:
+                        finish(index, self._failed(operations[index], f"Timed out after {timeout:g}s"), "timeouts")
+                else:
+                    continue
+                for index in indices:
+                    op_def = self.catalog.get(operations[index].get("name"))
+                    record = records[index]
+                    if (not record["ok"] and record.get("executed", True) and op_def is not None
+                            and not is_read_only(op_def)):
+                        fatal = True
+            if fatal:
+                # A failed write invalidates what the rest of the plan assumed; ops already running finish
+                for index in pending:
+                    finish(index, self._failed(operations[index], "Cancelled: an earlier operation failed"), "cancelled")
+                pending = []
+        return records
+
+
+def pipeline_stats() -> Dict[str, int]:
+    with _stats_lock:
+        return dict(_stats)
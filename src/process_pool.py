@@ -0,0 +1,237 @@
+# src/process_pool.py
+# Isolated execution for heavy or unsafe operations.
+# Ops that set "isolation": "process" in operations.json (in their definition, or in their
+# legacy_operations entry) run in a pool of long-lived worker processes instead of the request
+# thread. Each call gets a wall-clock timeout (the worker is killed and replaced when it
+# expires), a CPU-time limit and an address-space limit (rlimits, where the platform has
+# them) and a cap on the size of the result sent back. Workers are started ahead of use
+# (warm()) and recycled after ISOLATED_MAX_TASKS calls. Cheap ops keep running in-process.
+# Workers are fresh interpreters running isolated_worker.py rather than forks of the (threaded)
+# server or multiprocessing spawns (which re-import the server's main module): a worker only
+# imports the ops it runs. The memory limit is ISOLATED_MEMORY_MB on top of that bare worker.
+import os
+import queue
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+from collections import deque
+from multiprocessing.connection import Connection
+from typing import Any, Dict, Optional, Tuple
+from operation_registry import get_operation_registry
+from utils.logger import setup_logger
+from utils.metrics import summarize_ms
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "isolated_worker.py")
+
+logger = setup_logger()
+
+
+def should_isolate(name: str) -> bool:
+    """True if the op has to run in a worker process."""
+    if os.getenv("ISOLATED_OPS", "1") != "1":
+        return False
+    op_def = get_operation_registry().dispatch_definition(name) or {}
+    return op_def.get("isolation") == "process"
+
+
+class _Worker:
+    def __init__(self, memory_mb: int):
+        parent_sock, child_sock = socket.socketpair()
+        try:
+            child_sock.set_inheritable(True)
+            handle = child_sock.fileno()
+            inherit = {"pass_fds": (handle,)} if os.name == "posix" else {"close_fds": False}
+            self.process = subprocess.Popen([sys.executable, WORKER_SCRIPT, str(handle), str(memory_mb)], **inherit)
+        except Exception:
+            parent_sock.close()
+            raise
+        finally:
+            child_sock.close()
+        self.conn = Connection(parent_sock.detach())
+        self.tasks = 0
+
+    def join(self, timeout: float):
+        try:
+            self.process.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            pass
+
+    def kill(self):
+        try:
+            self.process.kill()
+            self.join(timeout=5)
+        except Exception:
+            pass
+        self.conn.close()
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+            self.join(timeout=2)
+        except Exception:
+            pass
+        if self.process.poll() is None:
+            self.kill()
+        else:
+            self.conn.close()
+
+
+class ProcessPool:
+    """Fixed-size pool of worker processes; use get_process_pool()."""
+
+    def __init__(self, size: int = None):
+        self.size = max(1, size or int(os.getenv("ISOLATED_WORKERS", "2")))
+        self.timeout_s = float(os.getenv("ISOLATED_TIMEOUT_S", "60"))
+        self.cpu_s = int(os.getenv("ISOLATED_CPU_S", "60"))
+        self.memory_mb = int(os.getenv("ISOLATED_MEMORY_MB", "1024"))
+        self.output_cap = int(os.getenv("ISOLATED_OUTPUT_CHARS", "65536"))
+        self.max_tasks = int(os.getenv("ISOLATED_MAX_TASKS", "100"))
+        self.checkout_timeout = float(os.getenv("ISOLATED_CHECKOUT_TIMEOUT_S", "30"))
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._started = 0
+        self._busy = 0
+        self._busy_s = 0.0
+        self._created_at = time.monotonic()
+        self._counts = {"calls": 0, "timeouts": 0, "crashes": 0, "recycled": 0, "checkout_timeouts": 0}
+        self._run_ms = deque(maxlen=1000)
+
+    def _spawn(self) -> _Worker:
+        return _Worker(self.memory_mb)
+
+    def warm(self) -> int:
+        """Start workers until the pool is full. Returns the number started."""
+        started = 0
+        while True:
+            with self._lock:
+                if self._started >= self.size:
+                    break
+                self._started += 1
+            try:
+                self._idle.put(self._spawn())
+                started += 1
+            except Exception:
+                with self._lock:
+                    self._started -= 1
+                raise
+        logger.info(f"Process pool warmed: {self._started}/{self.size} workers")
+        return started
+
+    def _checkout(self) -> Optional[_Worker]:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            spawn = self._started < self.size
+            if spawn:
+                self._started += 1
+        if spawn:
+            try:
+                return self._spawn()
+            except Exception:
+                with self._lock:
+                    self._started -= 1
+                raise
+        try:
+            return self._idle.get(timeout=self.checkout_timeout)
+        except queue.Empty:
+            return None
+
+    def _replace(self, worker: _Worker):
+        """Retire a worker and put a fresh one in its place."""
+        worker.kill()
+        try:
+            self._idle.put(self._spawn())
+        except Exception as e:
+            logger.error(f"Process pool: could not replace worker: {e}")
+            with self._lock:
+                self._started -= 1
+
+    def run(self, entrypoint: str, params: Dict[str, Any], timeout_s: float = None,
+            cpu_s: int = None, memory_mb: int = None) -> Tuple[bool, str]:
+        """Run entrypoint(**params) in a worker. Returns the op's (success, result)."""
+        worker = self._checkout()
+        if worker is None:
+            with self._lock:
+                self._counts["checkout_timeouts"] += 1
+            return False, f"No isolated worker free within {self.checkout_timeout:g}s"
+        if memory_mb and memory_mb != self.memory_mb:
+            worker.kill()  # Memory limits are set per process: use a dedicated one for this call
+            worker = _Worker(memory_mb)
+        timeout_s = timeout_s or self.timeout_s
+        started = time.monotonic()
+        with self._lock:
+            self._busy += 1
+            self._counts["calls"] += 1
+        outcome, reply = "ok", None
+        try:
+            worker.conn.send((entrypoint, params, cpu_s or self.cpu_s, self.output_cap))
+            if worker.conn.poll(timeout_s):
+                reply = worker.conn.recv()
+            else:
+                outcome = "timeouts"
+        except (EOFError, OSError, BrokenPipeError):
+            outcome = "crashes"
+        except Exception as e:  # e.g. parameters that cannot be pickled
+            reply = (False, f"Execution error - {str(e)}")
+        elapsed = time.monotonic() - started
+        with self._lock:
+            self._busy -= 1
+            self._busy_s += elapsed
+            self._run_ms.append(elapsed * 1000)
+            if outcome != "ok":
+                self._counts[outcome] += 1
+        if outcome == "timeouts":
+            self._replace(worker)
+            return False, f"Timed out after {timeout_s:g}s (worker killed)"
+        if outcome == "crashes":
+            worker.join(timeout=1)
+            exitcode = worker.process.returncode
+            self._replace(worker)
+            if hasattr(signal, "SIGXCPU") and exitcode == -signal.SIGXCPU:
+                return False, f"Exceeded CPU limit ({cpu_s or self.cpu_s}s)"
+            return False, f"Worker crashed (exit code {exitcode})"
+        worker.tasks += 1
+        if memory_mb and memory_mb != self.memory_mb or worker.tasks >= self.max_tasks:
+            with self._lock:
+                self._counts["recycled"] += 1
+            self._replace(worker)
+        else:
+            self._idle.put(worker)
+        return reply
+
+    def shutdown(self):
+        while True:
+            try:
+                self._idle.get_nowait().stop()
+            except queue.Empty:
+                break
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            uptime = max(1e-9, time.monotonic() - self._created_at)
+            return {
+                "size": self.size,
+                "started": self._started,
+                "busy": self._busy,
+                "idle": self._idle.qsize(),
+                **self._counts,
+                "utilization": round(self._busy_s / (uptime * self.size), 4),
+                "run_ms": summarize_ms(self._run_ms),
+            }
+
+
+_pool: Optional[ProcessPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_process_pool() -> ProcessPool:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPool()
+        return _pool
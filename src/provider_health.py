@@ -0,0 +1,118 @@
+# src/provider_health.py
+# Rolling latency/error statistics per LLM model, shared by every agent in the process.
+# Used to order fallback chains (fast, healthy providers first) and to derive the hedging
+# deadline: if the primary has not answered by ~its own p95, a backup call is fired.
+import os
+import threading
+from collections import deque
+from typing import Any, Dict, List, Optional
+from utils.metrics import percentile, summarize_ms
+
+# Upper bounds (ms) of the latency histogram buckets reported on /metrics
+HISTOGRAM_BUCKETS_MS = (250, 500, 1000, 2000, 5000, 10000, 20000, float("inf"))
+
+
+class _ModelWindow:
+    """Last `size` outcomes for one model."""
+
+    def __init__(self, size: int):
+        self.samples = deque(maxlen=size)  # (latency_ms, ok)
+
+    def latencies(self) -> List[float]:
+        return sorted(latency for latency, ok in self.samples if ok)
+
+    def error_rate(self) -> float:
+        if not self.samples:
+            return 0.0
+        return sum(1 for _, ok in self.samples if not ok) / len(self.samples)
+
+
+class ProviderHealth:
+    """Thread-safe registry of per-model windows; use get_provider_health()."""
+
+    def __init__(self, window: int = None, min_samples: int = None):
+        self.window = window or int(os.getenv("LLM_HEALTH_WINDOW", "200"))
+        self.min_samples = min_samples or int(os.getenv("LLM_HEALTH_MIN_SAMPLES", "5"))
+        self.hedge_factor = float(os.getenv("LLM_HEDGE_P95_FACTOR", "1.0"))
+        self.hedge_min_s = float(os.getenv("LLM_HEDGE_MIN_S", "2"))
+        self.hedge_max_s = float(os.getenv("LLM_HEDGE_MAX_S", "20"))
+        self.hedge_default_s = float(os.getenv("LLM_HEDGE_DEFAULT_S", "8"))
+        self._models: Dict[str, _ModelWindow] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, model: str) -> _ModelWindow:
+        if model not in self._models:
+            self._models[model] = _ModelWindow(self.window)
+        return self._models[model]
+
+    def record(self, model: str, latency_ms: float, ok: bool):
+        with self._lock:
+            self._get(model).samples.append((latency_ms, ok))
+
+    def p95_ms(self, model: str) -> Optional[float]:
+        """p95 of successful calls, or None until min_samples have been seen."""
+        with self._lock:
+            latencies = self._get(model).latencies()
+        if len(latencies) < self.min_samples:
+            return None
+        return percentile(latencies, 0.95)
+
+    def hedge_deadline(self, model: str) -> float:
+        """Seconds to wait on `model` before firing a hedge request."""
+        p95 = self.p95_ms(model)
+        if p95 is None:
+            return self.hedge_default_s
+        return min(self.hedge_max_s, max(self.hedge_min_s, p95 / 1000 * self.hedge_factor))
+
+    def score(self, model: str) -> Optional[float]:
+        """Expected cost of trying `model`: p95 inflated by its error rate. None without data."""
+        p95 = self.p95_ms(model)
+        if p95 is None:
+            return None
+        with self._lock:
+            error_rate = self._get(model).error_rate()
+        return p95 / max(0.05, 1.0 - error_rate)
+
+    def rank(self, llms: list) -> list:
+        """Order a fallback chain by score. Models without enough data keep their configured
+        position relative to each other and are tried before known-bad ones."""
+        if len(llms) < 2:
+            return list(llms)
+        scores = [self.score(llm.model) for llm in llms]
+        known = [s for s in scores if s is not None]
+        if not known:
+            return list(llms)
+        neutral = sorted(known)[len(known) // 2]  # Unknown models rank as an average provider
+        order = sorted(range(len(llms)), key=lambda i: (scores[i] if scores[i] is not None else neutral, i))
+        return [llms[i] for i in order]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            windows = {model: (w.latencies(), w.error_rate(), len(w.samples)) for model, w in self._models.items()}
+        report = {}
+        for model, (latencies, error_rate, count) in windows.items():
+            histogram, lower = {}, 0
+            for upper in HISTOGRAM_BUCKETS_MS:
+                label = f"<{int(upper)}" if upper != float("inf") else f">={int(lower)}"
+                histogram[label] = sum(1 for latency in latencies if lower <= latency < upper)
+                lower = upper
+            report[model] = {
+                "samples": count,
+                "error_rate": round(error_rate, 3),
+                "latency_ms": summarize_ms(latencies),
+                "histogram_ms": histogram,
+            }
+        return report
+
+
+_health = None
+_health_lock = threading.Lock()
+
+
+def get_provider_health() -> ProviderHealth:
+    """The process-wide provider health registry."""
+    global _health
+    with _health_lock:
+        if _health is None:
+            _health = ProviderHealth()
+        return _health
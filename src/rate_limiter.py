@@ -0,0 +1,57 @@
+# src/rate_limiter.py
+# Thread-safe token bucket used to keep LLM traffic under provider rate limits.
+import threading
+import time
+
+
+class TokenBucket:
+    """`rate` tokens refill every `per` seconds, up to `capacity` (defaults to rate)."""
+
+    def __init__(self, rate: float, per: float = 60.0, capacity: float = None):
+        self.rate = float(rate)
+        self.per = float(per)
+        self.capacity = float(capacity if capacity is not None else rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate / self.per)
+        self._updated = now
+
+    def try_acquire(self, amount: float = 1.0) -> float:
+        """Take `amount` tokens if available. Returns 0.0 on success, else the seconds to wait."""
+        with self._lock:
+            self._refill()
+            # Requests bigger than the bucket are allowed once it is full rather than never
+            amount = min(amount, self.capacity)
+            if self._tokens >= amount:
+                self._tokens -= amount
+                return 0.0
+            return (amount - self._tokens) * self.per / self.rate
+
+    def acquire(self, amount: float = 1.0, timeout: float = None) -> bool:
+        """Block until `amount` tokens are taken. Returns False if timeout expires first."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = self.try_acquire(amount)
+            if wait == 0.0:
+                return True
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                wait = min(wait, remaining)
+            time.sleep(wait)
+
+    def refund(self, amount: float):
+        """Return tokens that were reserved but not used (e.g. over-estimated LLM tokens)."""
+        with self._lock:
+            self._refill()
+            self._tokens = min(self.capacity, self._tokens + amount)
+
+    def available(self) -> float:
+        with self._lock:
+            self._refill()
+            return self._tokens
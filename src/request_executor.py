@@ -0,0 +1,112 @@
+# src/request_executor.py
+# Bounded worker executor for the FastAPI server.
+# AiAgent.run_workflow is fully synchronous (LLM round trips, Firestore, ops), so the
+# server hands it to a fixed thread pool instead of running it on the event loop.
+# Admission is capped at workers + queue depth; anything beyond that is shed so the
+# caller can answer 429 immediately instead of piling up latency.
+import asyncio
+import math
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Tuple
+from utils.metrics import summarize_ms
+
+
+class QueueFullError(Exception):
+    """Raised when both the workers and the wait queue are full."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Server busy, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class BoundedExecutor:
+    """Thread pool with a concurrency limit, a queue depth cap and timing metrics."""
+
+    def __init__(self, max_workers: int = None, max_queue: int = None, retry_after: int = None):
+        self.max_workers = max(1, max_workers or int(os.getenv("MAX_CONCURRENT_QUERIES", "2")))
+        self.max_queue = max(0, max_queue if max_queue is not None else int(os.getenv("MAX_QUEUED_QUERIES", "8")))
+        self.default_retry_after = retry_after or int(os.getenv("QUEUE_RETRY_AFTER_S", "5"))
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="workflow")
+        self._slots = threading.BoundedSemaphore(self.max_workers + self.max_queue)
+        self._lock = threading.Lock()
+        self._admitted = 0
+        self._running = 0
+        self._completed = 0
+        self._rejected = 0
+        self._queue_ms = deque(maxlen=1000)
+        self._exec_ms = deque(maxlen=1000)
+
+    def retry_after(self) -> int:
+        """Seconds until a slot is likely free, estimated from recent execution times."""
+        with self._lock:
+            execs = sorted(self._exec_ms)
+            backlog = self._admitted - self._completed
+        if not execs:
+            return self.default_retry_after
+        median_s = execs[len(execs) // 2] / 1000
+        return max(1, math.ceil(median_s * max(1, backlog - self.max_workers + 1) / self.max_workers))
+
+    def submit(self, fn: Callable[..., Any], *args, **kwargs) -> Tuple[Future, Dict[str, float]]:
+        """Admit fn or raise QueueFullError. Returns the future and its timings dict (filled as it runs)."""
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._rejected += 1
+            raise QueueFullError(self.retry_after())
+        submitted = time.perf_counter()
+        with self._lock:
+            self._admitted += 1
+        timings = {}
+
+        def call():
+            started = time.perf_counter()
+            timings["queue_ms"] = round((started - submitted) * 1000, 2)
+            with self._lock:
+                self._running += 1
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                timings["exec_ms"] = round((time.perf_counter() - started) * 1000, 2)
+                with self._lock:
+                    self._running -= 1
+
+        def finished(_future):
+            # Runs when the work completes or is cancelled before starting, so a client
+            # disconnect never frees a slot while its workflow is still running.
+            self._slots.release()
+            with self._lock:
+                self._completed += 1
+                if "queue_ms" in timings:
+                    self._queue_ms.append(timings["queue_ms"])
+                if "exec_ms" in timings:
+                    self._exec_ms.append(timings["exec_ms"])
+
+        future = self._pool.submit(call)
+        future.add_done_callback(finished)
+        return future, timings
+
+    async def run(self, fn: Callable[..., Any], *args, **kwargs) -> Tuple[Any, Dict[str, float]]:
+        """Run fn in the pool. Returns (result, {"queue_ms", "exec_ms"}); raises QueueFullError when shedding."""
+        future, timings = self.submit(fn, *args, **kwargs)
+        result = await asyncio.wrap_future(future)
+        return result, timings
+
+    def stats(self) -> Dict[str, Any]:
+        """Snapshot of concurrency, shedding and per-request timings (ms)."""
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "running": self._running,
+                "queued": self._admitted - self._completed - self._running,
+                "completed": self._completed,
+                "rejected": self._rejected,
+                "queue_ms": summarize_ms(self._queue_ms),
+                "exec_ms": summarize_ms(self._exec_ms),
+            }
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False)
@@ -0,0 +1,257 @@
+# src/result_budget.py
+# Bounds operation results before they are formatted into the synthesizer prompt.
+# The "op_results" part of the synthesizer's share of knowledge/configs/token_budget.json is
+# split across the plan's ops (ops that need less than an even share release the rest), capped
+# per op by "per_op_tokens" or the op's own "tokens". Each oversized result is cut along its
+# structure:
+# - rows: tables (lists, row iterators, or text for ops configured as "rows") keep their header,
+#   the first rows, a deterministic sample of the middle and the last row
+# - relevant: when "summarize" is on and the query has content words, the head and tail plus the
+#   lines sharing the most words with the query (a local extractive summary, no LLM call)
+# - head_tail: the first and last lines, with a count of what was left out
+# Results are consumed as a stream of lines or rows and only the selected ones are kept, so an
+# op may return a generator or an open file and the full output is never held in memory here.
+# preview() gives the short form used in status lines and op_finished events.
+import heapq
+import itertools
+import json
+import random
+import re
+import threading
+from collections import deque
+from typing import Any, Dict, Iterable, Iterator, List, Set
+from token_budget import TokenBudget, _CHARS_PER_TOKEN, _load_config, get_token_budget
+
+_WORD = re.compile(r"[a-z0-9][a-z0-9_\-]{2,}")
+_STOPWORDS = frozenset(
+    "the and for are but not you your with this that from have has was were what when where which "
+    "who will would can could should into about than then them they their there these those all any "
+    "some our out get got show list find give tell please user wants want need".split()
+)
+DEFAULTS = {"share": 0.5, "per_op_tokens": 1200, "min_op_tokens": 60, "summarize": True}
+
+
+def query_terms(query: str) -> Set[str]:
+    return {w for w in _WORD.findall((query or "").lower()) if w not in _STOPWORDS}
+
+
+def _text_lines(text: str) -> Iterator[str]:
+    """Lines of text without building a list of them."""
+    start = 0
+    while start < len(text):
+        end = text.find("\n", start)
+        if end < 0:
+            end = len(text)
+        yield text[start:end].rstrip("\r")
+        start = end + 1
+
+
+def _as_row(item: Any) -> str:
+    return item.rstrip("\n") if isinstance(item, str) else json.dumps(item, default=str)
+
+
+def _stream(result: Any):
+    """(kind, iterator of lines): 'rows' for tables, 'text' otherwise."""
+    if isinstance(result, bytes):
+        result = result.decode("utf-8", errors="replace")
+    if isinstance(result, str):
+        return "text", _text_lines(result)
+    if isinstance(result, dict):
+        return "text", _text_lines(json.dumps(result, indent=1, default=str))
+    if isinstance(result, (list, tuple)):
+        return "rows", (_as_row(item) for item in result)
+    if hasattr(result, "__iter__"):
+        iterator = iter(result)  # Generators, open files, cursors
+        first = next(iterator, None)
+        if first is None:
+            return "text", iter(())
+        kind = "text" if isinstance(first, (str, bytes)) else "rows"
+        return kind, (_as_row(item.decode("utf-8", "replace") if isinstance(item, bytes) else item)
+                      for item in itertools.chain([first], iterator))
+    return "text", _text_lines(str(result))
+
+
+def _clip(line: str, room: int, from_end: bool = False) -> str:
+    return line if len(line) <= room else (f"...{line[-room:]}" if from_end else f"{line[:room]}...")
+
+
+def head_tail(lines: Iterable[str], max_chars: int, terms: Set[str] = frozenset()) -> str:
+    """First and last lines within max_chars; with query terms, the best-matching middle lines too."""
+    if terms:
+        head_room, match_room = max_chars // 4, max_chars // 2
+    else:
+        head_room, match_room = max_chars * 2 // 3, 0
+    tail_room = max_chars - head_room - match_room
+    head, head_len = [], 0
+    tail, tail_len = deque(), 0
+    matches, match_len = [], 0  # Min-heap of (score, -index, line): the weakest match leaves first
+    for index, line in enumerate(lines):
+        if len(head) == index and head_len + len(line) + 1 <= head_room:
+            head.append((index, line))
+            head_len += len(line) + 1
+            continue
+        if not head:
+            head.append((index, _clip(line, head_room)))
+            head_len = head_room
+            continue
+        tail.append((index, line))
+        tail_len += len(line) + 1
+        while tail_len > tail_room and len(tail) > 1:
+            dropped_index, dropped = tail.popleft()
+            tail_len -= len(dropped) + 1
+            score = len(terms.intersection(_WORD.findall(dropped.lower()))) if match_room else 0
+            if score:
+                dropped = _clip(dropped, match_room)
+                heapq.heappush(matches, (score, -dropped_index, dropped))
+                match_len += len(dropped) + 1
+                while match_len > match_room:
+                    match_len -= len(heapq.heappop(matches)[2]) + 1
+    if tail_len > tail_room:  # A single line longer than the tail room
+        last_index, last = tail.pop()
+        tail.append((last_index, _clip(last, tail_room, from_end=True)))
+    selected = sorted(head + [(-neg_index, line) for _, neg_index, line in matches] + list(tail))
+    parts, previous = [], -1
+    for index, line in selected:
+        if index > previous + 1:
+            parts.append(f"... ({index - previous - 1} lines omitted) ...")
+        parts.append(line)
+        previous = index
+    return "\n".join(parts)
+
+
+def sample_rows(rows: Iterable[str], max_chars: int, header: bool = False, seed: int = 0) -> str:
+    """Header, first rows, an evenly drawn sample of the rest and the last row, within max_chars."""
+    rows = iter(rows)
+    kept, used = [], 0
+    if header:
+        first = next(rows, None)
+        if first is None:
+            return ""
+        kept.append(_clip(first, max_chars // 3))
+        used = len(kept[0]) + 1
+    head_room = used + (max_chars - used) // 3
+    rng = random.Random(seed)  # Same rows -> same sample, so the prompt stays the same too
+    reservoir: List[tuple] = []
+    size = rest = fed = 0
+    pending = None  # Newest row: held back so the last row is always shown
+    for row in rows:
+        if not rest and used + len(row) + 1 <= head_room:
+            kept.append(row)
+            used += len(row) + 1
+            continue
+        if not rest:
+            average = used // len(kept) if kept else len(row) + 1
+            size = max(1, (max_chars - used) // max(1, average) - 1)
+        if pending is not None:
+            # Algorithm R over the rows between the head and the last one
+            fed += 1
+            if fed <= size:
+                reservoir.append(pending)
+            else:
+                slot = rng.randrange(fed)
+                if slot < size:
+                    reservoir[slot] = pending
+        rest += 1
+        pending = (rest, row)
+    chosen = sorted(reservoir) + ([pending] if pending is not None else [])
+    room = max_chars - used
+    per_row = max(20, room // max(1, len(chosen)))
+    body = []
+    for _, row in chosen:
+        row = _clip(row, per_row)
+        if len(row) + 1 > room:
+            break
+        body.append(row)
+        room -= len(row) + 1
+    if rest > len(body):
+        kept.append(f"... ({rest - len(body)} of the next {rest} rows omitted, {len(body)} sampled) ...")
+    return "\n".join(kept + body)
+
+
+def preview(result: Any, max_chars: int) -> str:
+    """Short text of a result for status lines and events. Streamed results (iterators, open
+    files) are left unread for the synthesizer path."""
+    if hasattr(result, "__next__") or hasattr(result, "read"):
+        return f"({type(result).__name__} result, streamed)"
+    if isinstance(result, str) and len(result) <= max_chars:
+        return result
+    if isinstance(result, (bool, int, float)) or result is None:
+        return str(result)
+    if isinstance(result, dict):
+        return _clip(json.dumps(result, default=str), max_chars)
+    kind, lines = _stream(result)
+    return sample_rows(lines, max_chars) if kind == "rows" else head_tail(lines, max_chars)
+
+
+class ResultBudget:
+    """Per-op output budgets for one synthesizer model."""
+
+    def __init__(self, budget: TokenBudget, config: Dict[str, Any] = None):
+        config = config if config is not None else _load_config().get("op_results", {})
+        self.budget = budget
+        self.config = {**DEFAULTS, **config}
+        self.ops = self.config.get("ops", {})
+
+    def total_tokens(self) -> int:
+        return int(self.config.get("total_tokens") or self.config["share"] * self.budget.context_tokens)
+
+    def op_cap(self, name: str) -> int:
+        return int(self.ops.get(name, {}).get("tokens", self.config["per_op_tokens"]))
+
+    def allocate(self, records: List[Dict[str, Any]]) -> List[int]:
+        """Tokens per record: an even split of the total, with what small results leave over
+        going to the bigger ones, each capped by its op's budget."""
+        demands = []
+        for record in records:
+            result = record.get("result")
+            estimate = len(result) // _CHARS_PER_TOKEN + 1 if isinstance(result, str) else self.op_cap(record["name"])
+            demands.append(min(estimate, self.op_cap(record["name"])))
+        grants = [0] * len(records)
+        remaining, left = self.total_tokens(), len(records)
+        for index in sorted(range(len(records)), key=lambda i: demands[i]):
+            share = remaining // left if left else 0
+            grants[index] = max(min(demands[index], share), int(self.config["min_op_tokens"]))
+            remaining -= grants[index]
+            left -= 1
+        return grants
+
+    def fit(self, name: str, result: Any, max_tokens: int, query: str = "") -> Any:
+        """result, or a bounded text version of it when it does not fit max_tokens."""
+        if isinstance(result, str) and len(result) <= max_tokens * _CHARS_PER_TOKEN * 2 \
+                and self.budget.count(result) <= max_tokens:
+            return result
+        if isinstance(result, (bool, int, float)) or result is None:
+            return result
+        spec = self.ops.get(name, {})
+        strategy = spec.get("strategy", "auto")
+        kind, lines = _stream(result)
+        # Leave room for the "... (n lines omitted) ..." markers the selection adds
+        max_chars = max(40, max_tokens * _CHARS_PER_TOKEN * 9 // 10 - 3 * 40)
+        terms = query_terms(query) if self.config["summarize"] and strategy in ("auto", "relevant") else set()
+        if strategy == "rows" or (strategy == "auto" and kind == "rows"):
+            text = sample_rows(lines, max_chars, header=bool(spec.get("header", kind == "text")))
+        else:
+            text = head_tail(lines, max_chars, terms)
+        # The selection works on a character estimate; make sure the token count fits too
+        return self.budget.fit_text(text, max_tokens)
+
+    def fit_records(self, records: List[Dict[str, Any]], query: str = "") -> List[Dict[str, Any]]:
+        """Records with every result bounded to its share of the op_results budget."""
+        bounded = []
+        for record, tokens in zip(records, self.allocate(records)):
+            result = self.fit(record["name"], record.get("result"), tokens, query)
+            bounded.append(record if result is record.get("result") else {**record, "result": result, "truncated": True})
+        return bounded
+
+
+_result_budgets: Dict[str, ResultBudget] = {}
+_result_budgets_lock = threading.Lock()
+
+
+def get_result_budget(model: str = None) -> ResultBudget:
+    """Shared result budget for the synthesizer model (see get_token_budget)."""
+    budget = get_token_budget(model)
+    with _result_budgets_lock:
+        if budget.model not in _result_budgets:
+            _result_budgets[budget.model] = ResultBudget(budget)
+        return _result_budgets[budget.model]
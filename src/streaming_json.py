@@ -0,0 +1,189 @@
+# src/streaming_json.py
+# Tolerant JSON parsing for LLM output, including an incremental parser for classifier plans.
+# The classifier answers {"mode": ..., "direct_response": ...} or {"mode": ..., "operations":
+# [...], ...}. StreamingPlanParser consumes the tokens as they arrive and reports the mode as
+# soon as its value is complete, direct_response text as it streams, and each operation object
+# the moment its closing brace arrives, so callers can act before the model has finished.
+# The synthesizer's {"display_response": ..., "extracted_fact": [...]} is streamed the same way
+# with text_key="display_response" and no mode gate.
+# Code fences and prose around the object are ignored; single-quoted strings are accepted.
+import json
+import re
+from typing import Any, Dict, List, Optional
+import json5
+
+_FENCE = re.compile(r"```(?:json5?|markdown)?", re.IGNORECASE)
+_CLOSERS = {"{": "}", "[": "]"}
+
+
+def _close_truncated(text: str) -> str:
+    """Append the quote/brackets a truncated JSON document is missing."""
+    stack, quote, escape = [], None, False
+    for ch in text:
+        if quote:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == quote:
+                quote = None
+        elif ch in "\"'":
+            quote = ch
+        elif ch in _CLOSERS:
+            stack.append(_CLOSERS[ch])
+        elif ch in "}]" and stack:
+            stack.pop()
+    text = text + (quote or "")
+    text = re.sub(r"[,:]\s*$", "", text.rstrip())  # A dangling separator cannot be completed
+    return text + "".join(reversed(stack))
+
+
+def parse_json_tolerant(raw: str) -> Optional[Dict[str, Any]]:
+    """Best-effort parse of an LLM's JSON object: strips fences and surrounding prose, accepts
+    JSON5, and closes output that was cut off mid-object. None if nothing usable is found."""
+    text = _FENCE.sub("", raw or "")
+    start = text.find("{")
+    if start < 0:
+        return None
+    end = text.rfind("}")
+    candidates = [text[start:end + 1]] if end > start else []
+    candidates.append(_close_truncated(text[start:]))
+    for candidate in candidates:
+        try:
+            parsed = json5.loads(candidate)
+        except Exception:
+            continue
+        if isinstance(parsed, dict):
+            return parsed
+    return None
+
+
+class StreamingPlanParser:
+    """Incremental scanner over a classifier plan. feed() returns the events completed by a chunk:
+    {'type': 'mode', 'mode'}, {'type': 'direct_text', 'text'} (only once mode is 'direct'),
+    {'type': 'operation', 'index', 'operation'}. result() parses the whole text at the end.
+    text_key picks the string field streamed as direct_text; text_mode is the mode it waits for
+    (None streams it unconditionally)."""
+
+    def __init__(self, text_key: str = "direct_response", text_mode: Optional[str] = "direct"):
+        self.text_key = text_key
+        self.text_mode = text_mode
+        self.text = ""
+        self.mode = None
+        self.operations: List[Dict[str, Any]] = []
+        self._pos = 0
+        self._depth = 0           # Bracket depth; the plan object itself is depth 1
+        self._started = False
+        self._done = False
+        self._quote = None        # Active string delimiter
+        self._escape = False
+        self._string_start = 0
+        self._expect_key = False  # At depth 1: next string is a key (else a value)
+        self._key = None          # Last key seen at depth 1
+        self._in_operations = False
+        self._op_start = None     # Start of the operation object being scanned
+        self._direct_start = None  # Start of the direct_response string body
+        self._direct_sent = 0     # Decoded direct_response characters already reported
+        self._direct_text = ""
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        self.text += chunk
+        events = []
+        while self._pos < len(self.text) and not self._done:
+            self._step(self.text[self._pos], events)
+            self._pos += 1
+        if self._direct_start is not None:
+            self._update_direct(self.text[self._direct_start:self._pos], events)
+        return events
+
+    def _step(self, ch: str, events: List[Dict[str, Any]]):
+        if self._quote:
+            if self._escape:
+                self._escape = False
+            elif ch == "\\":
+                self._escape = True
+            elif ch == self._quote:
+                self._quote = None
+                self._end_string(events)
+            return
+        if not self._started:
+            if ch == "{":
+                self._started, self._depth, self._expect_key = True, 1, True
+            return
+        if ch in "\"'":
+            self._quote = ch
+            self._string_start = self._pos + 1
+            if self._depth == 1 and not self._expect_key and self._key == self.text_key:
+                self._direct_start = self._pos + 1
+        elif ch in "{[":
+            if self._depth == 2 and self._in_operations and ch == "{":
+                self._op_start = self._pos
+            if self._depth == 1 and ch == "[" and self._key == "operations":
+                self._in_operations = True
+            self._depth += 1
+        elif ch in "}]":
+            self._depth -= 1
+            if self._depth == 2 and self._op_start is not None and ch == "}":
+                self._emit_operation(self.text[self._op_start:self._pos + 1], events)
+                self._op_start = None
+            elif self._depth == 1 and ch == "]":
+                self._in_operations = False
+            elif self._depth == 0:
+                self._done = True
+        elif self._depth == 1 and ch == ",":
+            self._expect_key = True
+        elif self._depth == 1 and ch == ":":
+            self._expect_key = False
+
+    def _end_string(self, events: List[Dict[str, Any]]):
+        if self._depth != 1:
+            return
+        body = self.text[self._string_start:self._pos]
+        if self._expect_key:
+            self._key = self._decode(body) or body
+        elif self._key == "mode":
+            self.mode = self._decode(body) or body
+            events.append({"type": "mode", "mode": self.mode})
+            if self._streaming() and self._direct_text and not self._direct_sent:
+                events.append({"type": "direct_text", "text": self._direct_text})
+                self._direct_sent = len(self._direct_text)
+        elif self._key == self.text_key:
+            self._update_direct(body, events)
+            self._direct_start = None
+
+    def _update_direct(self, body: str, events: List[Dict[str, Any]]):
+        # Hold back a trailing partial escape sequence until the rest of it arrives
+        safe = re.sub(r"\\(u[0-9a-fA-F]{0,3})?$", "", body)
+        decoded = self._decode(safe)
+        if decoded is None or len(decoded) <= len(self._direct_text):
+            return
+        self._direct_text = decoded
+        if self._streaming():
+            events.append({"type": "direct_text", "text": decoded[self._direct_sent:]})
+            self._direct_sent = len(decoded)
+
+    def _streaming(self) -> bool:
+        return self.text_mode is None or self.mode == self.text_mode
+
+    @staticmethod
+    def _decode(body: str) -> Optional[str]:
+        """Unescape a string body (double- or single-quoted); None if it is not complete yet."""
+        for quoted, loads in (('"' + body + '"', json.loads), ("'" + body + "'", json5.loads)):
+            try:
+                return loads(quoted)
+            except Exception:
+                continue
+        return None
+
+    def _emit_operation(self, text: str, events: List[Dict[str, Any]]):
+        try:
+            operation = json5.loads(text)
+        except Exception:
+            return  # Left for result() and the repair path
+        if isinstance(operation, dict) and "name" in operation:
+            events.append({"type": "operation", "index": len(self.operations), "operation": operation})
+            self.operations.append(operation)
+
+    def result(self) -> Optional[Dict[str, Any]]:
+        """The whole plan once the stream has ended (tolerant parse), or None if unusable."""
+        return parse_json_tolerant(self.text)
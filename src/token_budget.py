@@ -0,0 +1,166 @@
+# src/token_budget.py
+# Token-accurate prompt budgeting. Counts use the target model's tokenizer through litellm
+# (loaded on first use per model, counts memoized) with a ~4 chars/token fallback when no
+# tokenizer is available. A per-model context budget (knowledge/configs/token_budget.json)
+# is split across prompt sections by priority, and each section is trimmed along its own
+# structure: whole recent turns for history, whole lines for op catalogs and memories,
+# whole keys for the profile, head + tail for file content. Trimmed output never ends
+# mid-token or leaves half a JSON object behind.
+import json
+import os
+import threading
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+import litellm
+from common_functions.Find_project_root import find_project_root
+
+PROJECT_ROOT = find_project_root()
+BUDGET_PATH = os.path.join(PROJECT_ROOT, "knowledge", "configs", "token_budget.json")
+
+TRUNCATION_MARKER = "... (truncated)"
+_CHARS_PER_TOKEN = 4
+
+# Models whose tokenizer failed to load; they use the character estimate from then on
+_NO_TOKENIZER = set()
+
+
+def _load_config() -> Dict[str, Any]:
+    try:
+        with open(BUDGET_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"Warning: Could not load {BUDGET_PATH}: {e}. Using default token budgets.")
+        return {}
+
+
+def _encode(model: str, text: str) -> Optional[List[int]]:
+    if model in _NO_TOKENIZER:
+        return None
+    try:
+        encoded = litellm.encode(model=model, text=text)
+        return list(getattr(encoded, "ids", encoded))  # HF tokenizers return an Encoding
+    except Exception as e:
+        print(f"Warning: No tokenizer for {model} ({e}). Estimating tokens from length.")
+        _NO_TOKENIZER.add(model)
+        return None
+
+
+@lru_cache(maxsize=4096)
+def count_tokens(text: str, model: str) -> int:
+    """Tokens in text for model (memoized; falls back to len/4)."""
+    if not text:
+        return 0
+    tokens = _encode(model, text)
+    return len(tokens) if tokens is not None else max(1, len(text) // _CHARS_PER_TOKEN)
+
+
+class TokenBudget:
+    """Context budget for one model; use get_token_budget()."""
+
+    def __init__(self, model: str, config: Dict[str, Any] = None):
+        config = config if config is not None else _load_config()
+        self.model = model
+        models = config.get("models", {})
+        limits = dict(models.get("default", {"context_tokens": 6000}))
+        limits.update(models.get(model.split("/", 1)[0], {}))
+        limits.update(models.get(model, {}))
+        self.context_tokens = int(limits["context_tokens"])
+        self.sections = config.get("sections", {})
+
+    def count(self, text: str) -> int:
+        return count_tokens(text or "", self.model)
+
+    def section_cap(self, section: str) -> int:
+        """Tokens a section gets when every section is competing for the budget."""
+        spec = self.sections.get(section, {})
+        return max(int(spec.get("min_tokens", 0)), int(spec.get("share", 0.1) * self.context_tokens))
+
+    def allocate(self, demands: Dict[str, int], total: int = None) -> Dict[str, int]:
+        """Split `total` (default: the model's context budget) across sections.
+        In priority order each section first gets up to its min_tokens, then up to its share;
+        whatever is still free goes to sections that want more, again by priority. Sections
+        that need less than their share release the rest to the others."""
+        total = self.context_tokens if total is None else total
+        order = sorted(demands, key=lambda s: self.sections.get(s, {}).get("priority", 99))
+        grants = {section: 0 for section in order}
+        remaining = total
+        for limit in (lambda s: self.sections.get(s, {}).get("min_tokens", 0),
+                      lambda s: self.sections.get(s, {}).get("share", 0.1) * total,
+                      lambda s: demands[s]):
+            for section in order:
+                want = min(demands[section], int(limit(section))) - grants[section]
+                give = max(0, min(want, remaining))
+                grants[section] += give
+                remaining -= give
+        return grants
+
+    def fit_text(self, text: str, max_tokens: int, keep_tail: bool = False) -> str:
+        """Text cut to max_tokens at a token boundary; keep_tail keeps the head and the end."""
+        text = text or ""
+        if self.count(text) <= max_tokens:
+            return text
+        marker_tokens = self.count(TRUNCATION_MARKER) + 1
+        room = max(0, max_tokens - marker_tokens)
+        tokens = _encode(self.model, text)
+        head_n = room // 2 if keep_tail else room
+        tail_n = room - head_n if keep_tail else 0
+        if tokens is not None:
+            head = litellm.decode(model=self.model, tokens=tokens[:head_n]) if head_n else ""
+            tail = litellm.decode(model=self.model, tokens=tokens[-tail_n:]) if tail_n else ""
+        else:
+            head = text[:head_n * _CHARS_PER_TOKEN]
+            tail = text[-tail_n * _CHARS_PER_TOKEN:] if tail_n else ""
+        return f"{head}{TRUNCATION_MARKER}\n{tail}" if keep_tail else f"{head}{TRUNCATION_MARKER}"
+
+    def fit_items(self, items: List[str], max_tokens: int, separator: str = "\n") -> List[str]:
+        """Longest prefix of already-ranked items that fits (items are never cut)."""
+        kept, used, sep_tokens = [], 0, self.count(separator)
+        for item in items:
+            cost = self.count(item) + (sep_tokens if kept else 0)
+            if used + cost > max_tokens:
+                break
+            kept.append(item)
+            used += cost
+        return kept
+
+    def fit_history(self, history: List[Dict[str, str]], max_tokens: int) -> List[Dict[str, str]]:
+        """Most recent whole turns that fit; only the newest message is ever shortened."""
+        kept, used = [], 2  # "[]"
+        for message in reversed(history):
+            cost = self.count(json.dumps(message)) + 1
+            if used + cost > max_tokens:
+                if not kept:
+                    room = max_tokens - used - self.count(json.dumps({**message, "content": ""}))
+                    kept.append({**message, "content": self.fit_text(message.get("content", ""), max(0, room))})
+                break
+            kept.append(message)
+            used += cost
+        return list(reversed(kept))
+
+    def fit_json(self, obj: Dict[str, Any], max_tokens: int) -> str:
+        """JSON of the keys that fit, in insertion order; always valid JSON."""
+        kept = {}
+        for key, value in obj.items():
+            candidate = {**kept, key: value}
+            if self.count(json.dumps(candidate)) > max_tokens:
+                continue
+            kept = candidate
+        return json.dumps(kept)
+
+
+_budgets: Dict[str, TokenBudget] = {}
+_budgets_lock = threading.Lock()
+_default_model = None
+
+
+def get_token_budget(model: str = None) -> TokenBudget:
+    """Shared budget for model (default: default_model from token_budget.json)."""
+    global _default_model
+    with _budgets_lock:
+        if model is None:
+            if _default_model is None:
+                _default_model = _load_config().get("default_model", "groq/llama-3.3-70b-versatile")
+            model = _default_model
+        if model not in _budgets:
+            _budgets[model] = TokenBudget(model)
+        return _budgets[model]
@@ -0,0 +1,24 @@
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+_CHUNK_BYTES = 1 << 20
+
+
+def compute_hash(path, algo="sha256"):
+    """Hash a file in 1 MB chunks."""
+    try:
+        digest = hashlib.new(algo)
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(_CHUNK_BYTES), b""):
+                digest.update(chunk)
+        return True, digest.hexdigest()
+    except (OSError, ValueError) as e:
+        return False, f"Could not hash {path}: {e}"
+
+
+def compute_hashes(calls):
+    """Batched file.compute_hash: files are hashed concurrently (hashlib releases the GIL while hashing)."""
+    workers = max(1, min(len(calls), int(os.getenv("HASH_WORKERS", "8"))))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="hash") as pool:
+        return list(pool.map(lambda call: compute_hash(**call), calls))
@@ -0,0 +1,102 @@
+# src/tools/plugin_loader.py
+# Lazy loading of operation implementations. Nothing is imported up front: an op's module is
+# imported the first time the op is dispatched and the function is cached from then on, so a
+# cold start only pays for the ops it actually uses (and a missing optional dependency such as
+# win32com only breaks the ops that need it). Implementations are found, in order, from:
+# - the op's "entrypoint" in the operation registry ("tools.task_management.create_task:create_task"),
+#   or in its "legacy_operations" entry for the pre-registry names the tool has always accepted
+# - installed packages exposing an entry point in the ENTRY_POINT_GROUP group
+# Import failures are kept per entrypoint and reported when an op using it is dispatched.
+# Ops can also declare a batched implementation, "batch": {"entrypoint": ..., "max_size": N} in the
+# registry: a function taking a list of parameter dicts and returning one (success, result) per
+# entry, in order.
+import importlib
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from operation_registry import get_operation_registry
+
+ENTRY_POINT_GROUP = "assistant.operations"
+
+
+class PluginLoader:
+    """Resolves op names to functions on first use; use get_plugin_loader()."""
+
+    def __init__(self):
+        self._functions: Dict[str, Callable] = {}
+        self._errors: Dict[str, str] = {}
+        self._import_ms: Dict[str, float] = {}
+        self._installed: Optional[Dict[str, Any]] = None
+        self._lock = threading.Lock()
+
+    def _installed_entry_points(self) -> Dict[str, Any]:
+        """Entry points of installed packages (metadata only; nothing is imported)."""
+        if self._installed is None:
+            try:
+                from importlib.metadata import entry_points
+                found = entry_points()
+                group = found.select(group=ENTRY_POINT_GROUP) if hasattr(found, "select") else found.get(ENTRY_POINT_GROUP, [])
+                self._installed = {ep.name: ep for ep in group}
+            except Exception as e:
+                print(f"Warning: Could not read {ENTRY_POINT_GROUP} entry points: {e}")
+                self._installed = {}
+        return self._installed
+
+    def entrypoint(self, name: str) -> Optional[str]:
+        """"module:function" for an op, or None if nothing implements it."""
+        op_def = get_operation_registry().dispatch_definition(name) or {}
+        if op_def.get("entrypoint"):
+            return op_def["entrypoint"]
+        installed = self._installed_entry_points().get(name)
+        return installed.value if installed is not None else None
+
+    def batch_entrypoint(self, name: str) -> Optional[str]:
+        """"module:function" of the op's batched variant, or None if it has none."""
+        batch = (get_operation_registry().dispatch_definition(name) or {}).get("batch") or {}
+        return batch.get("entrypoint")
+
+    def has(self, name: str) -> bool:
+        return self.entrypoint(name) is not None
+
+    def resolve(self, name: str) -> Tuple[Optional[Callable], Optional[str]]:
+        """(function, None) or (None, error message). Imports the op's module on first call."""
+        return self._load(name, self.entrypoint(name))
+
+    def resolve_batch(self, name: str) -> Tuple[Optional[Callable], Optional[str]]:
+        """Like resolve, for the op's batched variant."""
+        return self._load(name, self.batch_entrypoint(name))
+
+    def _load(self, name: str, target: Optional[str]) -> Tuple[Optional[Callable], Optional[str]]:
+        if target is None:
+            return None, "Operation not implemented"
+        with self._lock:
+            # Cached per entrypoint, so an op whose entrypoint changes in the registry is re-resolved
+            if target in self._functions:
+                return self._functions[target], None
+            if target in self._errors:
+                return None, self._errors[target]
+            started = time.perf_counter()
+            try:
+                module_name, _, attr = target.partition(":")
+                function = importlib.import_module(module_name)
+                for part in attr.split("."):
+                    function = getattr(function, part)
+            except Exception as e:
+                self._errors[target] = f"Import error - {target}: {e}"
+                print(f"Warning: Operation {name} unavailable: {self._errors[target]}")
+                return None, self._errors[target]
+            self._import_ms[target] = round((time.perf_counter() - started) * 1000, 2)
+            self._functions[target] = function
+            return function, None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"loaded": len(self._functions), "import_ms": dict(self._import_ms), "errors": dict(self._errors)}
+
+
+_loader = PluginLoader()
+
+
+def get_plugin_loader() -> PluginLoader:
+    return _loader
@@ -1,12 +1,14 @@
 from crewai.tools import BaseTool
 from pydantic import BaseModel, Field
 from langchain_community.vectorstores import FAISS
-from langchain_huggingface import HuggingFaceEmbeddings
-from typing import Type, ClassVar, Optional
+from typing import Type, ClassVar, Optional, List, Dict, Any
 import os
 import json
+import threading
 
 from common_functions.Find_project_root import find_project_root
+from memory_manager import get_shared_embedder, DEFAULT_EMBEDDING_MODEL
+from operation_registry import get_operation_registry
 
 
 class RagToolInput(BaseModel):
@@ -26,44 +28,75 @@ class RagTool(BaseTool):
     )
     args_schema: Type[BaseModel] = RagToolInput
 
-    # Class-level cache of FAISS vectorstore
+    # Class-level cache of FAISS vectorstore, rebuilt when the operation registry changes
     vectorstore: ClassVar[Optional[FAISS]] = None
+    operations: ClassVar[List[Dict[str, Any]]] = []
+    ops_version: ClassVar[Optional[str]] = None
+    config: ClassVar[Dict[str, Any]] = {}
+    build_lock: ClassVar[threading.Lock] = threading.Lock()
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
+        RagTool.ensure_index()
 
-        if not RagTool.vectorstore:
-            # Load operations file
-            project_root = find_project_root()
-            ops_path = os.path.join(project_root, "knowledge", "operations.json")
-            if not os.path.exists(ops_path):
-                raise FileNotFoundError(f"Operations file not found: {ops_path}")
+    @classmethod
+    def ensure_index(cls):
+        """Build the vectorstore, or rebuild it if the registry version changed since."""
+        project_root = find_project_root()
+        registry = get_operation_registry()
 
-            with open(ops_path, "r", encoding="utf-8") as f:
-                ops_data = json.load(f)
+        with RagTool.build_lock:
+            if RagTool.vectorstore is not None and RagTool.ops_version == registry.version:
+                return
+            config_path = os.path.join(project_root, "knowledge", "configs", "rag_config.json")
+            try:
+                with open(config_path, "r", encoding="utf-8") as f:
+                    RagTool.config = json.load(f)
+            except Exception:
+                RagTool.config = {}
 
-            # Convert ops into searchable strings
-            ops = [
-                f"{op['name']} | parameters: {', '.join(op['required_parameters'] + [f'{p}=None' for p in op['optional_parameters']])} | {op['description']}"
-                for op in ops_data
-            ]
+            ops_data = registry.operations
+            if not ops_data:
+                raise ValueError("No operations found in the operation registry")
 
-            if not ops:
-                raise ValueError("No operations found in operations.json")
+            # Searchable strings are the registry's catalog lines; metadata maps each hit back to its op
+            texts = [registry.line(op) for op in ops_data]
+            metadatas = [{"index": i} for i in range(len(ops_data))]
 
-            # Initialize embedder (lightweight, good for short texts)
-            embedder = HuggingFaceEmbeddings(
-                model_name="sentence-transformers/all-MiniLM-L6-v2",
-                model_kwargs={"device": "cpu"}  # keep portable
-            )
+            # Same MiniLM instance as the memory manager and classifier cache
+            embedder = get_shared_embedder(RagTool.config.get("embedding_model", DEFAULT_EMBEDDING_MODEL))
 
             # Build FAISS vectorstore
-            RagTool.vectorstore = FAISS.from_texts(ops, embedder)
-            print(f"✅ RAG vectorstore initialized with {len(ops)} operations.")
+            RagTool.vectorstore = FAISS.from_texts(texts, embedder, metadatas=metadatas)
+            RagTool.operations = ops_data
+            RagTool.ops_version = registry.version
+            print(f"✅ RAG vectorstore initialized with {len(ops_data)} operations.")
+
+    def search(self, query: str, k: int = 5) -> List[tuple]:
+        """Top-k (operation dict, relevance score in [0, 1]) pairs, best first."""
+        RagTool.ensure_index()
+        vectorstore, operations = RagTool.vectorstore, RagTool.operations
+        if not vectorstore:
+            raise RuntimeError("Vectorstore not initialized.")
+        results = vectorstore.similarity_search_with_relevance_scores(query, k=k)
+        return [(operations[doc.metadata["index"]], score) for doc, score in results]
+
+    def select_operations(self, query: str) -> Optional[List[Dict[str, Any]]]:
+        """Operations to offer the classifier for this query, with k adapted to retrieval confidence:
+        every op scoring within `ops_score_margin` of the best hit is kept (between `ops_min_k` and
+        `ops_max_k`). Returns None when even the best hit is below `ops_min_confidence`, meaning the
+        full catalog should be used."""
+        min_k = self.config.get("ops_min_k", 4)
+        max_k = self.config.get("ops_max_k", 12)
+        margin = self.config.get("ops_score_margin", 0.15)
+        min_confidence = self.config.get("ops_min_confidence", 0.2)
+        hits = self.search(query, k=max_k)
+        if not hits or hits[0][1] < min_confidence:
+            return None
+        cutoff = hits[0][1] - margin
+        return [op for i, (op, score) in enumerate(hits) if i < min_k or score >= cutoff]
 
     def _run(self, query: str, k: int = 5) -> str:
         """Perform semantic search on operations and return top matches."""
-        if not self.vectorstore:
-            raise RuntimeError("Vectorstore not initialized.")
-        results = self.vectorstore.similarity_search(query, k=k)
-        return "\n".join([doc.page_content for doc in results])
+        registry = get_operation_registry()
+        return "\n".join(registry.line(op) for op, _ in self.search(query, k=k))
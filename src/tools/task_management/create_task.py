@@ -1,2 +1,21 @@
+# task.create: tasks are stored in Firestore (users/{USER_ID}/tasks); single and batched calls
+# write the same fields.
+TASK_FIELDS = ("title", "description", "due_date", "estimate_min", "related_files", "user_id")
+
+
+def _task_fields(params):
+    return {key: params[key] for key in TASK_FIELDS if params.get(key) is not None}
+
+
 def create_task(**kwargs):
-    return True, "Placeholder: create_task"
+    """task.create: one task document."""
+    from firebase_client import add_task
+    task_id = add_task(**_task_fields(kwargs))
+    return True, f"Created task {task_id}"
+
+
+def create_tasks(calls):
+    """Batched task.create: all tasks in one Firestore WriteBatch; one (success, result) per call."""
+    from firebase_client import add_tasks
+    ids = add_tasks([_task_fields(call) for call in calls])
+    return [(True, f"Created task {task_id}") for task_id in ids]
@@ -0,0 +1,21 @@
+# src/utils/metrics.py
+# Small helpers shared by the in-process metrics exposed on /metrics.
+from typing import Dict, Iterable
+
+
+def percentile(sorted_values: list, q: float) -> float:
+    """Nearest-rank percentile of an already sorted list (0.0 when empty)."""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(len(sorted_values) * q))
+    return sorted_values[index]
+
+
+def summarize_ms(samples: Iterable[float]) -> Dict[str, float]:
+    """p50/p95/max summary of a window of millisecond samples."""
+    values = sorted(samples)
+    return {
+        "p50": round(percentile(values, 0.5), 2),
+        "p95": round(percentile(values, 0.95), 2),
+        "max": round(values[-1], 2) if values else 0.0,
+    }
@@ -0,0 +1,35 @@
+# Micro-benchmark of parameter validation cost per op call.
+# Compares, per call of registry.check():
+#   names  - an op without typed parameters (required/allowed names only, no pydantic)
+#   typed  - an op with a compiled schema, valid input that needs coercion ("5" -> 5)
+#   error  - the same op with an invalid value (builds the machine-readable error list)
+# The first typed call also compiles the op's model; that one-off cost is reported separately.
+# usage: PYTHONPATH=src OPS_SOURCE=json python test/bench_param_validation.py [calls]
+
+import sys
+import time
+
+from operation_registry import get_operation_registry
+
+CASES = [
+    ("names", "focus.end_session", {"session_id": "s1"}),
+    ("typed", "file.read", {"path": "~/notes/../todo.txt", "start": "5", "length": "100"}),
+    ("error", "file.read", {"path": "todo.txt", "start": "five"}),
+]
+
+
+def per_call_us(registry, name, params, calls: int) -> float:
+    started = time.perf_counter()
+    for _ in range(calls):
+        registry.check(name, params)
+    return (time.perf_counter() - started) / calls * 1e6
+
+
+if __name__ == "__main__":
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    registry = get_operation_registry()
+    started = time.perf_counter()
+    registry.check("file.read", {"path": "x"})
+    print(f"compile file.read      {(time.perf_counter() - started) * 1000:8.2f} ms (once)")
+    for label, name, params in CASES:
+        print(f"{label:<6} {name:<17}{per_call_us(registry, name, params, calls):8.2f} us/call")
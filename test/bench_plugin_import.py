@@ -0,0 +1,68 @@
+# Import-time benchmark for lazy operation loading.
+# Each measurement runs in a fresh interpreter (cold module cache) and reports the median of
+# several runs:
+#   lazy   - import tools.operations_tool (what CLI/server startup pays now)
+#   first  - lazy import plus the first dispatch of one op (imports just that op's module)
+#   eager  - import every op module up front (what startup paid before lazy loading)
+# usage: python test/bench_plugin_import.py [runs] [op_name]
+
+import os
+import statistics
+import subprocess
+import sys
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC = os.path.join(PROJECT_ROOT, "src")
+
+LAZY = """
+import time
+t = time.perf_counter()
+import tools.operations_tool
+print((time.perf_counter() - t) * 1000)
+"""
+
+FIRST = """
+import time
+t = time.perf_counter()
+from tools.operations_tool import OperationsTool
+tool = OperationsTool()
+tool.plugins.resolve({op!r})
+print((time.perf_counter() - t) * 1000)
+"""
+
+EAGER = """
+import importlib, time
+t = time.perf_counter()
+import tools.operations_tool
+from tools.plugin_loader import get_plugin_loader
+from operation_registry import get_operation_registry
+loader = get_plugin_loader()
+registry = get_operation_registry()
+names = list(registry.legacy_operations) + [op["name"] for op in registry.operations]
+for name in names:
+    loader.resolve(name)
+print((time.perf_counter() - t) * 1000)
+"""
+
+
+def measure(code: str, runs: int) -> float:
+    env = {**os.environ, "PYTHONPATH": SRC, "OPS_SOURCE": "json", "PYTHONDONTWRITEBYTECODE": "1"}
+    samples = []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, "-c", code], cwd=PROJECT_ROOT, env=env,
+                             capture_output=True, text=True)
+        if out.returncode != 0:
+            raise RuntimeError(out.stderr)
+        samples.append(float(out.stdout.strip().splitlines()[-1]))
+    return statistics.median(samples)
+
+
+if __name__ == "__main__":
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    op = sys.argv[2] if len(sys.argv) > 2 else "task.create"
+    lazy = measure(LAZY, runs)
+    first = measure(FIRST.format(op=op), runs)
+    eager = measure(EAGER, runs)
+    print(f"lazy import            {lazy:8.1f} ms")
+    print(f"lazy + first {op:<10}{first:8.1f} ms")
+    print(f"eager (all op modules) {eager:8.1f} ms")
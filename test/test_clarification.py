@@ -0,0 +1,43 @@
+# Tests for resuming parked plans: explicit parameters are limited to the ones the plan asked for.
+# usage: python test/test_clarification.py
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from clarification import ClarificationStore, UnexpectedParameters, unexpected_parameters  # noqa: E402
+
+MISSING = {"task.create": ["title"]}
+
+
+def _check(parameters):
+    def check(state):
+        unexpected = unexpected_parameters(parameters, state["missing"])
+        if unexpected:
+            raise UnexpectedParameters(unexpected, state["missing"])
+    return check
+
+
+class ResumeParametersTest(unittest.TestCase):
+    def setUp(self):
+        self.store = ClarificationStore(ttl_s=60, max_pending=10)
+        self.token = self.store.park({"missing": MISSING})
+
+    def test_only_missing_pairs_are_accepted(self):
+        self.assertEqual(unexpected_parameters({"task.create": {"title": "x"}}, MISSING), {})
+        self.assertEqual(unexpected_parameters({"task.create": {"user_id": "other"}}, MISSING),
+                         {"task.create": ["user_id"]})
+        self.assertEqual(unexpected_parameters({"file.delete": {"path": "/"}}, MISSING), {"file.delete": ["path"]})
+
+    def test_rejected_resume_keeps_the_token(self):
+        with self.assertRaises(UnexpectedParameters):
+            self.store.take(self.token, _check({"file.delete": {"path": "/"}}))
+        state = self.store.take(self.token, _check({"task.create": {"title": "x"}}))
+        self.assertEqual(state["missing"], MISSING)
+        self.assertIsNone(self.store.take(self.token))
+
+
+if __name__ == "__main__":
+    unittest.main()
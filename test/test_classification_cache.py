@@ -0,0 +1,55 @@
+# Tests for the classification cache's literal guard: a semantically close query may only reuse
+# a cached plan if it carries the same literals and asks for nothing beyond them.
+# usage: python test/test_classification_cache.py  (needs faiss, numpy and the embedder's deps)
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+try:
+    from classification_cache import _literal_values, _literals_differ, normalize_query
+except ImportError:  # faiss / sentence-transformers not installed
+    _literals_differ = None
+
+
+def _plan(**parameters):
+    return {"mode": "agentic", "operations": [{"name": "task.create", "parameters": parameters}]}
+
+
+@unittest.skipIf(_literals_differ is None, "classification_cache dependencies not installed")
+class LiteralGuardTest(unittest.TestCase):
+    def differs(self, plan, cached_query, query):
+        return _literals_differ(_literal_values(plan), normalize_query(cached_query), normalize_query(query))
+
+    def test_same_request_reuses_plan(self):
+        plan = _plan(title="buy milk", user_id="u")
+        self.assertFalse(self.differs(plan, "Create task buy milk", "create task: buy milk!"))
+
+    def test_extra_items_do_not_reuse_plan(self):
+        plan = _plan(title="buy milk", user_id="u")
+        self.assertTrue(self.differs(plan, "create task buy milk", "create task buy milk and eggs"))
+
+    def test_different_literal_does_not_reuse_plan(self):
+        plan = _plan(title="buy milk", user_id="u")
+        self.assertTrue(self.differs(plan, "create task buy milk", "create task buy bread"))
+
+    def test_paths_compare_as_whole_tokens(self):
+        plan = {"operations": [{"name": "file.list", "parameters": {"path": "/home/u/docs"}}]}
+        self.assertTrue(self.differs(plan, "list files in /home/u/docs", "list files in /home/u/docs2"))
+        self.assertFalse(self.differs(plan, "list files in /home/u/docs", "list the files in /home/u/docs"))
+
+    def test_numbers_compare_as_whole_numbers(self):
+        plan = {"operations": [{"name": "focus.start_session", "parameters": {"duration_min": 25}}]}
+        self.assertTrue(self.differs(plan, "focus for 25 minutes", "focus for 50 minutes"))
+        self.assertTrue(self.differs(plan, "focus for 25 minutes", "focus for 250 minutes"))
+        self.assertFalse(self.differs(plan, "focus for 25 minutes", "Focus for 25 minutes."))
+
+    def test_negated_flag_does_not_reuse_plan(self):
+        plan = {"operations": [{"name": "file.list", "parameters": {"include_hidden": True}}]}
+        self.assertTrue(self.differs(plan, "list files including hidden", "list files, don't include hidden"))
+
+
+if __name__ == "__main__":
+    unittest.main()
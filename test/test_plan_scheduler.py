@@ -0,0 +1,173 @@
+# Behavioural tests for PlanScheduler: per-op timeouts, output references and write barriers.
+# usage: python test/test_plan_scheduler.py
+
+import os
+import sys
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from plan_scheduler import PlanScheduler, pipeline_stats  # noqa: E402
+
+
+class _Registry:
+    """Just enough of OperationRegistry for the scheduler: definitions by name."""
+
+    def __init__(self, **definitions):
+        self.by_name = {name: {"name": name, **op_def} for name, op_def in definitions.items()}
+
+
+REGISTRY = _Registry(**{
+    "file.search": {"capabilities": "fs_read"},
+    "file.read": {"capabilities": "fs_read"},
+    "task.create": {"capabilities": "db_write"},
+    "slow.read": {"capabilities": "fs_read", "timeout_s": 0.2},
+})
+
+
+def _record(op, result, ok=True):
+    return {"name": op["name"], "parameters": op.get("parameters", {}), "ok": ok, "result": result}
+
+
+class PlanSchedulerTest(unittest.TestCase):
+    def setUp(self):
+        self.scheduler = PlanScheduler(REGISTRY, timeout_s=5)
+        self.events = []
+        self.lock = threading.Lock()
+
+    def _log(self, *event):
+        with self.lock:
+            self.events.append(event)
+
+    def test_single_op_plan_times_out(self):
+        release = threading.Event()
+
+        def run_op(op):
+            release.wait(5)
+            return _record(op, "late")
+
+        started = time.monotonic()
+        try:
+            records = self.scheduler.run([{"name": "slow.read", "parameters": {}}], run_op)
+        finally:
+            release.set()
+        self.assertLess(time.monotonic() - started, 2)
+        self.assertFalse(records[0]["ok"])
+        self.assertIn("Timed out after 0.2s", records[0]["result"])
+
+    def test_timeout_counts_from_start_not_from_queueing(self):
+        # More ops than OP_WORKERS: the last ones queue for longer than their own timeout
+        def run_op(op):
+            time.sleep(0.12)
+            return _record(op, "done")
+
+        operations = [{"name": "slow.read", "parameters": {"n": n}} for n in range(12)]
+        records = self.scheduler.run(operations, run_op)
+        self.assertTrue(all(record["ok"] for record in records), records)
+
+    def test_abandoned_op_frees_its_slot(self):
+        release = threading.Event()
+
+        def run_op(op):
+            if op["parameters"].get("hang"):
+                release.wait(10)
+            return _record(op, "done")
+
+        before = pipeline_stats()["abandoned"]
+        try:
+            hung = [{"name": "slow.read", "parameters": {"hang": True, "n": n}} for n in range(4)]
+            self.assertFalse(any(record["ok"] for record in self.scheduler.run(hung, run_op)))
+            # Every worker thread is still stuck, yet the next plan runs
+            records = self.scheduler.run([{"name": "file.read", "parameters": {"path": "a"}}], run_op)
+            self.assertTrue(records[0]["ok"])
+            self.assertEqual(pipeline_stats()["abandoned"] - before, 4)
+        finally:
+            release.set()
+
+    def test_references_are_resolved_before_the_op_runs(self):
+        def run_op(op):
+            self._log(op["name"], op["parameters"])
+            if op["name"] == "file.search":
+                return _record(op, "/tmp/report.txt")
+            return _record(op, f"read {op['parameters']['path']}")
+
+        operations = [
+            {"id": "search1", "name": "file.search", "parameters": {"query": "report"}},
+            {"name": "file.read", "parameters": {"path": "{{search1.result}}"}},
+            {"name": "file.read", "parameters": {"path": "{{ops[0]}}"}},
+        ]
+        records = self.scheduler.run(operations, run_op)
+        self.assertEqual([r["result"] for r in records[1:]], ["read /tmp/report.txt"] * 2)
+        self.assertEqual(self.events[0][0], "file.search")
+
+    def test_failed_dependency_skips_dependents(self):
+        def run_op(op):
+            return _record(op, "not found", ok=op["name"] != "file.search")
+
+        operations = [
+            {"id": "s", "name": "file.search", "parameters": {"query": "x"}},
+            {"name": "file.read", "parameters": {"path": "{{s}}"}},
+            {"name": "file.read", "parameters": {"path": "/etc/hosts"}},
+        ]
+        records = self.scheduler.run(operations, run_op)
+        self.assertTrue(records[1]["result"].startswith("Skipped"))
+        self.assertTrue(records[2]["ok"])
+
+    def test_write_barrier_keeps_plan_order(self):
+        def run_op(op):
+            self._log("start", op["parameters"]["n"])
+            time.sleep(0.05)
+            self._log("end", op["parameters"]["n"])
+            return _record(op, "ok")
+
+        operations = [
+            {"name": "file.read", "parameters": {"n": 0}},
+            {"name": "file.read", "parameters": {"n": 1}},
+            {"name": "task.create", "parameters": {"n": 2}},
+            {"name": "file.read", "parameters": {"n": 3}},
+        ]
+        self.scheduler.run(operations, run_op)
+        position = {event: i for i, event in enumerate(self.events)}
+        # The reads before the write overlap; the write waits for both; the read after waits for it
+        self.assertLess(position[("start", 1)], position[("end", 0)])
+        self.assertLess(position[("end", 0)], position[("start", 2)])
+        self.assertLess(position[("end", 1)], position[("start", 2)])
+        self.assertLess(position[("end", 2)], position[("start", 3)])
+
+    def test_failed_write_cancels_the_rest(self):
+        def run_op(op):
+            return _record(op, "denied", ok=op["name"] != "task.create")
+
+        operations = [
+            {"name": "task.create", "parameters": {"title": "a"}},
+            {"name": "file.read", "parameters": {"path": "b"}},
+        ]
+        records = self.scheduler.run(operations, run_op)
+        self.assertFalse(records[0]["ok"])
+        self.assertTrue(records[1]["result"].startswith("Cancelled"))
+
+    def test_unknown_and_rejected_ops_fail_alone(self):
+        def run_op(op):
+            self._log(op["name"])
+            if op["name"] == "no.such_op":
+                return {**_record(op, "Unknown op: no.such_op", ok=False), "executed": False}
+            if not op["parameters"].get("title", True):
+                return {**_record(op, "Invalid parameters", ok=False), "executed": False}
+            return _record(op, "ok")
+
+        operations = [
+            {"name": "file.read", "parameters": {"path": "a"}},
+            {"name": "no.such_op", "parameters": {}},
+            {"name": "task.create", "parameters": {"title": ""}},
+            {"name": "task.create", "parameters": {"title": "b"}},
+            {"name": "file.read", "parameters": {"path": "c"}},
+        ]
+        records = self.scheduler.run(operations, run_op)
+        self.assertEqual([r["ok"] for r in records], [True, False, False, True, True])
+        self.assertEqual(len(self.events), 5)
+
+
+if __name__ == "__main__":
+    unittest.main()